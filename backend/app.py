@@ -1,26 +1,39 @@
 from fastapi import FastAPI, File, UploadFile, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import Session
 from config import config
-from src.database.db import init_db, get_db, engine
-from src.database.crud import DocumentCRUD, QueryCRUD, IndexMetadataCRUD
+from src.database.db import init_db, get_db, engine, SessionLocal
+from src.database.crud import DocumentCRUD, QueryCRUD, IndexMetadataCRUD, IndexBuildJobCRUD
 from src.database.models import Base
 from src.database.models import Base
-from src.modules.rag_system import RAGSystem, FAISSManager, TextChunker, Embedder, GeminiGenerator
+from src.modules.rag_system import RAGSystem, FAISSManager, Embedder
 from src.modules.generator import Generator
+from src.modules.gemini_client import AsyncGeminiGenerator
+from src.modules.build_jobs import run_worker
+from src.modules.index_builder import parse_content
+from src.modules.index_loader import IndexLoader
+from src.modules.extraction import extract_text, PDFExtractor, EXTRACTOR_VERSION
+from src.modules.extraction_cache import ExtractionCache, file_sha256
+from src.modules.bulk_ingest import BulkIngestor, reserve_path
+from src.modules.answer_cache import SemanticAnswerCache
+from src.modules.batching import BatchingEmbedder
 from src.schemas.response import (
     QueryResponse, DocumentResponse, DocumentListResponse, 
-    IndexStatusResponse, HealthResponse
+    IndexStatusResponse, IndexBuildJobResponse, HealthResponse
 )
 from pathlib import Path
 import shutil
-from typing import List
+from typing import List, Optional
 import logging
 import json
-import io
-import pdfplumber
-import docx
-import os
+import time
+import hashlib
+import itertools
+import multiprocessing
+import aiofiles
+from concurrent.futures import ThreadPoolExecutor
 
 # Setup logging
 level=config.LOG_LEVEL,
@@ -48,42 +61,153 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Text extraction runs here, off the event loop
+extraction_pool = ThreadPoolExecutor(
+    max_workers=config.RAG_CONFIG['ingestion']['extraction_workers'],
+    thread_name_prefix='extraction'
+)
+pdf_extractor = PDFExtractor(
+    workers=config.RAG_CONFIG['ingestion']['pdf_workers'],
+    page_timeout=config.RAG_CONFIG['ingestion']['pdf_page_timeout_seconds'],
+    min_parallel_pages=config.RAG_CONFIG['ingestion']['pdf_min_parallel_pages']
+)
+extraction_cache = ExtractionCache(
+    config.PROCESSED_DIR, EXTRACTOR_VERSION,
+    max_bytes=config.RAG_CONFIG['ingestion']['extraction_cache_max_mb'] * 1024 * 1024
+) if config.RAG_CONFIG['ingestion']['extraction_cache'] else None
+
 # Initialize database
 # Global components
 rag_components = {
     "rag": None,
     "embedder": None,
     "generator": None,
-    "index_data": None  # (index, chunks, metadata)
+    "index_data": None,  # IndexSnapshot of the current index version
+    "index_loader": None,
+    "answer_cache": None,
+    "build_worker": None  # (process, stop event)
 }
 
+def publish_index(snapshot):
+    """Swap in a newly loaded index version"""
+    # A single reference assignment; queries that already hold the old
+    # snapshot keep using it until they finish
+    rag_components["index_data"] = snapshot
+    rag = rag_components["rag"]
+    if rag and rag.reranker:
+        rag.reranker.clear_cache()
+
+def acquire_index():
+    """Return the current IndexSnapshot with a reference held, or None"""
+    while True:
+        snapshot = rag_components["index_data"]
+        # acquire() fails only if the snapshot was swapped out and released meanwhile
+        if snapshot is None or snapshot.acquire():
+            return snapshot
+
 # Initialize components on startup
 @app.on_event("startup")
 async def startup():
     init_db()
     logger.info("Database initialized")
     
+    # Resume extractions interrupted by a restart
+    try:
+        db = SessionLocal()
+        for document in DocumentCRUD.get_by_status(db, 'pending'):
+            extraction_pool.submit(
+                process_extraction, document.id, document.filename, document.file_type
+            )
+        db.close()
+    except Exception as e:
+        logger.error(f"Error resuming pending extractions: {str(e)}")
+    
+    if config.RAG_CONFIG['indexing']['build_worker']:
+        # spawn: the worker loads its own models instead of inheriting torch state
+        context = multiprocessing.get_context('spawn')
+        stop_event = context.Event()
+        worker = context.Process(target=run_worker, args=(stop_event,), name='index-build-worker', daemon=True)
+        worker.start()
+        rag_components["build_worker"] = (worker, stop_event)
+        logger.info(f"Index build worker started (pid {worker.pid})")
+    
     try:
         logger.info("Loading RAG models...")
-        rag_components["rag"] = RAGSystem(config.RAG_CONFIG)
-        rag_components["embedder"] = Embedder(config.RAG_CONFIG['embedding']['model_name'])
+        embedding_config = config.RAG_CONFIG['embedding']
+        inference = config.RAG_CONFIG['inference']
+        embedder = Embedder(embedding_config['model_name'], inference['embedding_backend'], inference['onnx_dir'])
+        if embedding_config['micro_batching']:
+            # Queries, answer sentences and citations share one batched encoder
+            embedder = BatchingEmbedder(
+                embedder,
+                max_batch_size=embedding_config['max_batch_size'],
+                max_wait_ms=embedding_config['max_wait_ms']
+            )
+        rag_components["embedder"] = embedder
+        rag_components["rag"] = RAGSystem(config.RAG_CONFIG, embedder=embedder)
+        
+        cache_config = config.RAG_CONFIG['cache']
+        if cache_config['enabled']:
+            rag_components["answer_cache"] = SemanticAnswerCache(
+                threshold=cache_config['similarity_threshold'],
+                max_entries=cache_config['max_entries'],
+                ttl_seconds=cache_config['ttl_seconds']
+            )
         
         if config.GEMINI_API_KEY:
             logger.info("Initializing connected Gemini Generator")
-            rag_components["generator"] = GeminiGenerator(config.GEMINI_API_KEY, config.RAG_CONFIG['generation']['model_name'])
+            generation = config.RAG_CONFIG['generation']
+            rag_components["generator"] = AsyncGeminiGenerator(
+                config.GEMINI_API_KEY, generation['model_name'],
+                max_concurrency=generation['max_concurrency'],
+                timeout_seconds=generation['timeout_seconds'],
+                deadline_seconds=generation['deadline_seconds'],
+                max_retries=generation['max_retries'],
+                backoff_seconds=generation['retry_backoff_seconds'],
+                backoff_max_seconds=generation['retry_backoff_max_seconds'],
+                breaker_failures=generation['breaker_failures'],
+                breaker_reset_seconds=generation['breaker_reset_seconds']
+            )
         else:
             logger.info("Initializing local T5 Generator")
-            rag_components["generator"] = Generator(config.RAG_CONFIG['generation']['model_name'])
+            generation = config.RAG_CONFIG['generation']
+            rag_components["generator"] = Generator(
+                generation['local_model_name'],
+                quantize=generation['local_quantize'],
+                max_batch_size=generation['local_max_batch_size'],
+                max_wait_ms=generation['local_max_wait_ms'],
+                max_new_tokens=generation['local_max_new_tokens']
+            )
         
-        # Try to load index if exists
-        if (config.INDEXES_DIR / 'index.bin').exists():
-            rag_components["index_data"] = FAISSManager.load(str(config.INDEXES_DIR))
-            logger.info("FAISS index loaded")
+        # Load the current index version now, then pick up new ones in the background
+        loader = IndexLoader(
+            config.INDEXES_DIR, config.RAG_CONFIG['retrieval'], publish_index,
+            poll_seconds=config.RAG_CONFIG['indexing']['reload_poll_seconds']
+        )
+        loader.refresh()
+        loader.start()
+        rag_components["index_loader"] = loader
             
         logger.info("All RAG models loaded successfully")
     except Exception as e:
         logger.error(f"Error loading RAG models: {str(e)}")
 
+@app.on_event("shutdown")
+def shutdown():
+    if rag_components["index_loader"]:
+        rag_components["index_loader"].stop()
+    if rag_components["build_worker"]:
+        worker, stop_event = rag_components["build_worker"]
+        stop_event.set()
+        # A build in progress is abandoned; its job is marked failed on the next start
+        worker.join(timeout=5)
+        if worker.is_alive():
+            worker.terminate()
+    if isinstance(rag_components["generator"], (AsyncGeminiGenerator, Generator)):
+        rag_components["generator"].close()
+    extraction_pool.shutdown(wait=False)
+    pdf_extractor.shutdown()
+
 # Health check
 @app.get("/health", response_model=HealthResponse)
 async def health_check():
@@ -96,81 +220,156 @@ async def health_check():
 
 # ============ DOCUMENT ENDPOINTS ============
 
+def process_extraction(document_id, file_path, file_type):
+    """
+    Worker-pool task: extract text from an uploaded file and mark it ready.
+    Files seen before are served from the extraction cache, keyed on the
+    bytes read now rather than the hash recorded at upload. Returns the
+    resulting (status, error).
+    """
+    db = SessionLocal()
+    try:
+        t_start = time.time()
+        content = None
+        if extraction_cache:
+            content_hash = file_sha256(file_path)
+            content = extraction_cache.get(content_hash, file_type)
+        if content is None:
+            content = parse_content(extract_text(file_path, file_type, pdf_extractor))
+            if extraction_cache:
+                extraction_cache.put(content_hash, file_type, content)
+            logger.info(f"Extracted {file_path} in {time.time() - t_start:.1f}s")
+        else:
+            logger.info(f"Extracted text of {file_path} served from cache")
+        DocumentCRUD.set_content(db, document_id, content)
+        return 'ready', None
+    except Exception as e:
+        logger.error(f"Error extracting {file_path}: {str(e)}")
+        try:
+            DocumentCRUD.set_failed(db, document_id, str(e))
+        except Exception as db_error:
+            logger.error(f"Error recording extraction failure: {str(db_error)}")
+        return 'failed', str(e)
+    finally:
+        db.close()
+
+
 @app.post("/api/documents/upload")
 async def upload_document(
     file: UploadFile = File(...),
     db: Session = Depends(get_db)
 ):
-    """Upload a document"""
+    """Upload a document; text is extracted in the background (poll /status)"""
+    file_path = None
     try:
-        # Read file
-        content = await file.read()
-        file_ext = file.filename.split('.')[-1].lower()
-        
-        # Save file locally
-        file_path = config.RAW_DIR / file.filename
-        with open(file_path, 'wb') as f:
-            f.write(content)
+        filename = Path(file.filename).name
+        file_ext = filename.split('.')[-1].lower()
+        # A file of its own: extraction reads it later, after other uploads of the same name
+        file_path = await run_in_threadpool(reserve_path, config.RAW_DIR, filename)
         
-        # Extract text based on file type
-        text_content = ""
-        
-        if file_ext == 'pdf':
-            pages_data = []
-            with pdfplumber.open(file_path) as pdf:
-                for i, page in enumerate(pdf.pages):
-                    text = page.extract_text()
-                    if text:
-                        pages_data.append({
-                            'text': text,
-                            'page': i + 1
-                        })
-            text_content = json.dumps(pages_data, ensure_ascii=False)
-                
-        elif file_ext == 'docx':
-            # DOCX usually doesn't have fixed "pages" in the same way, but we can treat paragraphs as a single block for now
-            # Or just legacy extraction
-            doc = docx.Document(io.BytesIO(content))
-            full_text = ""
-            for para in doc.paragraphs:
-                full_text += para.text + "\n"
-            text_content = full_text
-                
-        elif file_ext == 'txt':
-            text_content = content.decode('utf-8', errors='ignore')
-            
-        else:
-            # Fallback for other types
-            text_content = content.decode('utf-8', errors='ignore')
-
-        # Sanitize text: Remove NUL bytes which cause Postgres errors
-        text_content = text_content.replace('\x00', '')
+        # Stream to disk in fixed-size blocks, hashing as we go, so memory
+        # use does not grow with the file size
+        chunk_bytes = config.RAG_CONFIG['ingestion']['upload_chunk_bytes']
+        sha256 = hashlib.sha256()
+        file_size = 0
+        async with aiofiles.open(file_path, 'wb') as f:
+            while True:
+                block = await file.read(chunk_bytes)
+                if not block:
+                    break
+                sha256.update(block)
+                file_size += len(block)
+                await f.write(block)
         
         # Save to database
-        document = DocumentCRUD.create(
+        document = await run_in_threadpool(
+            DocumentCRUD.create,
             db,
             filename=str(file_path),
             original_filename=file.filename,
             file_type=file_ext,
-            content=text_content,
-            file_size=len(content)
+            content=None,
+            file_size=file_size,
+            status='pending',
+            content_hash=sha256.hexdigest()
         )
+        extraction_pool.submit(process_extraction, document.id, str(file_path), file_ext)
         
         logger.info(f"Document uploaded: {file.filename}")
-        return {"document_id": document.id, "filename": file.filename}
+        return {"document_id": document.id, "filename": file.filename, "status": "pending"}
     
     except Exception as e:
         logger.error(f"Error uploading document: {str(e)}")
+        if file_path:
+            file_path.unlink(missing_ok=True)
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/api/documents/bulk")
+def upload_documents_bulk(files: List[UploadFile] = File(...), wait: bool = False):
+    """
+    Upload many documents, or zip/tar archives of them, in one request.
+
+    Streams one NDJSON line per file: its document_id and status (pending,
+    or with `wait` the extraction outcome: ready / failed), skipped for
+    unsupported entries, error when it could not be stored. The last line
+    is a {"summary": {status: count}} record.
+    """
+    ingestion = config.RAG_CONFIG['ingestion']
+    ingestor = BulkIngestor(
+        SessionLocal, config.RAW_DIR,
+        lambda *args: extraction_pool.submit(process_extraction, *args),
+        batch_size=ingestion['bulk_insert_batch'],
+        chunk_bytes=ingestion['upload_chunk_bytes']
+    )
+    uploads = [(Path(file.filename).name, file.file) for file in files]
+
+    # Every upload is stored before returning: FastAPI may close the form's
+    # temporary files as soon as the handler returns. Extraction outcomes
+    # (with `wait`) still stream as they finish.
+    pending = {}
+    stored = list(ingestor.store(uploads, pending))
+
+    # A plain generator: StreamingResponse runs it in the threadpool
+    def results():
+        summary = {}
+        reported = [result for result in stored if not wait or result['status'] != 'pending']
+        for result in itertools.chain(reported, ingestor.outcomes(pending) if wait else ()):
+            summary[result['status']] = summary.get(result['status'], 0) + 1
+            yield json.dumps(result) + "\n"
+        logger.info(f"Bulk upload finished: {summary}")
+        yield json.dumps({"summary": summary}) + "\n"
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+
+@app.get("/api/documents/{document_id}/status")
+def get_document_status(document_id: str, db: Session = Depends(get_db)):
+    """Get the extraction status of an uploaded document"""
+    document = DocumentCRUD.get(db, document_id)
+    if not document:
+        raise HTTPException(status_code=404, detail="Document not found")
+    return {
+        "document_id": document.id,
+        "status": document.status,
+        "error": document.error,
+        "file_size": document.file_size,
+        "content_hash": document.content_hash
+    }
+
+
 @app.get("/api/documents", response_model=DocumentListResponse)
-async def get_documents(db: Session = Depends(get_db)):
-    """Get all documents"""
-    documents = DocumentCRUD.get_all(db)
+def get_documents(limit: int = 100, cursor: Optional[str] = None, db: Session = Depends(get_db)):
+    """List documents, newest first; pass next_cursor back as `cursor` for the next page"""
+    limit = max(1, min(limit, 1000))
+    try:
+        documents, next_cursor = DocumentCRUD.list_page(db, limit, cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
     return {
-        "total": len(documents),
-        "documents": documents
+        "total": DocumentCRUD.count(db),
+        "documents": documents,
+        "next_cursor": next_cursor
     }
 
 
@@ -186,113 +385,60 @@ async def delete_document(document_id: str, db: Session = Depends(get_db)):
 
 # ============ INDEX ENDPOINTS ============
 
-from fastapi import BackgroundTasks
-from src.database.db import SessionLocal
+@app.post("/api/index/build")
+def build_index(full: bool = False, db: Session = Depends(get_db)):
+    """
+    Queue an index build (incremental unless `full` is set). Builds run one at
+    a time in the build worker; a request while a job is still queued joins it.
+    """
+    incremental = config.RAG_CONFIG['indexing']['incremental'] and not full
+    job, coalesced = IndexBuildJobCRUD.enqueue(db, incremental)
+    return {
+        "message": "Joined queued index build" if coalesced else "Index build queued",
+        "job_id": job.id,
+        "status": job.status,
+        "coalesced": coalesced
+    }
 
-def process_index_build():
-    """Background task for building index"""
-    logger.info("Starting background index build...")
-    db = SessionLocal()
-    try:
-        # Get all documents
-        documents = DocumentCRUD.get_all(db)
-        if not documents:
-            logger.warning("No documents to index")
-            return
-        
-        # Chunk documents
-        chunker = TextChunker(
-            chunk_size=config.RAG_CONFIG['chunking']['chunk_size'],
-            overlap=config.RAG_CONFIG['chunking']['overlap']
-        )
-        
-        all_chunks = []
-        all_metadata = []
-        
-        for doc in documents:
-            # Check if content is JSON (new format) or string (old format)
-            try:
-                if doc.content.strip().startswith('['):
-                    input_content = json.loads(doc.content)
-                else:
-                    input_content = doc.content
-            except:
-                input_content = doc.content
-
-            chunks, metadatas = chunker.chunk(input_content)
-            
-            for i, chunk in enumerate(chunks):
-                all_chunks.append(chunk)
-                
-                # Base metadata
-                meta = {
-                    'source_file': doc.original_filename,
-                    'doc_id': doc.id,
-                    'chunk_idx': i
-                }
-                
-                # Add specific page metadata if available
-                if metadatas and i < len(metadatas):
-                    meta.update(metadatas[i])
-                    
-                all_metadata.append(meta)
-            
-            DocumentCRUD.update_processed(db, doc.id, len(chunks))
-        
-        # Generate embeddings
-        embedder = Embedder(config.RAG_CONFIG['embedding']['model_name'])
-        embeddings = embedder.embed(
-            all_chunks,
-            batch_size=config.RAG_CONFIG['embedding']['batch_size']
-        )
-        
-        # Build FAISS index
-        index = FAISSManager.build_index(embeddings)
-        
-        # Save index
-        FAISSManager.save(index, all_chunks, all_metadata, str(config.INDEXES_DIR))
-        
-        # Update database
-        for doc in documents:
-            DocumentCRUD.update_indexed(db, doc.id)
-        
-        IndexMetadataCRUD.create(
-            db,
-            index_name="main_index",
-            document_ids=[d.id for d in documents],
-            total_chunks=len(all_chunks),
-            index_size_mb=len(all_chunks) * 0.0001  # Rough estimate
-        )
-        
-        logger.info(f"Index built successfully with {len(all_chunks)} chunks")
-        
-    except Exception as e:
-        logger.error(f"Error building index: {str(e)}")
-    finally:
-        db.close()
 
+@app.get("/api/index/jobs", response_model=List[IndexBuildJobResponse])
+def get_index_jobs(limit: int = 20, db: Session = Depends(get_db)):
+    return IndexBuildJobCRUD.get_recent(db, limit)
 
-@app.post("/api/index/build")
-async def build_index(background_tasks: BackgroundTasks):
-    """Trigger background index build"""
-    background_tasks.add_task(process_index_build)
-    return {"message": "Index build started", "status": "processing"}
+
+@app.get("/api/index/jobs/{job_id}", response_model=IndexBuildJobResponse)
+def get_index_job(job_id: str, db: Session = Depends(get_db)):
+    """Job state with per-stage counters, vectors/s and ETA under `progress`"""
+    job = IndexBuildJobCRUD.get(db, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Build job not found")
+    return job
+
+
+@app.post("/api/index/jobs/{job_id}/cancel", response_model=IndexBuildJobResponse)
+def cancel_index_job(job_id: str, db: Session = Depends(get_db)):
+    """Cancel a queued job, or stop a running one at its next document page"""
+    job = IndexBuildJobCRUD.request_cancel(db, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Build job not found")
+    if job.status not in ('running', 'cancelled'):
+        raise HTTPException(status_code=409, detail=f"Build job already {job.status}")
+    return job
 
 
 @app.get("/api/index/status", response_model=IndexStatusResponse)
 async def get_index_status(db: Session = Depends(get_db)):
     """Get index status"""
     try:
-        index_path = config.INDEXES_DIR / 'index.bin'
-        index_exists = index_path.exists()
-        
-        if not index_exists:
+        active_job = IndexBuildJobCRUD.get_active(db)
+        if not FAISSManager.exists(config.INDEXES_DIR):
             return {
                 "index_exists": False,
                 "total_documents": 0,
                 "total_chunks": 0,
                 "index_size_mb": 0,
-                "last_updated": None
+                "last_updated": None,
+                "active_job": active_job
             }
         
         metadata = IndexMetadataCRUD.get_latest(db)
@@ -302,7 +448,8 @@ async def get_index_status(db: Session = Depends(get_db)):
             "total_documents": len(metadata.document_ids) if metadata else 0,
             "total_chunks": metadata.total_chunks if metadata else 0,
             "index_size_mb": metadata.index_size_mb if metadata else 0,
-            "last_updated": metadata.last_indexed if metadata else None
+            "last_updated": metadata.last_indexed if metadata else None,
+            "active_job": active_job
         }
     
     except Exception as e:
@@ -311,70 +458,97 @@ async def get_index_status(db: Session = Depends(get_db)):
 
 # ============ QUERY ENDPOINTS ============
 
+def retrieve(snapshot, question, query_embedding):
+    """Hybrid search; returns (chunks, metadata, index vectors, indices) of the hits"""
+    indices, scores = FAISSManager.hybrid_search(
+        snapshot.index, snapshot.sparse_index, question, query_embedding,
+        config.RAG_CONFIG['retrieval']['k_retrieve'], config.RAG_CONFIG['retrieval']
+    )
+    
+    retrieved_chunks = [snapshot.chunks[i] for i in indices]
+    retrieved_metadata = [snapshot.metadata[i] for i in indices]
+    # Index vectors for the retrieved chunks, reused for verification and citations
+    chunk_embeddings = FAISSManager.reconstruct(snapshot.index, indices)
+    return retrieved_chunks, retrieved_metadata, chunk_embeddings, indices
+
+
+def save_query(db, question, result, doc_id_ref):
+    """Record an answered query (Safe Save)"""
+    try:
+        # Verify if doc exists to prevent FK violation (Extra Safety)
+        if doc_id_ref:
+            existing_doc = DocumentCRUD.get(db, doc_id_ref)
+            if not existing_doc:
+                logger.warning(f"Document {doc_id_ref} referenced in index but not found in DB. Saving query as orphan.")
+                doc_id_ref = None
+
+        QueryCRUD.create(
+            db,
+            document_id=doc_id_ref,
+            question=question,
+            answer=result['answer'],
+            confidence=result['confidence'],
+            latency_ms=result['latency']['total_ms'],
+            retrieved_chunks=result['retrieved_chunks'],
+            citations=result['citations'],
+            support_details=result['support_details']
+        )
+    except Exception as e:
+        logger.error(f"Error saving query record: {str(e)}")
+        # Continue anyway, don't fail the request just because logging failed
+
+
 @app.post("/api/query/answer", response_model=QueryResponse)
-def answer_query(
+async def answer_query(
     question: str,
     db: Session = Depends(get_db)
 ):
-    """Answer a question using RAG (Run in threadpool)"""
+    """
+    Answer a question using RAG. The LLM call is awaited; embedding, search,
+    reranking and verification run in the threadpool.
+    """
+    t_request = time.time()
+    snapshot = None
     try:
-        index_path = config.INDEXES_DIR / 'index.bin'
-        if not index_path.exists():
-            raise HTTPException(status_code=400, detail="Index not built. Please build index first.")
-        
         # Check if components are loaded
         if not rag_components["generator"]:
              raise HTTPException(status_code=503, detail="RAG system not initialized")
-             
-        # Auto-reload index if file changed on disk
-        current_mtime = os.path.getmtime(index_path)
-        last_mtime = rag_components.get("index_mtime", 0)
-        
-        if not rag_components["index_data"] or current_mtime > last_mtime:
-             logger.info(f"Reloading index (mtime: {current_mtime} > {last_mtime})")
-             rag_components["index_data"] = FAISSManager.load(str(config.INDEXES_DIR))
-             rag_components["index_mtime"] = current_mtime
         
-        index, chunks, metadata = rag_components["index_data"]
+        # New index versions are loaded in the background; this request
+        # stays on the version it starts with
+        snapshot = acquire_index()
+        if snapshot is None:
+            raise HTTPException(status_code=400, detail="Index not built. Please build index first.")
         
         rag = rag_components["rag"]
         embedder = rag_components["embedder"]
         generator = rag_components["generator"]
         
-        # Retrieve
-        query_embedding = embedder.embed(question)[0]
-        indices, distances = FAISSManager.search(index, query_embedding, config.RAG_CONFIG['retrieval']['k_retrieve'])
-        
-        retrieved_chunks = [chunks[i] for i in indices]
-        retrieved_metadata = [metadata[i] for i in indices]
+        # Serve rephrasings of recently answered questions from the semantic cache
+        query_embedding = (await run_in_threadpool(embedder.embed, question))[0]
+        answer_cache = rag_components["answer_cache"]
+        index_version = snapshot.version
+        cached = await run_in_threadpool(answer_cache.lookup, query_embedding, index_version) if answer_cache else None
         
-        # Answer with LLM
-        result = rag.answer_question(question, retrieved_chunks, retrieved_metadata, generator)
-        
-        # Save to database (Safe Save)
-        try:
-            doc_id_ref = retrieved_metadata[0].get('doc_id') if retrieved_metadata else None
-            # Verify if doc exists to prevent FK violation (Extra Safety)
-            if doc_id_ref:
-                existing_doc = DocumentCRUD.get(db, doc_id_ref)
-                if not existing_doc:
-                    logger.warning(f"Document {doc_id_ref} referenced in index but not found in DB. Saving query as orphan.")
-                    doc_id_ref = None
-
-            query_record = QueryCRUD.create(
-                db,
-                document_id=doc_id_ref,
-                question=question,
-                answer=result['answer'],
-                confidence=result['confidence'],
-                latency_ms=result['latency']['total_ms'],
-                retrieved_chunks=result['retrieved_chunks'],
-                citations=result['citations'],
-                support_details=result['support_details']
+        if cached:
+            result, doc_id_ref = cached['result'], cached['document_id']
+            result['latency'] = {'total_ms': (time.time() - t_request) * 1000}
+        else:
+            retrieved_chunks, retrieved_metadata, chunk_embeddings, indices = await run_in_threadpool(
+                retrieve, snapshot, question, query_embedding
             )
-        except Exception as e:
-            logger.error(f"Error saving query record: {str(e)}")
-            # Continue anyway, don't fail the request just because logging failed
+            
+            # Answer with LLM
+            result = await rag.aanswer_question(
+                question, retrieved_chunks, retrieved_metadata, generator, chunk_embeddings, chunk_ids=indices
+            )
+            doc_id_ref = retrieved_metadata[0].get('doc_id') if retrieved_metadata else None
+            
+            # Generator failures come back as "Error ..." strings; don't cache those
+            if answer_cache and not result['answer'].startswith('Error'):
+                answer_cache.store(query_embedding, index_version, {'result': result, 'document_id': doc_id_ref})
+        
+        await run_in_threadpool(save_query, db, question, result, doc_id_ref)
         
         return {
             "question": question,
@@ -383,7 +557,8 @@ def answer_query(
             "citations": result['citations'],
             "latency_ms": result['latency']['total_ms'],
             "retrieved_chunks": result['retrieved_chunks'],
-            "support_details": result['support_details']
+            "support_details": result['support_details'],
+            "context": result.get('context')
         }
     
     except Exception as e:
@@ -392,6 +567,135 @@ def answer_query(
         import traceback
         logger.error(traceback.format_exc())
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if snapshot:
+            snapshot.release()
+
+
+def sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.get("/api/query/stream")
+async def stream_query(question: str):
+    """
+    Answer a question as Server-Sent Events: `token` events carry generated
+    text as it arrives, `sentence` events the grounding and citation of each
+    completed sentence, and a final `done` event the full QueryResponse. If
+    verification rejects the answer, `done.answer` replaces the streamed text.
+    """
+    if not rag_components["generator"]:
+        raise HTTPException(status_code=503, detail="RAG system not initialized")
+    if rag_components["index_data"] is None:
+        raise HTTPException(status_code=400, detail="Index not built. Please build index first.")
+
+    # The index is acquired once the stream starts, so the finally below
+    # always runs. Blocking stages go to the threadpool.
+    async def events():
+        t_request = time.time()
+        snapshot = acquire_index()
+        db = SessionLocal()
+        try:
+            if snapshot is None:
+                raise RuntimeError("Index not built. Please build index first.")
+            rag = rag_components["rag"]
+            query_embedding = (await run_in_threadpool(rag_components["embedder"].embed, question))[0]
+            answer_cache = rag_components["answer_cache"]
+            cached = None
+            if answer_cache:
+                cached = await run_in_threadpool(answer_cache.lookup, query_embedding, snapshot.version)
+
+            if cached:
+                result, doc_id_ref = cached['result'], cached['document_id']
+                result['latency'] = {'total_ms': (time.time() - t_request) * 1000}
+                yield sse('token', {'text': result['answer']})
+            else:
+                retrieved_chunks, retrieved_metadata, chunk_embeddings, indices = await run_in_threadpool(
+                    retrieve, snapshot, question, query_embedding
+                )
+                doc_id_ref = retrieved_metadata[0].get('doc_id') if retrieved_metadata else None
+                async for event, data in rag.aanswer_question_stream(
+                    question, retrieved_chunks, retrieved_metadata, rag_components["generator"],
+                    chunk_embeddings, chunk_ids=indices
+                ):
+                    if event == 'done':
+                        result = data
+                    else:
+                        yield sse(event, data)
+                if answer_cache and not result['answer'].startswith('Error'):
+                    answer_cache.store(query_embedding, snapshot.version, {'result': result, 'document_id': doc_id_ref})
+
+            await run_in_threadpool(save_query, db, question, result, doc_id_ref)
+            yield sse('done', {
+                "question": question,
+                "answer": result['answer'],
+                "confidence": result['confidence'],
+                "citations": result['citations'],
+                "latency_ms": result['latency']['total_ms'],
+                "retrieved_chunks": result['retrieved_chunks'],
+                "support_details": result['support_details'],
+                "context": result.get('context')
+            })
+        except Exception as e:
+            logger.error(f"Error streaming answer: {str(e)}")
+            yield sse('error', {'detail': str(e)})
+        finally:
+            db.close()
+            if snapshot:
+                snapshot.release()
+
+    return StreamingResponse(
+        events(), media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.get("/api/query/cache/stats")
+async def get_answer_cache_stats():
+    """Get semantic answer cache hit/miss counters"""
+    answer_cache = rag_components["answer_cache"]
+    if not answer_cache:
+        return {"enabled": False}
+    return {"enabled": True, **answer_cache.stats()}
+
+
+@app.delete("/api/query/cache")
+async def clear_answer_cache():
+    """Drop all cached answers"""
+    if rag_components["answer_cache"]:
+        rag_components["answer_cache"].clear()
+    return {"message": "Answer cache cleared"}
+
+
+@app.get("/api/metrics/batching")
+async def get_batching_stats():
+    """Get micro-batch size distributions for the query-time embedder and reranker"""
+    embedder = rag_components["embedder"]
+    reranker = rag_components["rag"].reranker if rag_components["rag"] else None
+    return {
+        "embedding": {"enabled": True, **embedder.stats()} if isinstance(embedder, BatchingEmbedder) else {"enabled": False},
+        "rerank": {"enabled": True, **reranker.stats()} if reranker else {"enabled": False}
+    }
+
+
+@app.get("/api/metrics/generation")
+async def get_generation_stats():
+    """Get Gemini API call counters, or local model batching and throughput"""
+    generator = rag_components["generator"]
+    if isinstance(generator, AsyncGeminiGenerator):
+        return {"backend": "gemini", **generator.stats()}
+    if isinstance(generator, Generator):
+        return {"backend": "local", **generator.stats()}
+    return {"backend": None}
+
+
+@app.get("/api/metrics/extraction")
+async def get_extraction_stats():
+    """Get PDF page extraction throughput and extraction cache stats"""
+    return {
+        **pdf_extractor.stats(),
+        "cache": extraction_cache.stats() if extraction_cache else None
+    }
 
 
 @app.get("/api/query/history")
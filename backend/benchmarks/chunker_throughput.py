@@ -0,0 +1,90 @@
+import sys
+import os
+import re
+import time
+import argparse
+
+# Add backend dir to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from config import config
+from src.modules.rag_system import TextChunker
+
+def decode_chunks(tokenizer, text, chunk_size, overlap):
+    """The previous TextChunker.chunk_text: encode the page, decode every window"""
+    text = re.sub(r'##[a-zA-Z\s]+', '', text)
+    text = re.sub(r'\s+', ' ', text).strip()
+    tokens = tokenizer.encode(text, add_special_tokens=False)
+    chunks = []
+    for i in range(0, len(tokens), chunk_size - overlap):
+        chunk_text = tokenizer.decode(tokens[i:i + chunk_size], skip_special_tokens=True)
+        if chunk_text.strip():
+            chunks.append(chunk_text)
+    return chunks
+
+def load_documents(files):
+    if files:
+        documents = []
+        for path in files:
+            with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+                documents.append(f.read())
+        return documents
+
+    from src.database.db import SessionLocal
+    from src.database.crud import DocumentCRUD
+    db = SessionLocal()
+    try:
+        documents = []
+        for page in DocumentCRUD.iter_ready(db):
+            contents = DocumentCRUD.get_contents(db, [doc.id for doc in page])
+            documents.extend(content for content in contents.values() if content)
+        return documents
+    finally:
+        db.close()
+
+def pages_of(document):
+    if isinstance(document, list):
+        return [page.get('text', '') for page in document]
+    return [document]
+
+def run_benchmark():
+    parser = argparse.ArgumentParser(description='Compare decode-based and offset-based chunking throughput')
+    parser.add_argument('files', nargs='*', help='text files to chunk (default: all ready documents in the DB)')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--batch-documents', type=int, default=config.RAG_CONFIG['chunking']['batch_documents'])
+    args = parser.parse_args()
+
+    documents = load_documents(args.files)
+    pages = [page for document in documents for page in pages_of(document)]
+    mb = sum(len(page.encode('utf-8')) for page in pages) / 1e6
+    print(f"{len(documents)} documents, {len(pages)} pages, {mb:.1f} MB of text")
+
+    chunk_size = config.RAG_CONFIG['chunking']['chunk_size']
+    overlap = config.RAG_CONFIG['chunking']['overlap']
+    chunker = TextChunker(chunk_size=chunk_size, overlap=overlap)
+    snapping = TextChunker(chunk_size=chunk_size, overlap=overlap, snap_to_sentences=True, tokenizer=chunker.tokenizer)
+
+    def legacy():
+        return sum(len(decode_chunks(chunker.tokenizer, page, chunk_size, overlap)) for page in pages)
+
+    def offsets(target):
+        def run():
+            n_chunks = 0
+            for start in range(0, len(documents), args.batch_documents):
+                for chunks, _ in target.chunk_batch(documents[start:start + args.batch_documents]):
+                    n_chunks += len(chunks)
+            return n_chunks
+        return run
+
+    print(f"\n{'method':<22}{'chunks':<10}{'best s':<10}{'MB/s':<10}{'pages/s':<10}")
+    for name, run in (('encode/decode', legacy), ('offsets', offsets(chunker)), ('offsets + sentences', offsets(snapping))):
+        timings = []
+        for _ in range(args.repeat):
+            t_start = time.time()
+            n_chunks = run()
+            timings.append(time.time() - t_start)
+        best = min(timings)
+        print(f"{name:<22}{n_chunks:<10}{best:<10.2f}{mb / best:<10.2f}{len(pages) / best:<10.1f}")
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,58 @@
+import sys
+import os
+import time
+import argparse
+
+# Add backend dir to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from config import config
+from src.modules.rag_system import FAISSManager
+
+def measure(index, vectors, ids, k, n_queries):
+    recall = FAISSManager.recall_at_k(index, vectors, ids, k=k, n_queries=n_queries)
+    queries = vectors[:n_queries]
+    t_start = time.time()
+    index.search(queries, k)
+    latency_ms = (time.time() - t_start) * 1000 / len(queries)
+    return recall, latency_ms
+
+def run_benchmark():
+    parser = argparse.ArgumentParser(description='Compare FAISS index types on the current corpus')
+    parser.add_argument('--k', type=int, default=config.RAG_CONFIG['retrieval']['k_retrieve'])
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--types', nargs='+', default=list(FAISSManager.INDEX_TYPES))
+    parser.add_argument('--nprobe', nargs='+', type=int, default=[1, 4, 16, 64])
+    parser.add_argument('--ef-search', nargs='+', type=int, default=[16, 64, 256])
+    args = parser.parse_args()
+
+    index, _, _ = FAISSManager.load(str(config.INDEXES_DIR))
+    ids, vectors = FAISSManager.extract_vectors(index)
+    print(f"Loaded {len(ids)} vectors from {FAISSManager.index_type(index)} index")
+    if FAISSManager.index_type(index) == 'ivf_pq':
+        print("WARNING: vectors reconstructed from IVF-PQ codes are approximate")
+
+    print(f"\n{'type':<10}{'setting':<16}{'recall@' + str(args.k):<12}{'ms/query':<10}{'build s':<8}")
+    for index_type in args.types:
+        # Force the requested type regardless of corpus size
+        params = dict(config.RAG_CONFIG['retrieval'], index_type=index_type, flat_threshold=0)
+        t_start = time.time()
+        candidate = FAISSManager.build_index(vectors, ids, params)
+        build_s = time.time() - t_start
+
+        if index_type in ('ivf_flat', 'ivf_pq'):
+            settings = [('nprobe', v) for v in args.nprobe]
+        elif index_type == 'hnsw':
+            settings = [('ef_search', v) for v in args.ef_search]
+        else:
+            settings = [(None, None)]
+
+        for knob, value in settings:
+            if knob:
+                FAISSManager.configure_search(candidate, dict(params, **{knob: value}))
+            recall, latency_ms = measure(candidate, vectors, ids, args.k, args.queries)
+            setting = f"{knob}={value}" if knob else "exact"
+            print(f"{index_type:<10}{setting:<16}{recall:<12.3f}{latency_ms:<10.3f}{build_s:<8.1f}")
+
+if __name__ == "__main__":
+    run_benchmark()
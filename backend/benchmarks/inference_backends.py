@@ -0,0 +1,100 @@
+import sys
+import os
+import time
+import argparse
+import numpy as np
+
+# Add backend dir to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from config import config
+from src.modules.inference_backends import BACKENDS, cosine_parity
+from src.modules.rag_system import Embedder, Reranker
+
+QUERY = "What does the warranty cover?"
+
+def load_texts(n):
+    """Chunks from the current index, or a synthetic corpus without one"""
+    try:
+        from src.modules.rag_system import FAISSManager
+        _, chunks, _ = FAISSManager.load(str(config.INDEXES_DIR))
+        texts = [chunks[i] for i in range(min(n, len(chunks)))]
+        if texts:
+            return texts
+    except Exception as e:
+        print(f"No index to sample chunks from ({e}); using synthetic text")
+    words = "warranty claim defect repair invoice revenue policy password office holiday support order".split()
+    rng = np.random.default_rng(0)
+    return [' '.join(rng.choice(words, size=rng.integers(20, 120))) for _ in range(n)]
+
+def time_call(fn, repeats):
+    fn()  # warm-up
+    timings = []
+    for _ in range(repeats):
+        t_start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - t_start)
+    return result, min(timings)
+
+def load(factory, backend):
+    try:
+        return factory(backend)
+    except Exception as e:
+        print(f"{backend:<12}unavailable: {e}")
+        return None
+
+def bench_embedder(texts, backends, repeats, batch_size):
+    inference = config.RAG_CONFIG['inference']
+    model_name = config.RAG_CONFIG['embedding']['model_name']
+    print(f"\nEmbedder {model_name}, {len(texts)} texts")
+    print(f"{'backend':<12}{'texts/s':<12}{'speedup':<10}{'mean cos':<12}{'min cos':<10}")
+    reference, reference_s = None, None
+    for backend in backends:
+        embedder = load(lambda b: Embedder(model_name, backend=b, onnx_dir=inference['onnx_dir']), backend)
+        if embedder is None:
+            continue
+        embeddings, seconds = time_call(lambda: embedder.embed(texts, batch_size=batch_size), repeats)
+        if reference is None:
+            reference, reference_s = embeddings, seconds
+        mean, worst = cosine_parity(reference, embeddings)
+        print(f"{backend:<12}{len(texts) / seconds:<12.1f}{reference_s / seconds:<10.2f}{mean:<12.5f}{worst:<10.5f}")
+
+def bench_reranker(texts, backends, repeats):
+    inference = config.RAG_CONFIG['inference']
+    retrieval = config.RAG_CONFIG['retrieval']
+    model_name = retrieval['rerank_model_name']
+    print(f"\nReranker {model_name}, {len(texts)} pairs")
+    print(f"{'backend':<12}{'pairs/s':<12}{'speedup':<10}{'max |diff|':<12}{'top-5 kept':<10}")
+    reference, reference_s = None, None
+    for backend in backends:
+        reranker = load(lambda b: Reranker(
+            model_name, max_length=retrieval['rerank_max_length'], max_batch_size=retrieval['rerank_batch_size'],
+            cache_size=0, backend=b, onnx_dir=inference['onnx_dir']
+        ), backend)
+        if reranker is None:
+            continue
+        scores, seconds = time_call(lambda: reranker.score(QUERY, texts), repeats)
+        reranker.batcher.close()
+        if reference is None:
+            reference, reference_s = scores, seconds
+        top = len(set(np.argsort(-reference)[:5]) & set(np.argsort(-scores)[:5])) / min(5, len(texts))
+        print(f"{backend:<12}{len(texts) / seconds:<12.1f}{reference_s / seconds:<10.2f}"
+              f"{np.abs(reference - scores).max():<12.5f}{top:<10.0%}")
+
+def run_benchmark():
+    parser = argparse.ArgumentParser(description='Compare CPU inference backends for the embedder and reranker')
+    parser.add_argument('--texts', type=int, default=256)
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--batch-size', type=int, default=32)
+    # torch (fp32) first: speedup and parity are measured against it
+    parser.add_argument('--backends', nargs='+', choices=BACKENDS, default=list(BACKENDS))
+    parser.add_argument('--skip-reranker', action='store_true')
+    args = parser.parse_args()
+
+    texts = load_texts(args.texts)
+    bench_embedder(texts, args.backends, args.repeats, args.batch_size)
+    if not args.skip_reranker:
+        bench_reranker(texts, args.backends, args.repeats)
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -1,4 +1,5 @@
 from src.database.db import SessionLocal
+from src.database.crud import DocumentCRUD
 from src.database.models import Document
 
 db = SessionLocal()
@@ -6,9 +7,11 @@ docs = db.query(Document).all()
 
 print(f"Found {len(docs)} documents.")
 for doc in docs:
+    content = DocumentCRUD.get_content(db, doc.id) or ''
+    text = content if isinstance(content, str) else "\n".join(page['text'] for page in content)
     print(f"\n--- Document: {doc.original_filename} (ID: {doc.id}) ---")
-    print(f"Content Length: {len(doc.content)}")
-    print(f"First 500 chars:\n{doc.content[:500]}")
+    print(f"Content Length: {len(text)}")
+    print(f"First 500 chars:\n{text[:500]}")
     print("-" * 50)
 
 db.close()
@@ -1,24 +1,23 @@
-import pickle
-import json
-from pathlib import Path
 from config import config
+from src.modules.chunk_store import ChunkStore, MetadataStore
+from src.modules.rag_system import FAISSManager
 
-indexes_dir = config.INDEXES_DIR
-print(f"Checking indexes in {indexes_dir}")
+manifest = FAISSManager.current_version(config.INDEXES_DIR)
+indexes_dir = FAISSManager.resolve(config.INDEXES_DIR)
+print(f"Checking indexes in {indexes_dir} (version: {manifest['version'] if manifest else 'unversioned'})")
 
-# Check metadata.json
+# Check metadata store
 try:
-    with open(indexes_dir / 'metadata.json', 'r') as f:
-        meta = json.load(f)
-    print("metadata.json: OK (Valid JSON)")
-    print(f"Sample metadata: {meta[0] if meta else 'Empty'}")
+    meta = MetadataStore(indexes_dir)
+    print(f"metadata: OK ({len(meta)} rows, columns: {list(meta.column_types)})")
+    print(f"Sample metadata: {meta[0] if len(meta) else 'Empty'}")
 except Exception as e:
-    print(f"metadata.json: ERROR ({e})")
+    print(f"metadata: ERROR ({e})")
 
-# Check chunks.pkl
+# Check chunk store
 try:
-    with open(indexes_dir / 'chunks.pkl', 'rb') as f:
-        chunks = pickle.load(f)
-    print(f"chunks.pkl: OK ({len(chunks)} chunks)")
+    chunks = ChunkStore(indexes_dir)
+    live = int(chunks.live.sum())
+    print(f"chunks: OK ({live} chunks, {len(chunks) - live} tombstoned)")
 except Exception as e:
-    print(f"chunks.pkl: ERROR ({e})")
+    print(f"chunks: ERROR ({e})")
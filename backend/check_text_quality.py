@@ -1,4 +1,5 @@
 from src.database.db import SessionLocal
+from src.database.crud import DocumentCRUD
 from src.database.models import Document
 import random
 
@@ -7,23 +8,25 @@ docs = db.query(Document).all()
 
 print(f"Found {len(docs)} documents.")
 for doc in docs:
+    content = DocumentCRUD.get_content(db, doc.id) or ''
+    text = content if isinstance(content, str) else "\n".join(page['text'] for page in content)
     print(f"\n{'='*50}")
     print(f"Document: {doc.original_filename} (ID: {doc.id})")
-    print(f"Total Length: {len(doc.content)} chars")
+    print(f"Total Length: {len(text)} chars")
     
     # Check start
     print(f"\n--- Start (First 500 chars) ---")
-    print(doc.content[:500])
+    print(text[:500])
     
     # Check middle (to see if it's just headers/footers repeats)
-    if len(doc.content) > 2000:
-        mid_start = len(doc.content) // 2
+    if len(text) > 2000:
+        mid_start = len(text) // 2
         print(f"\n--- Middle (500 chars at {mid_start}) ---")
-        print(doc.content[mid_start:mid_start+500])
+        print(text[mid_start:mid_start+500])
     
     # Check for common garbage
     garbage_indicators = ['\x00', '', '(cid:']
-    found_garbage = [g for g in garbage_indicators if g in doc.content]
+    found_garbage = [g for g in garbage_indicators if g in text]
     if found_garbage:
         print(f"\n[WARNING] Found potential garbage characters: {found_garbage}")
 
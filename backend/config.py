@@ -26,10 +26,12 @@ class Config:
     RAW_DIR = DATA_DIR / "raw"
     PROCESSED_DIR = DATA_DIR / "processed"
     INDEXES_DIR = DATA_DIR / "indexes"
+    CACHE_DIR = DATA_DIR / "cache"
+    EMBEDDING_CACHE_DIR = CACHE_DIR / "embeddings"
     LOGS_DIR = BASE_DIR / "logs"
     
     # Create directories
-    for dir_path in [DATA_DIR, RAW_DIR, PROCESSED_DIR, INDEXES_DIR, LOGS_DIR]:
+    for dir_path in [DATA_DIR, RAW_DIR, PROCESSED_DIR, INDEXES_DIR, CACHE_DIR, EMBEDDING_CACHE_DIR, LOGS_DIR]:
         dir_path.mkdir(parents=True, exist_ok=True)
     
     # Gemini
@@ -39,21 +41,147 @@ class Config:
     RAG_CONFIG = {
         "chunking": {
             "chunk_size": 512,
-            "overlap": 50
+            "overlap": 50,
+            # Move window edges onto nearby sentence boundaries
+            "snap_to_sentences": False,
+            # Documents tokenized together in one batched tokenizer call
+            "batch_documents": 16
         },
         "embedding": {
             "model_name": "sentence-transformers/all-MiniLM-L6-v2",
-            "batch_size": 32
+            "batch_size": 32,
+            # Reuse embeddings of byte-identical chunks across index builds
+            "use_cache": True,
+            # Query-time micro-batching: concurrent requests are encoded
+            # together once max_batch_size texts are queued or the oldest
+            # has waited max_wait_ms
+            "micro_batching": True,
+            "max_batch_size": 32,
+            "max_wait_ms": 5
+        },
+        # CPU inference for the embedder and reranker: torch (fp32),
+        # torch_int8 (dynamic quantization) or onnx (onnxruntime, from the
+        # exports written by export_models.py)
+        "inference": {
+            "embedding_backend": "torch",
+            "rerank_backend": "torch",
+            "onnx_dir": str(DATA_DIR / "models" / "onnx")
         },
         "retrieval": {
             "k_retrieve": 10,
             "k_rerank": 5,
-            "use_reranker": True
+            "use_reranker": True,
+            "rerank_model_name": "cross-encoder/ms-marco-MiniLM-L-6-v2",
+            # Cross-encoder input length in tokens; pairs from concurrent
+            # requests are scored in batches of up to rerank_batch_size
+            "rerank_max_length": 512,
+            "rerank_batch_size": 64,
+            "rerank_max_wait_ms": 5,
+            # LRU cache of (query, chunk id) scores; 0 disables it
+            "rerank_cache_size": 10000,
+            # FAISS index: flat | ivf_flat | ivf_pq | hnsw. Corpora below
+            # flat_threshold vectors always use the exact flat index.
+            "index_type": "flat",
+            "flat_threshold": 20000,
+            "nprobe": 16,
+            "ef_search": 64,
+            "hnsw_m": None,  # None picks M from corpus size
+            "pq_m": 48,
+            "pq_bits": 8,
+            "max_train_size": 100000,
+            # Log recall@k against exact search after building an ANN index
+            "recall_check_queries": 100,
+            # Hybrid retrieval: BM25 results fused with dense results by
+            # weighted reciprocal rank fusion. sparse_weight 0 disables BM25.
+            "dense_weight": 1.0,
+            "sparse_weight": 1.0,
+            "rrf_k": 60,
+            "fusion_depth": 2,  # candidates per side = k_retrieve * fusion_depth
+            "bm25_k1": 1.2,
+            "bm25_b": 0.75
+        },
+        "ingestion": {
+            # Uploads are streamed to disk in blocks of this size
+            "upload_chunk_bytes": 1024 * 1024,
+            # Threads running text extraction after upload
+            "extraction_workers": 2,
+            # PDF pages are extracted in parallel by a process pool
+            # (None uses one worker per CPU); short PDFs stay in-process
+            "pdf_workers": None,
+            "pdf_page_timeout_seconds": 30,
+            "pdf_min_parallel_pages": 16,
+            # Bulk uploads insert Document rows this many per transaction
+            "bulk_insert_batch": 200,
+            # Extracted text cached in PROCESSED_DIR by file SHA-256
+            "extraction_cache": True,
+            "extraction_cache_max_mb": 1024
+        },
+        "dedup": {
+            # Near-duplicate chunks (estimated Jaccard similarity of word
+            # shingles >= threshold) are embedded and indexed once
+            "enabled": True,
+            "threshold": 0.85,
+            "num_perm": 128,
+            "bands": 16,
+            "shingle_size": 5
+        },
+        "indexing": {
+            "incremental": True,
+            # Fraction of tombstoned chunks that triggers renumbering the index
+            "compact_threshold": 0.25,
+            # Index versions kept on disk, and how often the API checks for a new one
+            "keep_versions": 2,
+            "reload_poll_seconds": 2.0,
+            # Streaming build: documents fetched per DB page, chunks per
+            # embedding batch, and batches buffered between pipeline stages
+            "page_size": 64,
+            "pipeline_batch_size": 256,
+            "queue_size": 4,
+            # Chunks per chunk store segment; a build seals each full segment
+            # with its BM25 postings and MinHash state and keeps no more in memory
+            "segment_rows": 100000,
+            # Builds run in a separate worker process started with the API;
+            # set build_worker False when running `python -m src.modules.build_jobs` yourself
+            "build_worker": True,
+            "job_poll_seconds": 1.0,
+            "progress_flush_seconds": 1.0
         },
         "generation": {
             "model_name": "models/gemini-pro-latest",
             "max_new_tokens": 1024,
-            "temperature": 0.3
+            "temperature": 0.3,
+            # Gemini API calls: concurrency cap, per-attempt timeout and
+            # whole-call deadline, jittered retries on 429/5xx, circuit breaker
+            "max_concurrency": 8,
+            "timeout_seconds": 30.0,
+            "deadline_seconds": 60.0,
+            "max_retries": 3,
+            "retry_backoff_seconds": 0.5,
+            "retry_backoff_max_seconds": 8.0,
+            "breaker_failures": 5,
+            "breaker_reset_seconds": 30.0,
+            # Prompt context is packed into this many tokens of the context
+            # tokenizer. Chunk token counts are stored at index time, so
+            # rebuild the index after changing the tokenizer.
+            "context_packing": True,
+            "context_tokenizer": "google/flan-t5-small",
+            "max_context_tokens": 3000,
+            # Local seq2seq model used without a Gemini key. Concurrent prompts
+            # are decoded together once local_max_batch_size are queued or the
+            # oldest has waited local_max_wait_ms; local_quantize loads the
+            # model with int8 dynamic quantization
+            "local_model_name": "google/flan-t5-small",
+            "local_quantize": False,
+            "local_max_batch_size": 8,
+            "local_max_wait_ms": 20,
+            "local_max_new_tokens": 200
+        },
+        "cache": {
+            # Semantic answer cache in front of /api/query/answer
+            "enabled": True,
+            "similarity_threshold": 0.92,
+            "max_entries": 1024,
+            "ttl_seconds": 3600
         },
         "verification": {
             "similarity_threshold": 0.1,
@@ -1,22 +1,21 @@
-import pickle
 from pathlib import Path
+from src.modules.chunk_store import ChunkStore
+from src.modules.rag_system import FAISSManager
 
-index_dir = Path("data/indexes")
-chunks_path = index_dir / "chunks.pkl"
+index_dir = FAISSManager.resolve(Path("data/indexes"))
 
-if not chunks_path.exists():
-    print("Chunks file not found.")
+if not ChunkStore.exists(index_dir):
+    print("Chunk store not found.")
     exit()
 
-with open(chunks_path, 'rb') as f:
-    chunks = pickle.load(f)
+chunks = ChunkStore(index_dir)
 
 print(f"Total chunks: {len(chunks)}")
 print("Searching for 'Section 6'...")
 
 found = False
 for i, chunk in enumerate(chunks):
-    if "section 6" in chunk.lower():
+    if chunk and "section 6" in chunk.lower():
         print(f"\n[Chunk {i}]:")
         print(chunk)
         found = True
@@ -15,22 +15,23 @@ def generate_questions():
     print("Initializing Generator for Question Generation...")
     
     # Load Index to get chunks
-    index_path = config.INDEXES_DIR / 'index.bin'
-    if not index_path.exists():
+    if not FAISSManager.exists(config.INDEXES_DIR):
         print("Index not found. Cannot generate questions.")
         return
 
     _, chunks, metadata = FAISSManager.load(str(config.INDEXES_DIR))
     
     # Load Generator (LLM)
-    generator = Generator(config.RAG_CONFIG['generation']['model_name'])
+    generator = Generator(config.RAG_CONFIG['generation']['local_model_name'])
     
     generated_set = []
     
     # We want ~50 questions. If we have fewer chunks, we loop or take all.
     # If we have many chunks, we sample.
     num_to_generate = 50
-    selected_indices = random.choices(range(len(chunks)), k=num_to_generate)
+    # Skip tombstoned chunks left behind by incremental index updates
+    live_indices = [i for i, chunk in enumerate(chunks) if chunk is not None]
+    selected_indices = random.choices(live_indices, k=num_to_generate)
     
     print(f"Generating {num_to_generate} questions from {len(chunks)} chunks...")
     
@@ -12,6 +12,7 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from config import config
 from src.modules.rag_system import RAGSystem, FAISSManager
 from src.modules.generator import Generator
+from src.modules.sparse_index import BM25Index
 
 def calculate_metrics(generated, reference):
     # ROUGE
@@ -57,10 +58,11 @@ def run_eval():
             rag.reranker = None # Force disable 
         
         # Load Index
-        index, chunks, metadata = FAISSManager.load(str(config.INDEXES_DIR))
+        index, chunks, metadata = FAISSManager.load(str(config.INDEXES_DIR), config.RAG_CONFIG['retrieval'])
         rag.index = index
         rag.chunks = chunks
         rag.metadata = metadata
+        sparse_index = BM25Index.load(FAISSManager.resolve(config.INDEXES_DIR))
         
         # Generator is handled inside RAGSystem now
         generator = None
@@ -94,12 +96,16 @@ def run_eval():
         try:
             # RAG Pipeline
             query_emb = rag.embedder.embed(query)[0]
-            indices, distances = FAISSManager.search(rag.index, query_emb, k=config.RAG_CONFIG['retrieval']['k_retrieve'])
+            indices, scores = FAISSManager.hybrid_search(
+                rag.index, sparse_index, query, query_emb,
+                config.RAG_CONFIG['retrieval']['k_retrieve'], config.RAG_CONFIG['retrieval']
+            )
             
             retrieved_chunks = [rag.chunks[i] for i in indices]
             chunk_metadata_list = [rag.metadata[i] for i in indices]
+            chunk_embeddings = FAISSManager.reconstruct(rag.index, indices)
             
-            response = rag.answer_question(query, retrieved_chunks, chunk_metadata_list, generator)
+            response = rag.answer_question(query, retrieved_chunks, chunk_metadata_list, generator, chunk_embeddings)
             
             answer_text = response['answer']
             confidence = response['confidence']
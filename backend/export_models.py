@@ -0,0 +1,85 @@
+import sys
+import os
+import argparse
+
+# Add backend dir to path
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+
+SAMPLE_QUERY = "What does the warranty cover?"
+SAMPLE_TEXTS = [
+    "The warranty covers manufacturing defects for two years from the date of purchase.",
+    "Accidental damage, such as drops or liquid spills, is not covered by the warranty.",
+    "To file a claim, contact support with your order number and a description of the fault.",
+    "Quarterly revenue grew by twelve percent, driven by subscriptions in Europe.",
+    "The office is closed on public holidays and reopens the following working day.",
+    "Passwords must be at least twelve characters long and rotated every ninety days."
+]
+
+def check_embedder(model_name, onnx_dir):
+    from src.modules.rag_system import Embedder
+    from src.modules.inference_backends import cosine_parity
+
+    reference = Embedder(model_name, backend='torch').embed(SAMPLE_TEXTS)
+    exported = Embedder(model_name, backend='onnx', onnx_dir=onnx_dir).embed(SAMPLE_TEXTS)
+    mean, worst = cosine_parity(reference, exported)
+    print(f"  cosine vs torch fp32: mean {mean:.5f}, min {worst:.5f}")
+
+def check_reranker(model_name, onnx_dir, max_length):
+    import numpy as np
+    from src.modules.rag_system import Reranker
+
+    reference = Reranker(model_name, max_length=max_length, backend='torch', cache_size=0)
+    exported = Reranker(model_name, max_length=max_length, backend='onnx', onnx_dir=onnx_dir, cache_size=0)
+    try:
+        expected = reference.score(SAMPLE_QUERY, SAMPLE_TEXTS)
+        scores = exported.score(SAMPLE_QUERY, SAMPLE_TEXTS)
+    finally:
+        reference.batcher.close()
+        exported.batcher.close()
+    same_order = list(np.argsort(-expected)) == list(np.argsort(-scores))
+    print(f"  max |score - torch fp32|: {np.abs(expected - scores).max():.5f}, "
+          f"ranking {'unchanged' if same_order else 'CHANGED'}")
+
+def export_models(models, output, quantize, check):
+    from config import config
+    from src.modules.inference_backends import export_embedder, export_reranker
+
+    rag_config = config.RAG_CONFIG
+    embedder_name = rag_config['embedding']['model_name']
+    reranker_name = rag_config['retrieval']['rerank_model_name']
+    max_length = rag_config['retrieval']['rerank_max_length']
+    try:
+        if 'embedder' in models:
+            print(f"Exporting embedder {embedder_name}{' (int8)' if quantize else ''}...")
+            print(f"  written to {export_embedder(embedder_name, output, quantize=quantize)}")
+            if check:
+                check_embedder(embedder_name, output)
+        if 'reranker' in models:
+            print(f"Exporting reranker {reranker_name}{' (int8)' if quantize else ''}...")
+            print(f"  written to {export_reranker(reranker_name, output, max_length=max_length, quantize=quantize)}")
+            if check:
+                check_reranker(reranker_name, output, max_length)
+        print("Export Complete! Set RAG_CONFIG['inference'] backends to 'onnx' to use it.")
+    except Exception as e:
+        print(f"Error: {e}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Export the embedder and reranker to ONNX for onnxruntime')
+    parser.add_argument('--models', nargs='+', choices=['embedder', 'reranker'], default=['embedder', 'reranker'])
+    parser.add_argument('--output', default=None, help="Defaults to RAG_CONFIG['inference']['onnx_dir']")
+    parser.add_argument('--quantize', action='store_true',
+                        help='Also write a dynamically int8-quantized graph and load that one')
+    parser.add_argument('--no-check', action='store_true', help='Skip the parity check against torch fp32')
+    parser.add_argument('--allow-download', action='store_true',
+                        help='Fetch models missing from the local Hugging Face cache')
+    args = parser.parse_args()
+
+    if not args.allow_download:
+        # Must be set before transformers is imported
+        os.environ.setdefault('HF_HUB_OFFLINE', '1')
+        os.environ.setdefault('TRANSFORMERS_OFFLINE', '1')
+
+    from config import config
+    export_models(
+        args.models, args.output or config.RAG_CONFIG['inference']['onnx_dir'], args.quantize, not args.no_check
+    )
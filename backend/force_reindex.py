@@ -1,97 +1,66 @@
 import sys
 import os
-import requests
+import argparse
 
 # Add parent dir to path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from config import config
-from src.database.db import SessionLocal
-from src.database.crud import DocumentCRUD, IndexMetadataCRUD
-from src.modules.rag_system import TextChunker, Embedder, FAISSManager
+from src.database.crud import IndexBuildJobCRUD
+from src.database.db import SessionLocal, init_db
+from src.modules.build_jobs import BuildWorker
 
-def force_rebuild():
-    print("Force Rebuilding Index...")
+def force_rebuild(incremental=False):
+    print("Incremental Index Update..." if incremental else "Force Rebuilding Index...")
     
+    # Goes through the job queue like API-triggered builds, so it never runs
+    # alongside the build worker; whichever process claims the job runs it
+    init_db()
     db = SessionLocal()
     try:
-        # Get all documents
-        documents = DocumentCRUD.get_all(db)
-        if not documents:
-            print("No documents found in DB.")
-            return
-
-        print(f"Found {len(documents)} documents. Re-chunking...")
+        IndexBuildJobCRUD.fail_interrupted(db)
+        job, coalesced = IndexBuildJobCRUD.enqueue(db, incremental=incremental)
+        if coalesced:
+            print(f"Joined queued build job {job.id}")
+    finally:
+        db.close()
 
-        # Initialize Components
-        chunker = TextChunker(
-            chunk_size=config.RAG_CONFIG['chunking']['chunk_size'],
-            overlap=config.RAG_CONFIG['chunking']['overlap']
+    indexing = config.RAG_CONFIG['indexing']
+    try:
+        worker = BuildWorker(
+            config.RAG_CONFIG, str(config.INDEXES_DIR), SessionLocal,
+            embedding_cache_dir=config.EMBEDDING_CACHE_DIR,
+            poll_seconds=indexing['job_poll_seconds'],
+            flush_seconds=indexing['progress_flush_seconds']
         )
-        embedder = Embedder(config.RAG_CONFIG['embedding']['model_name'])
-
-        all_chunks = []
-        all_metadata = []
-
-        import json
-
-        for doc in documents:
-            # Handle JSON content
-            try:
-                if doc.content.strip().startswith('['):
-                    input_content = json.loads(doc.content)
-                else:
-                    input_content = doc.content
-            except:
-                input_content = doc.content
-
-            # Chunk (Now uses clean logic from rag_system.py)
-            chunks, metadatas = chunker.chunk(input_content)
-            
-            for i, chunk in enumerate(chunks):
-                all_chunks.append(chunk)
-                meta = {
-                    'source_file': doc.original_filename,
-                    'doc_id': doc.id,
-                    'chunk_idx': i
-                }
-                if metadatas and i < len(metadatas):
-                    meta.update(metadatas[i])
-                all_metadata.append(meta)
-            
-            # Update DB status
-            DocumentCRUD.update_processed(db, doc.id, len(chunks))
-            DocumentCRUD.update_indexed(db, doc.id)
-
-        print(f"Generated {len(all_chunks)} chunks. Embedding...")
+        job = worker.run_until_done(job.id)
+        if job.status != 'succeeded':
+            print(f"Build job {job.id} {job.status}" + (f": {job.error}" if job.error else ""))
+            return
+        stats = job.stats
+        if not stats:
+            print("No documents found in DB.")
+            return
 
-        # Embed
-        embeddings = embedder.embed(
-            all_chunks,
-            batch_size=config.RAG_CONFIG['embedding']['batch_size']
-        )
-        
-        # Build Index
-        index = FAISSManager.build_index(embeddings)
-        
-        # Save
-        FAISSManager.save(index, all_chunks, all_metadata, str(config.INDEXES_DIR))
-        
-        # Update Metadata
-        IndexMetadataCRUD.create(
-            db,
-            index_name="main_index",
-            document_ids=[d.id for d in documents],
-            total_chunks=len(all_chunks),
-            index_size_mb=len(all_chunks) * 0.0001
-        )
-        
+        print(f"Documents indexed: {stats['documents_indexed']}")
+        print(f"Chunks added: {stats['chunks_added']}, removed: {stats['chunks_removed']}")
+        print(f"Total chunks: {stats['total_chunks']}")
+        if stats.get('duplicates_skipped'):
+            print(f"Near-duplicates skipped: {stats['duplicates_skipped']} ({stats['dedup_ratio']:.1%}), "
+                  f"~{stats['embedding_seconds_saved']:.1f}s of embedding saved")
+        if 'version' in stats:
+            print(f"Index version: {stats['version']}")
+        if 'embedding_cache' in stats:
+            cache_stats = stats['embedding_cache']
+            print(f"Embedding cache: {cache_stats['hits']} hits / {cache_stats['misses']} misses "
+                  f"({cache_stats['hit_rate']:.1%}), {cache_stats['text_bytes_saved'] / 1e6:.1f} MB not re-encoded")
         print("Index Rebuild Complete!")
         
     except Exception as e:
         print(f"Error: {e}")
-    finally:
-        db.close()
 
 if __name__ == "__main__":
-    force_rebuild()
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--incremental', action='store_true', help='Only index new and changed documents')
+    args = parser.parse_args()
+    force_rebuild(incremental=args.incremental)
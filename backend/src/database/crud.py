@@ -1,23 +1,104 @@
+from sqlalchemy import and_, case, func, or_, update
 from sqlalchemy.orm import Session
-from .models import Document, Query, IndexMetadata
+from .models import Document, DocumentPage, Query, IndexMetadata, IndexBuildJob
 from datetime import datetime
-from typing import List, Optional
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+import json
+import os
+import uuid
+import zlib
+
+# Extracted text: plain text, or a list of {'text', 'page'} dicts for PDFs
+Content = Union[str, List[dict]]
+
+
+def _pending_condition(since: Optional[datetime]):
+    condition = Document.indexed == False
+    if since is not None:
+        condition = or_(condition, Document.updated_at > since)
+    return condition
+
+
+def _process_alive(pid: Optional[int]) -> bool:
+    # Our own pid can only be a previous process's: callers have not claimed a job yet
+    if not pid or pid == os.getpid():
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:  # exists, owned by another user
+        return True
+    return True
+
+
+def _page_rows(document_id: str, content: Content) -> List[dict]:
+    if isinstance(content, str):
+        pages = [(None, content)]
+    else:
+        pages = [(page.get('page'), page.get('text', '')) for page in content]
+    return [
+        {'document_id': document_id, 'seq': seq, 'page': page, 'data': zlib.compress(text.encode('utf-8'))}
+        for seq, (page, text) in enumerate(pages)
+    ]
+
+
+def _parse_legacy(content: str) -> Content:
+    # Document.content held a JSON list of pages for PDFs
+    if content.strip().startswith('['):
+        try:
+            return json.loads(content)
+        except ValueError:
+            pass
+    return content
+
+
+def _from_page_rows(rows) -> Content:
+    if len(rows) == 1 and rows[0].page is None:
+        return zlib.decompress(rows[0].data).decode('utf-8')
+    return [{'text': zlib.decompress(row.data).decode('utf-8'), 'page': row.page} for row in rows]
+
 
 class DocumentCRUD:
     @staticmethod
-    def create(db: Session, filename: str, original_filename: str, file_type: str, content: str, file_size: int):
+    def create(db: Session, filename: str, original_filename: str, file_type: str, content: Optional[Content],
+               file_size: int, status: str = 'ready', content_hash: Optional[str] = None):
         db_document = Document(
             filename=filename,
             original_filename=original_filename,
             file_type=file_type,
-            content=content,
-            file_size=file_size
+            file_size=file_size,
+            status=status,
+            content_hash=content_hash
         )
         db.add(db_document)
+        if content is not None:
+            db.flush()
+            db.bulk_insert_mappings(DocumentPage, _page_rows(db_document.id, content))
         db.commit()
         db.refresh(db_document)
         return db_document
     
+    @staticmethod
+    def bulk_create(db: Session, rows: List[dict]) -> List[str]:
+        """
+        Insert many documents (dicts of create() arguments) as one executemany
+        in a single transaction. Returns their ids in order.
+        """
+        now = datetime.utcnow()
+        mappings = [
+            {'processed': False, 'indexed': False, 'chunk_count': 0, 'status': 'ready', **row,
+             'id': str(uuid.uuid4()), 'created_at': now, 'updated_at': now}
+            for row in rows
+        ]
+        try:
+            db.bulk_insert_mappings(Document, mappings)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        return [mapping['id'] for mapping in mappings]
+    
     @staticmethod
     def get(db: Session, document_id: str) -> Optional[Document]:
         return db.query(Document).filter(Document.id == document_id).first()
@@ -26,10 +107,128 @@ class DocumentCRUD:
     def get_all(db: Session) -> List[Document]:
         return db.query(Document).all()
     
+    @staticmethod
+    def count(db: Session) -> int:
+        return db.query(func.count(Document.id)).scalar()
+    
+    @staticmethod
+    def list_page(db: Session, limit: int = 100, cursor: Optional[str] = None) -> Tuple[List[Document], Optional[str]]:
+        """
+        Newest documents first, `limit` at a time. `cursor` is the next_cursor
+        of the previous page; returns (documents, next_cursor or None).
+        """
+        query = db.query(Document)
+        if cursor:
+            # Keyset pagination on (created_at, id): no OFFSET scan on deep pages
+            created_at, _, last_id = cursor.partition('|')
+            created_at = datetime.fromisoformat(created_at)
+            query = query.filter(or_(
+                Document.created_at < created_at,
+                and_(Document.created_at == created_at, Document.id < last_id)
+            ))
+        documents = query.order_by(Document.created_at.desc(), Document.id.desc()).limit(limit + 1).all()
+        if len(documents) <= limit:
+            return documents, None
+        documents = documents[:limit]
+        return documents, f"{documents[-1].created_at.isoformat()}|{documents[-1].id}"
+    
+    @staticmethod
+    def get_contents(db: Session, document_ids: List[str]) -> Dict[str, Content]:
+        """Extracted text of several documents, decompressed, in two queries"""
+        rows = db.query(DocumentPage).filter(DocumentPage.document_id.in_(document_ids)) \
+            .order_by(DocumentPage.document_id, DocumentPage.seq).all()
+        pages = {}
+        for row in rows:
+            pages.setdefault(row.document_id, []).append(row)
+        contents = {document_id: _from_page_rows(doc_rows) for document_id, doc_rows in pages.items()}
+        
+        # Documents extracted before document_pages existed
+        missing = [document_id for document_id in document_ids if document_id not in contents]
+        if missing:
+            legacy = db.query(Document.id, Document.content) \
+                .filter(Document.id.in_(missing), Document.content.isnot(None)).all()
+            contents.update({row.id: _parse_legacy(row.content) for row in legacy})
+        return contents
+    
+    @staticmethod
+    def get_content(db: Session, document_id: str) -> Optional[Content]:
+        return DocumentCRUD.get_contents(db, [document_id]).get(document_id)
+    
     @staticmethod
     def get_indexed(db: Session) -> List[Document]:
         return db.query(Document).filter(Document.indexed == True).all()
     
+    @staticmethod
+    def get_ready(db: Session) -> List[Document]:
+        """Documents whose text has been extracted"""
+        return db.query(Document).filter(Document.status == 'ready').all()
+    
+    @staticmethod
+    def get_by_status(db: Session, status: str) -> List[Document]:
+        return db.query(Document).filter(Document.status == status).all()
+    
+    @staticmethod
+    def get_ids(db: Session) -> List[str]:
+        return [row.id for row in db.query(Document.id).all()]
+    
+    @staticmethod
+    def get_pending(db: Session, since: Optional[datetime] = None) -> List[Document]:
+        """Extracted documents that were never indexed or changed after `since`"""
+        return db.query(Document).filter(Document.status == 'ready', _pending_condition(since)).all()
+    
+    @staticmethod
+    def get_pending_ids(db: Session, since: Optional[datetime] = None) -> List[str]:
+        rows = db.query(Document.id).filter(Document.status == 'ready', _pending_condition(since)).all()
+        return [row.id for row in rows]
+    
+    @staticmethod
+    def count_ready(db: Session) -> int:
+        return db.query(Document).filter(Document.status == 'ready').count()
+    
+    @staticmethod
+    def iter_ready(db: Session, page_size: int = 64, pending: bool = False,
+                   since: Optional[datetime] = None) -> Iterator[List[Document]]:
+        """
+        Extracted documents in pages of `page_size`, ordered by id. With
+        `pending`, only the documents get_pending() would return.
+        """
+        query = db.query(Document).filter(Document.status == 'ready')
+        if pending:
+            query = query.filter(_pending_condition(since))
+        last_id = None
+        while True:
+            # Keyset pagination: stable while the caller commits between pages
+            page_query = query if last_id is None else query.filter(Document.id > last_id)
+            page = page_query.order_by(Document.id).limit(page_size).all()
+            if not page:
+                return
+            last_id = page[-1].id
+            yield page
+    
+    @staticmethod
+    def set_content(db: Session, document_id: str, content: Content):
+        """Store extracted text as compressed pages and mark the document ready for indexing"""
+        db_document = db.query(Document).filter(Document.id == document_id).first()
+        if db_document:
+            db.query(DocumentPage).filter(DocumentPage.document_id == document_id).delete(synchronize_session=False)
+            db.bulk_insert_mappings(DocumentPage, _page_rows(document_id, content))
+            db_document.content = None
+            db_document.status = 'ready'
+            db_document.error = None
+            db_document.updated_at = datetime.utcnow()
+            db.commit()
+        return db_document
+    
+    @staticmethod
+    def set_failed(db: Session, document_id: str, error: str):
+        db_document = db.query(Document).filter(Document.id == document_id).first()
+        if db_document:
+            db_document.status = 'failed'
+            db_document.error = error
+            db_document.updated_at = datetime.utcnow()
+            db.commit()
+        return db_document
+    
     @staticmethod
     def update_processed(db: Session, document_id: str, chunk_count: int):
         db_document = db.query(Document).filter(Document.id == document_id).first()
@@ -40,6 +239,39 @@ class DocumentCRUD:
             db.commit()
         return db_document
     
+    @staticmethod
+    def mark_indexed(db: Session, chunk_counts: Dict[str, int], unchanged_since: Optional[datetime] = None,
+                     commit: bool = True, batch_size: int = 1000) -> int:
+        """
+        Set processed, indexed and chunk_count for many documents: one UPDATE
+        per `batch_size` ids, with chunk_count picked by a CASE on the id.
+        Documents updated after `unchanged_since` are left untouched, and
+        updated_at is kept, so neither kind looks changed to a build that
+        starts from `unchanged_since`. With `commit=False` the caller commits,
+        e.g. together with IndexMetadataCRUD.create. Returns the number of
+        rows updated.
+        """
+        document_ids = list(chunk_counts)
+        updated = 0
+        for start in range(0, len(document_ids), batch_size):
+            batch = document_ids[start:start + batch_size]
+            statement = update(Document).where(Document.id.in_(batch))
+            if unchanged_since is not None:
+                statement = statement.where(Document.updated_at <= unchanged_since)
+            result = db.execute(
+                statement.values(
+                    processed=True,
+                    indexed=True,
+                    chunk_count=case({document_id: chunk_counts[document_id] for document_id in batch}, value=Document.id),
+                    # Explicit, or the column's onupdate would bump it
+                    updated_at=Document.updated_at
+                ).execution_options(synchronize_session=False)
+            )
+            updated += result.rowcount
+        if commit:
+            db.commit()
+        return updated
+    
     @staticmethod
     def update_indexed(db: Session, document_id: str):
         db_document = db.query(Document).filter(Document.id == document_id).first()
@@ -53,6 +285,8 @@ class DocumentCRUD:
     def delete(db: Session, document_id: str):
         db_document = db.query(Document).filter(Document.id == document_id).first()
         if db_document:
+            # Explicit, as SQLite does not enforce the ON DELETE CASCADE
+            db.query(DocumentPage).filter(DocumentPage.document_id == document_id).delete(synchronize_session=False)
             db.delete(db_document)
             db.commit()
         return db_document
@@ -92,7 +326,11 @@ class QueryCRUD:
 
 class IndexMetadataCRUD:
     @staticmethod
-    def create(db: Session, index_name: str, document_ids: list, total_chunks: int, index_size_mb: float):
+    def create(db: Session, index_name: str, document_ids: list, total_chunks: int, index_size_mb: float,
+               last_indexed: Optional[datetime] = None):
+        # Later builds pick up documents updated after `last_indexed`: pass
+        # the time the build started reading them
+        last_indexed = last_indexed or datetime.utcnow()
         # Upsert logic: Check if exists first
         db_metadata = db.query(IndexMetadata).filter(IndexMetadata.index_name == index_name).first()
         
@@ -101,7 +339,7 @@ class IndexMetadataCRUD:
             db_metadata.document_ids = document_ids
             db_metadata.total_chunks = total_chunks
             db_metadata.index_size_mb = index_size_mb
-            db_metadata.last_indexed = datetime.utcnow()
+            db_metadata.last_indexed = last_indexed
             db_metadata.updated_at = datetime.utcnow()
         else:
             # Create new
@@ -110,7 +348,7 @@ class IndexMetadataCRUD:
                 document_ids=document_ids,
                 total_chunks=total_chunks,
                 index_size_mb=index_size_mb,
-                last_indexed=datetime.utcnow()
+                last_indexed=last_indexed
             )
             db.add(db_metadata)
             
@@ -137,4 +375,126 @@ class IndexMetadataCRUD:
             db_metadata.last_indexed = datetime.utcnow()
             db_metadata.updated_at = datetime.utcnow()
             db.commit()
-        return db_metadata
\ No newline at end of file
+        return db_metadata
+
+
+class IndexBuildJobCRUD:
+    ACTIVE = ('queued', 'running')
+    
+    @staticmethod
+    def enqueue(db: Session, incremental: bool = True):
+        """
+        Request a build. Returns (job, coalesced): a trigger while a job is
+        already queued joins it, otherwise a new queued job is created (which
+        runs after the current build, if any).
+        """
+        job = db.query(IndexBuildJob).filter(IndexBuildJob.status == 'queued').with_for_update() \
+            .order_by(IndexBuildJob.created_at).first()
+        coalesced = job is not None
+        if job:
+            job.triggers += 1
+            # A full rebuild request wins over incremental ones
+            job.incremental = job.incremental and incremental
+        else:
+            job = IndexBuildJob(status='queued', incremental=incremental, triggers=1)
+            db.add(job)
+        db.commit()
+        db.refresh(job)
+        return job, coalesced
+    
+    @staticmethod
+    def get(db: Session, job_id: str) -> Optional[IndexBuildJob]:
+        return db.query(IndexBuildJob).filter(IndexBuildJob.id == job_id).first()
+    
+    @staticmethod
+    def get_recent(db: Session, limit: int = 20) -> List[IndexBuildJob]:
+        return db.query(IndexBuildJob).order_by(IndexBuildJob.created_at.desc()).limit(limit).all()
+    
+    @staticmethod
+    def get_active(db: Session) -> Optional[IndexBuildJob]:
+        """The running job, else the queued one"""
+        jobs = db.query(IndexBuildJob).filter(IndexBuildJob.status.in_(IndexBuildJobCRUD.ACTIVE)).all()
+        return next((job for job in jobs if job.status == 'running'), jobs[0] if jobs else None)
+    
+    @staticmethod
+    def claim_next(db: Session, worker_pid: int) -> Optional[IndexBuildJob]:
+        """Move the oldest queued job to running; None if there is none or a build is running"""
+        if db.query(IndexBuildJob).filter(IndexBuildJob.status == 'running').count():
+            return None
+        job = db.query(IndexBuildJob).filter(IndexBuildJob.status == 'queued') \
+            .order_by(IndexBuildJob.created_at).first()
+        if job is None:
+            return None
+        # Conditional update: only one claimer can win the row
+        claimed = db.query(IndexBuildJob) \
+            .filter(IndexBuildJob.id == job.id, IndexBuildJob.status == 'queued') \
+            .update({
+                IndexBuildJob.status: 'running',
+                IndexBuildJob.worker_pid: worker_pid,
+                IndexBuildJob.started_at: datetime.utcnow(),
+                IndexBuildJob.stage: 'preparing'
+            }, synchronize_session=False)
+        db.commit()
+        if not claimed:
+            return None
+        db.refresh(job)
+        return job
+    
+    @staticmethod
+    def update_progress(db: Session, job_id: str, stage: str, progress: dict):
+        db.query(IndexBuildJob).filter(IndexBuildJob.id == job_id).update({
+            IndexBuildJob.stage: stage,
+            IndexBuildJob.progress: progress,
+            IndexBuildJob.updated_at: datetime.utcnow()
+        }, synchronize_session=False)
+        db.commit()
+    
+    @staticmethod
+    def finish(db: Session, job_id: str, status: str, stats: Optional[dict] = None, error: Optional[str] = None):
+        db_job = db.query(IndexBuildJob).filter(IndexBuildJob.id == job_id).first()
+        if db_job:
+            db_job.status = status
+            db_job.stats = stats
+            db_job.error = error
+            db_job.finished_at = datetime.utcnow()
+            db.commit()
+        return db_job
+    
+    @staticmethod
+    def request_cancel(db: Session, job_id: str) -> Optional[IndexBuildJob]:
+        """Cancel a queued job outright; ask the worker to stop a running one"""
+        db_job = db.query(IndexBuildJob).filter(IndexBuildJob.id == job_id).first()
+        if db_job and db_job.status in IndexBuildJobCRUD.ACTIVE:
+            db_job.cancel_requested = True
+            if db_job.status == 'queued':
+                db_job.status = 'cancelled'
+                db_job.finished_at = datetime.utcnow()
+            db.commit()
+            db.refresh(db_job)
+        return db_job
+    
+    @staticmethod
+    def is_cancel_requested(db: Session, job_id: str) -> bool:
+        row = db.query(IndexBuildJob.cancel_requested).filter(IndexBuildJob.id == job_id).first()
+        return bool(row and row.cancel_requested)
+    
+    @staticmethod
+    def fail_interrupted(db: Session) -> int:
+        """
+        Mark jobs left running by a worker process that no longer exists as
+        failed; returns how many. Jobs of live workers are left alone.
+        """
+        running = db.query(IndexBuildJob.id, IndexBuildJob.worker_pid) \
+            .filter(IndexBuildJob.status == 'running').all()
+        dead = [job_id for job_id, pid in running if not _process_alive(pid)]
+        if not dead:
+            return 0
+        count = db.query(IndexBuildJob) \
+            .filter(IndexBuildJob.id.in_(dead), IndexBuildJob.status == 'running').update({
+                IndexBuildJob.status: 'failed',
+                IndexBuildJob.error: 'Interrupted: build worker stopped',
+                IndexBuildJob.finished_at: datetime.utcnow()
+            }, synchronize_session=False)
+        db.commit()
+        return count
+
@@ -2,9 +2,9 @@
 # FILE: backend/src/database/models.py
 # ============================================================================
 
-from sqlalchemy import Column, Integer, String, Text, DateTime, Float, Boolean, JSON, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, DateTime, Float, Boolean, JSON, ForeignKey, LargeBinary
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, deferred
 from datetime import datetime
 import uuid
 
@@ -18,7 +18,14 @@ class Document(Base):
     original_filename = Column(String(255), nullable=False)
     file_type = Column(String(20), nullable=False)  # pdf, txt, docx
     file_size = Column(Integer)
-    content = Column(Text)
+    # Extracted text lives in document_pages; content only holds text of
+    # documents extracted before that table existed. Deferred so listings
+    # never load it.
+    content = deferred(Column(Text))
+    content_hash = Column(String(64), index=True)  # sha256 of the uploaded file
+    # pending while text extraction runs, then ready or failed
+    status = Column(String(20), default='ready', server_default='ready', index=True)
+    error = Column(Text)
     processed = Column(Boolean, default=False)
     indexed = Column(Boolean, default=False)
     chunk_count = Column(Integer, default=0)
@@ -29,6 +36,15 @@ class Document(Base):
     queries = relationship("Query", back_populates="document")
 
 
+class DocumentPage(Base):
+    __tablename__ = "document_pages"
+    
+    document_id = Column(String, ForeignKey("documents.id", ondelete="CASCADE"), primary_key=True)
+    seq = Column(Integer, primary_key=True)  # order within the document
+    page = Column(Integer)  # PDF page number; NULL for plain text
+    data = Column(LargeBinary, nullable=False)  # zlib-compressed UTF-8 text
+
+
 class Query(Base):
     __tablename__ = "queries"
     
@@ -57,4 +73,24 @@ class IndexMetadata(Base):
     index_size_mb = Column(Float)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
-    last_indexed = Column(DateTime)
\ No newline at end of file
+    last_indexed = Column(DateTime)
+
+
+class IndexBuildJob(Base):
+    __tablename__ = "index_build_jobs"
+    
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    # queued -> running -> succeeded | failed | cancelled
+    status = Column(String(20), default='queued', nullable=False, index=True)
+    incremental = Column(Boolean, default=True)
+    triggers = Column(Integer, default=1)  # build requests coalesced into this job
+    cancel_requested = Column(Boolean, default=False)
+    stage = Column(String(20))
+    progress = Column(JSON)  # per-stage counters, throughput and ETA
+    stats = Column(JSON)
+    error = Column(Text)
+    worker_pid = Column(Integer)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
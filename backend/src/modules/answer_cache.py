@@ -0,0 +1,108 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+class SemanticAnswerCache:
+    """
+    Caches query responses by question embedding.
+
+    A lookup returns the stored response of the most similar cached question
+    when its cosine similarity reaches `threshold`. Entries expire after
+    `ttl_seconds`, the least recently used entry is evicted when the cache is
+    full, and everything is dropped when the index version changes.
+    """
+
+    def __init__(self, threshold=0.92, max_entries=1024, ttl_seconds=3600):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        # slot -> (created_at, response); ordered from least to most recently used
+        self._entries = OrderedDict()
+        self._vectors = None
+        self._free_slots = list(range(max_entries - 1, -1, -1))
+
+    @staticmethod
+    def _normalize(embedding):
+        embedding = np.asarray(embedding, dtype='float32').ravel()
+        return embedding / max(float(np.linalg.norm(embedding)), 1e-12)
+
+    def _check_version(self, version):
+        if version != self.version:
+            self._clear()
+            self.version = version
+
+    def _clear(self):
+        self._entries.clear()
+        self._free_slots = list(range(self.max_entries - 1, -1, -1))
+
+    def _evict(self, slot):
+        del self._entries[slot]
+        self._free_slots.append(slot)
+
+    def lookup(self, embedding, version):
+        """Return a copy of the cached response for a similar question, or None"""
+        query = self._normalize(embedding)
+        with self._lock:
+            self._check_version(version)
+            if not self._entries:
+                self.misses += 1
+                return None
+
+            slots = np.fromiter(self._entries.keys(), dtype=np.int64, count=len(self._entries))
+            similarities = self._vectors[slots] @ query
+            best = int(np.argmax(similarities))
+            slot = int(slots[best])
+            created_at, response = self._entries[slot]
+
+            if time.time() - created_at > self.ttl_seconds:
+                self._evict(slot)
+                self.evictions += 1
+                self.misses += 1
+                return None
+            if similarities[best] < self.threshold:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(slot)
+            self.hits += 1
+            return copy.deepcopy(response)
+
+    def store(self, embedding, version, response):
+        vector = self._normalize(embedding)
+        with self._lock:
+            self._check_version(version)
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_entries, len(vector)), dtype='float32')
+            if not self._free_slots:
+                oldest = next(iter(self._entries))
+                self._evict(oldest)
+                self.evictions += 1
+            slot = self._free_slots.pop()
+            self._vectors[slot] = vector
+            self._entries[slot] = (time.time(), copy.deepcopy(response))
+
+    def clear(self):
+        with self._lock:
+            self._clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'index_version': self.version
+            }
@@ -0,0 +1,134 @@
+import logging
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class MicroBatcher:
+    """
+    Collects items submitted from many threads and runs them in batches.
+
+    A single worker thread takes the first waiting item, keeps collecting
+    until `max_batch_size` items are queued or `max_wait_ms` has passed, then
+    calls `process_batch(items)` once and resolves each caller's future with
+    the matching result.
+    """
+
+    def __init__(self, process_batch, max_batch_size=32, max_wait_ms=5, name='micro-batcher'):
+        self.process_batch = process_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._batch_sizes = Counter()
+        self._busy_seconds = 0.0
+        self._worker = threading.Thread(target=self._run, name=name, daemon=True)
+        self._worker.start()
+
+    def submit(self, item):
+        future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def __call__(self, item):
+        return self.submit(item).result()
+
+    def _collect(self):
+        first = self._queue.get()
+        if first is _STOP:
+            return None
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                # Past the deadline, still take whatever is already queued
+                if remaining > 0:
+                    item = self._queue.get(timeout=remaining)
+                else:
+                    item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                # Finish this batch, then stop on the next loop
+                self._queue.put(_STOP)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+            items = [item for item, _ in batch]
+            t_start = time.monotonic()
+            try:
+                results = self.process_batch(items)
+            except Exception as e:
+                logger.error(f"Batch of {len(items)} failed: {str(e)}")
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            finally:
+                with self._lock:
+                    self._batch_sizes[len(items)] += 1
+                    self._busy_seconds += time.monotonic() - t_start
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+
+    def close(self):
+        self._queue.put(_STOP)
+        self._worker.join()
+
+    def stats(self):
+        with self._lock:
+            batches = sum(self._batch_sizes.values())
+            items = sum(size * count for size, count in self._batch_sizes.items())
+            return {
+                'batches': batches,
+                'items': items,
+                'mean_batch_size': items / batches if batches else 0.0,
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': self.max_wait * 1000,
+                'queue_depth': self._queue.qsize(),
+                'busy_seconds': self._busy_seconds,
+                # batch size -> number of batches of that size
+                'batch_size_histogram': dict(sorted(self._batch_sizes.items()))
+            }
+
+
+class BatchingEmbedder:
+    """
+    Embedder front-end for the query path: texts from concurrent requests
+    are encoded together in one forward pass instead of one pass per thread.
+    """
+
+    def __init__(self, embedder, max_batch_size=32, max_wait_ms=5):
+        self.embedder = embedder
+        self.batcher = MicroBatcher(
+            self._embed_batch, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms, name='embedding-batcher'
+        )
+
+    def _embed_batch(self, texts):
+        return list(self.embedder.embed(texts, batch_size=len(texts)))
+
+    def embed(self, texts, batch_size=32):
+        if isinstance(texts, str):
+            texts = [texts]
+        # Large jobs are already batched; send them straight to the encoder
+        if len(texts) > self.batcher.max_batch_size:
+            return self.embedder.embed(texts, batch_size=batch_size)
+        futures = [self.batcher.submit(text) for text in texts]
+        return np.stack([future.result() for future in futures])
+
+    def stats(self):
+        return self.batcher.stats()
@@ -0,0 +1,166 @@
+import logging
+import os
+import threading
+import time
+
+from src.database.crud import IndexBuildJobCRUD
+from src.modules.index_builder import IndexBuilder, BuildProgress, BuildCancelled
+
+logger = logging.getLogger(__name__)
+
+
+class JobProgress(BuildProgress):
+    """
+    Persists build progress to the job row at most every `flush_seconds`, and
+    polls the row for a cancel request at the same rate.
+    """
+
+    def __init__(self, session_factory, job_id, flush_seconds=1.0):
+        super().__init__()
+        self.job_id = job_id
+        self.flush_seconds = flush_seconds
+        self._db = session_factory()
+        self._db_lock = threading.Lock()
+        self._last_flush = 0.0
+        self._last_poll = 0.0
+        self._cancelled = False
+
+    def changed(self):
+        self.flush(force=False)
+
+    def flush(self, force=True):
+        # Stage threads report concurrently; one of them writes, the others skip
+        if not self._db_lock.acquire(blocking=force):
+            return
+        try:
+            if not force and time.time() - self._last_flush < self.flush_seconds:
+                return
+            self._last_flush = time.time()
+            IndexBuildJobCRUD.update_progress(self._db, self.job_id, self.stage, self.snapshot())
+        except Exception as e:
+            self._db.rollback()
+            logger.warning(f"Could not save progress of build job {self.job_id}: {str(e)}")
+        finally:
+            self._db_lock.release()
+
+    def cancelled(self):
+        if self._cancelled or time.time() - self._last_poll < self.flush_seconds:
+            return self._cancelled
+        with self._db_lock:
+            self._last_poll = time.time()
+            self._cancelled = IndexBuildJobCRUD.is_cancel_requested(self._db, self.job_id)
+        return self._cancelled
+
+    def close(self):
+        self._db.close()
+
+
+class BuildWorker:
+    """
+    Runs queued index build jobs one at a time.
+
+    Meant to live in its own process (see run_worker) so chunking and
+    embedding never compete with the API for the GIL. The builder, and with
+    it the embedding model, is kept between jobs.
+    """
+
+    def __init__(self, rag_config, index_dir, session_factory, embedding_cache_dir=None,
+                 poll_seconds=1.0, flush_seconds=1.0):
+        self.builder = IndexBuilder(rag_config, index_dir, embedding_cache_dir=embedding_cache_dir)
+        self.session_factory = session_factory
+        self.poll_seconds = poll_seconds
+        self.flush_seconds = flush_seconds
+
+    def run_once(self):
+        """Claim and run the next queued job. Returns False if there was none."""
+        db = self.session_factory()
+        try:
+            job = IndexBuildJobCRUD.claim_next(db, os.getpid())
+            if job is None:
+                return False
+            self._run(db, job.id, job.incremental)
+            return True
+        finally:
+            db.close()
+
+    def run_until_done(self, job_id):
+        """
+        Run queued jobs in this process until job `job_id` has finished, and
+        return it. Another worker may claim the job first; then this waits.
+        """
+        while True:
+            db = self.session_factory()
+            try:
+                job = IndexBuildJobCRUD.get(db, job_id)
+            finally:
+                db.close()
+            if job is None or job.status not in IndexBuildJobCRUD.ACTIVE:
+                return job
+            if not self.run_once():
+                time.sleep(self.poll_seconds)
+
+    def _run(self, db, job_id, incremental):
+        logger.info(f"Starting index build job {job_id} (incremental: {incremental})")
+        progress = JobProgress(self.session_factory, job_id, self.flush_seconds)
+        try:
+            stats = self.builder.build(db, incremental=incremental, progress=progress)
+        except BuildCancelled:
+            logger.info(f"Index build job {job_id} cancelled")
+            db.rollback()
+            IndexBuildJobCRUD.finish(db, job_id, 'cancelled')
+            return
+        except Exception as e:
+            logger.error(f"Index build job {job_id} failed: {str(e)}")
+            db.rollback()
+            IndexBuildJobCRUD.finish(db, job_id, 'failed', error=str(e))
+            return
+        finally:
+            progress.set_stage('done')
+            progress.flush()
+            progress.close()
+
+        if stats:
+            logger.info(
+                f"Index built successfully with {stats['total_chunks']} chunks "
+                f"(incremental: {stats['incremental']}, +{stats['chunks_added']} / -{stats['chunks_removed']})"
+            )
+        IndexBuildJobCRUD.finish(db, job_id, 'succeeded', stats=stats)
+
+    def run(self, stop_event):
+        db = self.session_factory()
+        try:
+            interrupted = IndexBuildJobCRUD.fail_interrupted(db)
+            if interrupted:
+                logger.warning(f"Marked {interrupted} interrupted build job(s) as failed")
+        finally:
+            db.close()
+
+        while not stop_event.is_set():
+            try:
+                if self.run_once():
+                    continue
+            except Exception as e:
+                logger.error(f"Build worker error: {str(e)}")
+            stop_event.wait(self.poll_seconds)
+
+
+def run_worker(stop_event=None):
+    """Process entry point: run build jobs until `stop_event` is set"""
+    from config import config
+    from src.database.db import SessionLocal, init_db
+
+    logging.basicConfig(level=config.LOG_LEVEL, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    init_db()
+    indexing = config.RAG_CONFIG['indexing']
+    worker = BuildWorker(
+        config.RAG_CONFIG, str(config.INDEXES_DIR), SessionLocal,
+        embedding_cache_dir=config.EMBEDDING_CACHE_DIR,
+        poll_seconds=indexing['job_poll_seconds'],
+        flush_seconds=indexing['progress_flush_seconds']
+    )
+    logger.info(f"Index build worker started (pid {os.getpid()})")
+    worker.run(stop_event or threading.Event())
+
+
+if __name__ == "__main__":
+    run_worker()
@@ -0,0 +1,192 @@
+import hashlib
+import logging
+import tarfile
+import uuid
+import zipfile
+from concurrent.futures import as_completed
+from pathlib import Path, PurePosixPath
+
+from src.database.crud import DocumentCRUD
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_TYPES = ('pdf', 'txt', 'docx')
+TAR_SUFFIXES = ('.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tbz2', '.tar.xz', '.txz')
+
+
+def archive_type(filename):
+    name = filename.lower()
+    if name.endswith('.zip'):
+        return 'zip'
+    if name.endswith(TAR_SUFFIXES):
+        return 'tar'
+    return None
+
+
+def iter_archive(fileobj, kind):
+    """Yield (entry name, file object) for the regular files of a zip or tar archive"""
+    if kind == 'zip':
+        with zipfile.ZipFile(fileobj) as archive:
+            for info in archive.infolist():
+                if not info.is_dir():
+                    with archive.open(info) as entry:
+                        yield info.filename, entry
+    else:
+        # Stream mode reads members in order without seeking back
+        with tarfile.open(fileobj=fileobj, mode='r|*') as archive:
+            for member in archive:
+                if member.isfile():
+                    yield member.name, archive.extractfile(member)
+
+
+def reserve_path(directory, name):
+    """
+    Create and return a new empty file in `directory` named after `name`,
+    with a random suffix if the name is taken. Creation is exclusive, so
+    concurrent uploads of one name never share a file.
+    """
+    path = Path(directory) / name
+    while True:
+        try:
+            with open(path, 'xb'):
+                return path
+        except FileExistsError:
+            path = path.parent / f"{Path(name).stem}-{uuid.uuid4().hex[:8]}{Path(name).suffix}"
+
+
+class BulkIngestor:
+    """
+    Stores many uploaded files, or the entries of zip/tar archives, in one
+    request.
+
+    Files are copied to `raw_dir` in blocks while hashing, Document rows are
+    inserted `batch_size` at a time in one transaction each, and text
+    extraction is handed to `submit_extraction(document_id, path, file_type)`,
+    which returns a Future of (status, error). `ingest()` yields one result
+    dict per file as soon as its row is committed, or, with `wait`, once its
+    extraction has finished. `store()` and `outcomes()` are its two phases,
+    for callers that must finish reading the uploads first.
+    """
+
+    def __init__(self, session_factory, raw_dir, submit_extraction, batch_size=200, chunk_bytes=1024 * 1024):
+        self.session_factory = session_factory
+        self.raw_dir = Path(raw_dir)
+        self.submit_extraction = submit_extraction
+        self.batch_size = batch_size
+        self.chunk_bytes = chunk_bytes
+
+    def _store(self, src, name):
+        """Copy one file to raw_dir; returns the Document row to insert"""
+        path = reserve_path(self.raw_dir, name)
+        sha256 = hashlib.sha256()
+        file_size = 0
+        with open(path, 'wb') as f:
+            while True:
+                block = src.read(self.chunk_bytes)
+                if not block:
+                    break
+                sha256.update(block)
+                file_size += len(block)
+                f.write(block)
+        return {
+            'filename': str(path),
+            'original_filename': name,
+            'file_type': name.rsplit('.', 1)[-1].lower(),
+            'content': None,
+            'file_size': file_size,
+            'status': 'pending',
+            'content_hash': sha256.hexdigest()
+        }
+
+    def _entries(self, uploads):
+        """Yield (result, row) per file; row is None for skipped files and errors"""
+        for upload_name, fileobj in uploads:
+            kind = archive_type(upload_name)
+            if kind is None:
+                yield from self._entry(upload_name, fileobj, None)
+                continue
+            try:
+                for entry_name, entry in iter_archive(fileobj, kind):
+                    yield from self._entry(entry_name, entry, upload_name)
+            except (zipfile.BadZipFile, tarfile.TarError, EOFError) as e:
+                yield {'filename': upload_name, 'status': 'error', 'error': f"Unreadable archive: {str(e)}"}, None
+
+    def _entry(self, entry_name, fileobj, archive):
+        # Archive paths are flattened to their file name, which also keeps
+        # entries like ../../x from escaping raw_dir
+        name = PurePosixPath(entry_name.replace('\\', '/')).name
+        result = {'filename': entry_name, 'archive': archive}
+        file_type = name.rsplit('.', 1)[-1].lower() if '.' in name else ''
+        if not name or name.startswith('.') or '__MACOSX/' in entry_name or file_type not in SUPPORTED_TYPES:
+            result.update(status='skipped', error=f"Unsupported file type: {entry_name}")
+            yield result, None
+            return
+        try:
+            row = self._store(fileobj, name)
+        except OSError as e:
+            result.update(status='error', error=str(e))
+            yield result, None
+            return
+        yield result, row
+
+    def _flush(self, db, batch, pending):
+        """Insert a batch of rows in one transaction and start their extraction"""
+        rows = [row for _, row in batch]
+        try:
+            ids = DocumentCRUD.bulk_create(db, rows)
+        except Exception as e:
+            logger.error(f"Bulk insert of {len(rows)} documents failed: {str(e)}")
+            for result, row in batch:
+                Path(row['filename']).unlink(missing_ok=True)
+                result.update(status='error', error=str(e))
+            return [result for result, _ in batch]
+
+        for (result, row), document_id in zip(batch, ids):
+            result.update(document_id=document_id, status='pending')
+            future = self.submit_extraction(document_id, row['filename'], row['file_type'])
+            pending[future] = result
+        return [result for result, _ in batch]
+
+    def ingest(self, uploads, wait=False):
+        """`uploads` is an iterable of (filename, binary file object)"""
+        pending = {}
+        for result in self.store(uploads, pending):
+            # With `wait`, committed files are reported when their extraction ends
+            if not wait or result['status'] != 'pending':
+                yield result
+        if wait:
+            yield from self.outcomes(pending)
+
+    def store(self, uploads, pending):
+        """
+        Copy the uploads to raw_dir and insert their rows, yielding one result
+        per file as its batch commits. Extractions started are added to
+        `pending` ({future: result}); the uploads are not read afterwards.
+        """
+        db = self.session_factory()
+        batch = []
+        try:
+            for result, row in self._entries(uploads):
+                if row is None:
+                    yield result
+                    continue
+                batch.append((result, row))
+                if len(batch) >= self.batch_size:
+                    yield from self._flush(db, batch, pending)
+                    batch = []
+            if batch:
+                yield from self._flush(db, batch, pending)
+        finally:
+            db.close()
+
+    @staticmethod
+    def outcomes(pending):
+        """Results of the extractions in `pending`, as each one finishes"""
+        for future in as_completed(pending):
+            result = pending[future]
+            try:
+                status, error = future.result()
+            except Exception as e:
+                status, error = 'failed', str(e)
+            result.update(status=status, error=error)
+            yield result
@@ -0,0 +1,504 @@
+import json
+import mmap
+import os
+import shutil
+from array import array
+from collections.abc import Sequence
+from pathlib import Path
+
+import numpy as np
+
+# On-disk layout. A store is a list of immutable segments, each holding a
+# contiguous run of chunk ids. A new index version hard-links the segments it
+# keeps from the previous one and only writes its new chunks.
+#   store.json            manifest: row count and the segments in id order
+#   chunks.live.npy       uint8[n], 0 for tombstoned chunks
+#   meta.overrides.json   metadata of rows changed after their segment was written
+#   seg<k>/store.json     segment manifest: row count and column types
+#   seg<k>/chunks.bin     UTF-8 chunk texts, concatenated
+#   seg<k>/chunks.offsets.npy   int64[n + 1] byte offsets into chunks.bin
+#   seg<k>/meta.<col>.npy       int64 values, or int32 codes into meta.strings.json
+#   seg<k>/meta.<col>.bin/.offsets.npy   JSON-encoded values for other types
+#   seg<k>/meta.strings.json    interned string tables per column
+# Stores written before segments (manifest version 1) keep the segment files
+# next to store.json and read as a single segment.
+MANIFEST = 'store.json'
+OVERRIDES = 'meta.overrides.json'
+INT_MISSING = np.iinfo(np.int64).min
+
+# Files describing a segment's rows, linked along with it; the sparse index
+# and near-duplicate state are kept per segment too
+SEGMENT_FILES = (MANIFEST, 'chunks.bin', 'chunks.offsets.npy', 'meta.*', 'sparse.*', 'dedup.*')
+
+# Known metadata columns; unknown keys are typed from their first value
+COLUMN_TYPES = {
+    'source_file': 'str',
+    'doc_id': 'str',
+    'page': 'int',
+    'chunk_idx': 'int',
+    'char_start': 'int',
+    'char_end': 'int',
+    'n_tokens': 'int',
+    'sources': 'json',
+}
+
+
+def _open_blob(path):
+    # mmap refuses zero-length files
+    if os.path.getsize(path) == 0:
+        return b''
+    with open(path, 'rb') as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def read_segments(directory):
+    """[(segment_dir, first id, row count)] of the store in `directory`"""
+    directory = Path(directory)
+    with open(directory / MANIFEST, 'r') as f:
+        manifest = json.load(f)
+    if 'segments' not in manifest:
+        return [(directory, 0, manifest['count'])]
+    segments, start = [], 0
+    for segment in manifest['segments']:
+        segments.append((directory / segment['name'], start, segment['count']))
+        start += segment['count']
+    return segments
+
+
+def segment_texts(directory):
+    """Chunk texts of one segment in id order; tombstones read as ''"""
+    offsets = np.load(Path(directory) / 'chunks.offsets.npy', mmap_mode='r')
+    blob = _open_blob(Path(directory) / 'chunks.bin')
+    for i in range(len(offsets) - 1):
+        yield blob[offsets[i]:offsets[i + 1]].decode('utf-8')
+
+
+def _find_segment(starts, i):
+    return int(np.searchsorted(starts, i, side='right')) - 1
+
+
+def _link(source, target):
+    try:
+        os.link(source, target)
+    except OSError:
+        # Filesystems without hard links
+        shutil.copy2(source, target)
+
+
+class ChunkStore(Sequence):
+    """Read-only, memory-mapped chunk texts. `store[i]` only touches chunk i's pages."""
+
+    def __init__(self, directory):
+        directory = Path(directory)
+        self.live = np.load(directory / 'chunks.live.npy', mmap_mode='r')
+        self.segments = read_segments(directory)
+        self.starts = np.array([start for _, start, _ in self.segments], dtype=np.int64)
+        self._texts = [
+            (np.load(segment_dir / 'chunks.offsets.npy', mmap_mode='r'), _open_blob(segment_dir / 'chunks.bin'))
+            for segment_dir, _, _ in self.segments
+        ]
+
+    @staticmethod
+    def exists(directory):
+        return (Path(directory) / MANIFEST).exists()
+
+    def __len__(self):
+        return len(self.live)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        i = int(i)
+        if i < 0:
+            i += len(self)
+        if not self.live[i]:
+            return None
+        k = _find_segment(self.starts, i)
+        offsets, blob = self._texts[k]
+        j = i - self.starts[k]
+        return blob[offsets[j]:offsets[j + 1]].decode('utf-8')
+
+
+class SegmentMetadata:
+    """Columnar metadata of one segment; rows are numbered from 0"""
+
+    def __init__(self, directory, start=0):
+        directory = Path(directory)
+        with open(directory / MANIFEST, 'r') as f:
+            manifest = json.load(f)
+        with open(directory / 'meta.strings.json', 'r') as f:
+            self.strings = json.load(f)
+        self.directory = directory
+        self.start = start
+        self.count = manifest['count']
+        self.column_types = manifest['columns']
+        self.columns = {}
+        for name, col_type in self.column_types.items():
+            if col_type == 'json':
+                self.columns[name] = (
+                    np.load(directory / f'meta.{name}.offsets.npy', mmap_mode='r'),
+                    _open_blob(directory / f'meta.{name}.bin')
+                )
+            else:
+                self.columns[name] = np.load(directory / f'meta.{name}.npy', mmap_mode='r')
+
+    def column(self, name):
+        """Raw column array (int values, or string codes into `strings[name]`)"""
+        return self.columns[name]
+
+    def value(self, name, i):
+        col_type = self.column_types.get(name)
+        if col_type is None:
+            return None
+        if col_type == 'json':
+            offsets, blob = self.columns[name]
+            start, end = offsets[i], offsets[i + 1]
+            return json.loads(blob[start:end]) if end > start else None
+        raw = self.columns[name][i]
+        if col_type == 'str':
+            return self.strings[name][raw] if raw >= 0 else None
+        return int(raw) if raw != INT_MISSING else None
+
+    def row(self, i):
+        meta = {}
+        for name in self.column_types:
+            value = self.value(name, i)
+            if value is not None:
+                meta[name] = value
+        return meta
+
+
+class MetadataStore(Sequence):
+    """
+    Chunk metadata. `store[i]` assembles a dict for one row on demand, from
+    the overrides or from its segment's columns.
+    """
+
+    def __init__(self, directory):
+        directory = Path(directory)
+        self.live = np.load(directory / 'chunks.live.npy', mmap_mode='r')
+        self.segments = [SegmentMetadata(path, start) for path, start, _ in read_segments(directory)]
+        self.starts = np.array([segment.start for segment in self.segments], dtype=np.int64)
+        self.overrides = {}
+        if (directory / OVERRIDES).exists():
+            with open(directory / OVERRIDES, 'r') as f:
+                self.overrides = {int(i): meta for i, meta in json.load(f).items()}
+        self.column_types = {}
+        for segment in self.segments:
+            for name, col_type in segment.column_types.items():
+                self.column_types.setdefault(name, col_type)
+
+    def __len__(self):
+        return len(self.live)
+
+    def value(self, name, i):
+        if i in self.overrides:
+            return self.overrides[i].get(name)
+        segment = self.segments[_find_segment(self.starts, i)]
+        return segment.value(name, i - segment.start)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        i = int(i)
+        if i < 0:
+            i += len(self)
+        if not self.live[i]:
+            return None
+        if i in self.overrides:
+            return dict(self.overrides[i])
+        segment = self.segments[_find_segment(self.starts, i)]
+        return segment.row(i - segment.start)
+
+    def distinct(self, name):
+        """Set of the values a str column takes over the live rows"""
+        values = set()
+        for segment in self.segments:
+            if name not in segment.columns:
+                continue
+            live = np.array(self.live[segment.start:segment.start + segment.count], dtype=bool)
+            for i in self.overrides:
+                if segment.start <= i < segment.start + segment.count:
+                    live[i - segment.start] = False
+            codes = np.unique(np.asarray(segment.columns[name])[live])
+            values.update(segment.strings[name][code] for code in codes if code >= 0)
+        values.update(meta[name] for i, meta in self.overrides.items() if self.live[i] and name in meta)
+        return values
+
+
+class _SegmentWriter:
+    """
+    Appends rows to one new segment. Chunk texts stream straight to a `.tmp`
+    file; metadata columns stay in compact arrays until `finish()`, so rows
+    can still be updated after they were appended.
+    """
+
+    def __init__(self, directory, start):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.start = start
+        self._blob = open(self._tmp('chunks.bin'), 'wb')
+        self._offsets = array('q', [0])
+        self._columns = {}
+        self._column_types = {}
+        self._strings = {}
+        self._string_codes = {}
+
+    def _tmp(self, name):
+        return self.directory / f'.{name}.tmp'
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def _add_column(self, name, value):
+        col_type = COLUMN_TYPES.get(name)
+        if col_type is None:
+            if isinstance(value, int) and not isinstance(value, bool):
+                col_type = 'int'
+            elif isinstance(value, str):
+                col_type = 'str'
+            else:
+                col_type = 'json'
+        self._column_types[name] = col_type
+        if col_type == 'int':
+            self._columns[name] = array('q', [INT_MISSING] * len(self))
+        elif col_type == 'str':
+            self._columns[name] = array('i', [-1] * len(self))
+            self._strings[name] = []
+            self._string_codes[name] = {}
+        else:
+            # Encoded JSON per row; b'' for rows without a value
+            self._columns[name] = [b''] * len(self)
+
+    def _encode(self, name, value):
+        col_type = self._column_types[name]
+        if col_type == 'str':
+            if not isinstance(value, str):
+                raise TypeError(f"Metadata column '{name}' expects str, got {type(value).__name__}")
+            codes = self._string_codes[name]
+            if value not in codes:
+                codes[value] = len(self._strings[name])
+                self._strings[name].append(value)
+            return codes[value]
+        if not isinstance(value, int) or isinstance(value, bool):
+            raise TypeError(f"Metadata column '{name}' expects int, got {type(value).__name__}")
+        return value
+
+    def _encode_row(self, meta):
+        for name, value in meta.items():
+            if value is not None and name not in self._column_types:
+                self._add_column(name, value)
+
+        # Encode every value before writing anything so a bad row leaves no trace
+        encoded = {}
+        for name, col_type in self._column_types.items():
+            value = meta.get(name)
+            if col_type == 'json':
+                encoded[name] = json.dumps(value).encode('utf-8') if value is not None else b''
+            elif value is None:
+                encoded[name] = INT_MISSING if col_type == 'int' else -1
+            else:
+                encoded[name] = self._encode(name, value)
+        return encoded
+
+    def append(self, text, meta):
+        """Append one row; `text=None` writes a tombstone"""
+        encoded = self._encode_row(meta if text is not None else {})
+        data = text.encode('utf-8') if text is not None else b''
+        self._blob.write(data)
+        self._offsets.append(self._offsets[-1] + len(data))
+        for name, value in encoded.items():
+            self._columns[name].append(value)
+
+    def get_meta(self, i):
+        meta = {}
+        for name, col_type in self._column_types.items():
+            raw = self._columns[name][i]
+            if col_type == 'json':
+                if raw:
+                    meta[name] = json.loads(raw)
+            elif col_type == 'str':
+                if raw >= 0:
+                    meta[name] = self._strings[name][raw]
+            elif raw != INT_MISSING:
+                meta[name] = raw
+        return meta
+
+    def update(self, i, meta):
+        for name, value in self._encode_row(meta).items():
+            self._columns[name][i] = value
+
+    def finish(self):
+        """Write the segment's files under their final names"""
+        self._blob.close()
+        replacements = [(self._tmp('chunks.bin'), self.directory / 'chunks.bin')]
+
+        def save_array(name, values, dtype):
+            with open(self._tmp(name), 'wb') as f:
+                np.save(f, np.frombuffer(values, dtype=dtype) if len(values) else np.empty(0, dtype=dtype))
+            replacements.append((self._tmp(name), self.directory / name))
+
+        save_array('chunks.offsets.npy', self._offsets, np.int64)
+        for name, col_type in self._column_types.items():
+            if col_type == 'json':
+                offsets = array('q', [0])
+                with open(self._tmp(f'meta.{name}.bin'), 'wb') as f:
+                    for value in self._columns[name]:
+                        f.write(value)
+                        offsets.append(offsets[-1] + len(value))
+                replacements.append((self._tmp(f'meta.{name}.bin'), self.directory / f'meta.{name}.bin'))
+                save_array(f'meta.{name}.offsets.npy', offsets, np.int64)
+            else:
+                save_array(f'meta.{name}.npy', self._columns[name], np.int64 if col_type == 'int' else np.int32)
+
+        for name, content in (
+            ('meta.strings.json', self._strings),
+            (MANIFEST, {'version': 1, 'count': len(self), 'columns': self._column_types}),
+        ):
+            with open(self._tmp(name), 'w') as f:
+                json.dump(content, f)
+            replacements.append((self._tmp(name), self.directory / name))
+        # The segment is not part of the store until the store manifest lists it
+        for tmp_path, final_path in replacements:
+            os.replace(tmp_path, final_path)
+
+    def abort(self):
+        self._blob.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+class ChunkStoreWriter:
+    """
+    Writes a new store: segments linked from an existing store first, then
+    appended chunks, which go to a new segment.
+
+    Linked segments are hard-linked, not copied. A new segment is sealed
+    once it holds `segment_rows` rows, so the metadata kept in memory stays
+    bounded. Appended rows can still be updated until their segment is
+    sealed; rows of linked and sealed segments are updated through
+    `meta.overrides.json`. `on_seal(segment_dir, start, count)` runs once a
+    new segment's files are complete. `finish()` returns the (tmp_path,
+    final_path) pairs for the caller to os.replace into place.
+    """
+
+    def __init__(self, directory, on_seal=None, segment_rows=None):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.on_seal = on_seal
+        self.segment_rows = segment_rows
+        self._segments = []  # (name, start, count) of linked and sealed segments
+        self._readers = {}
+        self._live = array('B')
+        self._overrides = {}
+        self._open = None
+
+    def _tmp(self, name):
+        return self.directory / f'.{name}.tmp'
+
+    def _next_dir(self):
+        return self.directory / f'seg{len(self._segments):06d}'
+
+    def __len__(self):
+        return len(self._live)
+
+    def link(self, segment_dir, live):
+        """
+        Reuse a segment of an existing store as the next segment. `live` is
+        the live mask of its rows in the new store. Returns the new segment's
+        directory.
+        """
+        self._seal()
+        target = self._next_dir()
+        target.mkdir()
+        for pattern in SEGMENT_FILES:
+            for path in Path(segment_dir).glob(pattern):
+                if path.is_file() and path.name != OVERRIDES:
+                    _link(path, target / path.name)
+        live = np.asarray(live, dtype=np.uint8)
+        self._segments.append((target.name, len(self), len(live)))
+        self._live.frombytes(live.tobytes())
+        return target
+
+    def append(self, text, meta):
+        """Append one chunk; `text=None` / `meta=None` writes a tombstone."""
+        live = text is not None and meta is not None
+        if self._open is None:
+            self._open = _SegmentWriter(self._next_dir(), len(self))
+        self._open.append(text if live else None, meta)
+        self._live.append(1 if live else 0)
+        if self.segment_rows and len(self._open) >= self.segment_rows:
+            self._seal()
+
+    def _reader(self, i):
+        k = _find_segment([start for _, start, _ in self._segments], i)
+        if k not in self._readers:
+            name, start, _ = self._segments[k]
+            self._readers[k] = SegmentMetadata(self.directory / name, start)
+        return self._readers[k]
+
+    def get_meta(self, i):
+        """Metadata of a row, or None for a tombstone"""
+        if not self._live[i]:
+            return None
+        if self._open is not None and i >= self._open.start:
+            return self._open.get_meta(i - self._open.start)
+        if i in self._overrides:
+            return dict(self._overrides[i])
+        reader = self._reader(i)
+        return reader.row(i - reader.start)
+
+    def update(self, i, meta):
+        """Replace the metadata of live row `i`"""
+        if not self._live[i]:
+            raise ValueError(f"Row {i} is a tombstone")
+        if self._open is not None and i >= self._open.start:
+            self._open.update(i - self._open.start, meta)
+        else:
+            self._overrides[i] = meta
+
+    def remove(self, i):
+        """Tombstone row `i`"""
+        self._live[i] = 0
+        self._overrides.pop(i, None)
+
+    def extend(self, chunks, metadata):
+        for text, meta in zip(chunks, metadata):
+            self.append(text, meta)
+
+    def _seal(self):
+        if self._open is None:
+            return
+        segment, self._open = self._open, None
+        segment.finish()
+        self._segments.append((segment.directory.name, segment.start, len(segment)))
+        if self.on_seal is not None:
+            self.on_seal(segment.directory, segment.start, len(segment))
+
+    def finish(self):
+        self._seal()
+        replacements = []
+
+        def tmp(name):
+            replacements.append((self._tmp(name), self.directory / name))
+            return self._tmp(name)
+
+        with open(tmp('chunks.live.npy'), 'wb') as f:
+            np.save(f, np.frombuffer(self._live, dtype=np.uint8) if len(self) else np.empty(0, dtype=np.uint8))
+        with open(tmp(OVERRIDES), 'w') as f:
+            json.dump({str(i): meta for i, meta in sorted(self._overrides.items())}, f)
+        with open(tmp(MANIFEST), 'w') as f:
+            json.dump({
+                'version': 2,
+                'count': len(self),
+                'segments': [{'name': name, 'count': count} for name, _, count in self._segments]
+            }, f)
+        return replacements
+
+    def abort(self):
+        if self._open is not None:
+            self._open.abort()
+            self._open = None
+        for name, _, _ in self._segments:
+            shutil.rmtree(self.directory / name, ignore_errors=True)
+        for tmp_path in self.directory.glob('.*.tmp'):
+            tmp_path.unlink()
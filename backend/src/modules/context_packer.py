@@ -0,0 +1,145 @@
+import logging
+import math
+import re
+
+logger = logging.getLogger(__name__)
+
+# A full stop, question or exclamation mark followed by whitespace
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?])\s+')
+
+
+class TokenCounter:
+    """Token counts from a Hugging Face tokenizer, or ~4 characters per token without one"""
+
+    def __init__(self, tokenizer=None):
+        self.tokenizer = tokenizer
+
+    @classmethod
+    def load(cls, model_name):
+        try:
+            from transformers import AutoTokenizer
+            return cls(AutoTokenizer.from_pretrained(model_name))
+        except Exception as e:
+            logger.warning(f"Could not load tokenizer {model_name}, estimating token counts: {str(e)}")
+            return cls()
+
+    def count(self, texts):
+        texts = list(texts)
+        if not texts:
+            return []
+        if self.tokenizer is None:
+            return [math.ceil(len(text) / 4) for text in texts]
+        encodings = self.tokenizer(texts, add_special_tokens=False, verbose=False)
+        return [len(ids) for ids in encodings['input_ids']]
+
+
+def overlap_length(left, right, min_chars=16):
+    """Length of the longest suffix of `left` that is also a prefix of `right`"""
+    probe = right[:min_chars]
+    if len(probe) < min_chars:
+        return 0
+    start = left.find(probe)
+    while start != -1:
+        if right.startswith(left[start:]):
+            return len(left) - start
+        start = left.find(probe, start + 1)
+    return 0
+
+
+class ContextPacker:
+    """
+    Fits retrieved chunks into a generator's context budget.
+
+    Chunks are taken greedily, most relevant first, and counted with the
+    target model's tokenizer; the `n_tokens` recorded in chunk metadata at
+    index time is used when present, so an untrimmed chunk costs no
+    tokenizer call. Text a chunk shares with an adjacent window of the same
+    document page that is already packed is cut off first. A chunk that no
+    longer fits is cut down to its leading sentences if at least
+    `min_span_tokens` of the budget are left, and skipped otherwise, so
+    later, shorter chunks can still fill the gap.
+    """
+
+    def __init__(self, counter, max_tokens=3000, separator_tokens=1, min_span_tokens=32):
+        self.counter = counter
+        self.max_tokens = max_tokens
+        self.separator_tokens = separator_tokens
+        self.min_span_tokens = min_span_tokens
+
+    @staticmethod
+    def _neighbour(meta, other):
+        """-1 if `meta` is the window before `other`, 1 if after, else 0"""
+        if meta.get('doc_id') is None or meta.get('chunk_idx') is None or other.get('chunk_idx') is None:
+            return 0
+        if meta['doc_id'] != other.get('doc_id') or meta.get('page') != other.get('page'):
+            return 0
+        step = meta['chunk_idx'] - other['chunk_idx']
+        return step if step in (-1, 1) else 0
+
+    def _trim_overlap(self, text, meta, packed):
+        for _, packed_text, packed_meta, _ in packed:
+            side = self._neighbour(meta, packed_meta)
+            if side == 1:
+                text = text[overlap_length(packed_text, text):].lstrip()
+            elif side == -1:
+                text = text[:len(text) - overlap_length(text, packed_text)].rstrip()
+        return text
+
+    def _leading_sentences(self, text, budget):
+        sentences = [s for s in SENTENCE_BOUNDARY.split(text) if s]
+        span, used = [], 0
+        for sentence, n in zip(sentences, self.counter.count(sentences)):
+            if used + n > budget:
+                break
+            span.append(sentence)
+            used += n
+        return ' '.join(span), used
+
+    def pack(self, chunks, metadata=None, scores=None, max_tokens=None):
+        """
+        Returns (positions, texts, stats): the input positions of the packed
+        chunks in packing order, their possibly trimmed texts, and token
+        accounting.
+        """
+        budget = self.max_tokens if max_tokens is None else max_tokens
+        metadata = metadata if metadata is not None else [{}] * len(chunks)
+        order = list(range(len(chunks)))
+        if scores is not None:
+            order.sort(key=lambda i: -float(scores[i]))
+
+        counts = [meta.get('n_tokens') for meta in metadata]
+        missing = [i for i, n in enumerate(counts) if n is None]
+        for i, n in zip(missing, self.counter.count(chunks[i] for i in missing)):
+            counts[i] = n
+
+        stats = {
+            'max_tokens': budget, 'tokens_used': 0, 'chunks_in': len(chunks), 'chunks_packed': 0,
+            'chunks_trimmed': 0, 'chunks_dropped': 0, 'overlap_tokens_removed': 0
+        }
+        packed = []  # (position, text, meta, tokens)
+        used = 0
+        for i in order:
+            text, n = chunks[i], counts[i]
+            trimmed = self._trim_overlap(text, metadata[i], packed)
+            if trimmed != text:
+                text, n = trimmed, self.counter.count([trimmed])[0]
+                stats['overlap_tokens_removed'] += max(counts[i] - n, 0)
+                if not text:
+                    continue
+            separator = self.separator_tokens if packed else 0
+            if used + separator + n > budget:
+                remaining = budget - used - separator
+                if remaining < self.min_span_tokens:
+                    stats['chunks_dropped'] += 1
+                    continue
+                text, n = self._leading_sentences(text, remaining)
+                if not text:
+                    stats['chunks_dropped'] += 1
+                    continue
+                stats['chunks_trimmed'] += 1
+            packed.append((i, text, metadata[i], n))
+            used += separator + n
+
+        stats['tokens_used'] = used
+        stats['chunks_packed'] = len(packed)
+        return [p[0] for p in packed], [p[1] for p in packed], stats
@@ -0,0 +1,209 @@
+import json
+import os
+import threading
+import zlib
+from pathlib import Path
+
+import numpy as np
+
+from src.modules.sparse_index import tokenize
+
+# Mersenne prime 2^31 - 1: with 32-bit shingle hashes and coefficients
+# below it, a * x + b stays inside uint64
+_PRIME = np.uint64((1 << 31) - 1)
+# Multiplier folding a band's signature values into one 64-bit key
+_MIX = np.uint64(0x100000001b3)
+
+# Saved next to each chunk store segment: dedup.json (the parameters), and
+# for the rows with a signature their local ids (dedup.ids.npy), signatures
+# (dedup.sig.npy) and band keys sorted per band (dedup.keys.npy, with
+# dedup.order.npy pointing back at the rows)
+
+
+class _SavedSegment:
+    """LSH state written for one segment, searched in place"""
+
+    def __init__(self, directory, start, live=None):
+        directory = Path(directory)
+        self.start = start
+        self.ids = np.load(directory / 'dedup.ids.npy', mmap_mode='r')
+        self.signatures = np.load(directory / 'dedup.sig.npy', mmap_mode='r')
+        self.keys = np.load(directory / 'dedup.keys.npy', mmap_mode='r')
+        self.order = np.load(directory / 'dedup.order.npy', mmap_mode='r')
+        self.live = live
+
+    def candidates(self, band, key):
+        keys = self.keys[band]
+        lo, hi = np.searchsorted(keys, key, side='left'), np.searchsorted(keys, key, side='right')
+        for j in self.order[band, lo:hi]:
+            local = int(self.ids[j])
+            if self.live is None or self.live[local]:
+                yield self.start + local, self.signatures[j]
+
+
+class MinHashDeduplicator:
+    """
+    Near-duplicate detection with MinHash signatures and LSH banding.
+
+    Each text is reduced to its set of word `shingle_size`-grams. Two texts
+    whose signatures collide in at least one of `bands` bands are candidates;
+    a candidate counts as a duplicate when the estimated Jaccard similarity
+    (fraction of equal signature values) reaches `threshold`.
+
+    Texts are registered in memory only until `write()` saves them with
+    their chunk store segment; saved segments, and those of earlier builds
+    added with `open()`, are searched in place through memory maps. Later
+    builds thus only hash their new chunks, and memory holds at most the
+    chunks of segments not yet sealed. Safe to share between threads.
+    """
+
+    def __init__(self, threshold=0.85, num_perm=128, bands=16, shingle_size=5, seed=1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        self.seed = seed
+        rng = np.random.RandomState(seed)
+        self._a = rng.randint(1, int(_PRIME), size=num_perm).astype(np.uint64)
+        self._b = rng.randint(0, int(_PRIME), size=num_perm).astype(np.uint64)
+        self._lock = threading.Lock()
+        # (band, band key) -> keys of the texts in that bucket
+        self._buckets = {}
+        self._signatures = {}
+        self._saved = []
+
+    def params(self):
+        """What saved signatures and band keys depend on"""
+        return {'num_perm': self.num_perm, 'bands': self.bands, 'shingle_size': self.shingle_size, 'seed': self.seed}
+
+    def signature(self, text):
+        """MinHash signature of `text`, or None if it has no words"""
+        tokens = tokenize(text)
+        if not tokens:
+            return None
+        k = min(self.shingle_size, len(tokens))
+        shingles = {' '.join(tokens[i:i + k]) for i in range(len(tokens) - k + 1)}
+        hashes = np.fromiter((zlib.crc32(s.encode('utf-8')) for s in shingles), dtype=np.uint64, count=len(shingles))
+        # Values are below 2^31, so uint32 halves the memory kept per chunk
+        return ((self._a[:, None] * hashes[None, :] + self._b[:, None]) % _PRIME).min(axis=1).astype(np.uint32)
+
+    def _band_keys(self, signatures):
+        """uint64[len(signatures), bands] keys of each band of each signature"""
+        values = np.asarray(signatures, dtype=np.uint64).reshape(len(signatures), self.bands, self.rows)
+        keys = np.zeros((len(signatures), self.bands), dtype=np.uint64)
+        for row in range(self.rows):
+            keys = keys * _MIX + values[:, :, row]
+        return keys
+
+    def add(self, key, text):
+        """Register `text` under `key` as a representative"""
+        signature = self.signature(text)
+        if signature is not None:
+            self.add_signature(key, signature)
+
+    def add_signature(self, key, signature):
+        band_keys = self._band_keys(signature[None])[0]
+        with self._lock:
+            self._insert(key, signature, band_keys)
+
+    def _insert(self, key, signature, band_keys):
+        self._signatures[key] = signature
+        for band, band_key in enumerate(band_keys):
+            self._buckets.setdefault((band, int(band_key)), []).append(key)
+
+    def _candidates(self, band, band_key):
+        # Saved segments hold the older chunks, so they come first
+        for segment in self._saved:
+            yield from segment.candidates(band, band_key)
+        for candidate in self._buckets.get((band, int(band_key)), ()):
+            yield candidate, self._signatures[candidate]
+
+    def find_or_add(self, key, text):
+        """
+        Return the key of a registered near-duplicate of `text`; otherwise
+        register `text` under `key` and return None.
+        """
+        signature = self.signature(text)
+        if signature is None:
+            return None
+        band_keys = self._band_keys(signature[None])[0]
+        with self._lock:
+            seen = set()
+            for band, band_key in enumerate(band_keys):
+                for candidate, candidate_signature in self._candidates(band, band_key):
+                    if candidate in seen:
+                        continue
+                    seen.add(candidate)
+                    if np.mean(candidate_signature == signature) >= self.threshold:
+                        return candidate
+            self._insert(key, signature, band_keys)
+        return None
+
+    def write(self, directory, start, count, live=None):
+        """
+        Save the texts registered under keys start..start + count - 1 next to
+        their chunk store segment in `directory`, and search them there from
+        now on (skipping rows whose `live` entry is 0).
+        """
+        directory = Path(directory)
+        with self._lock:
+            keys = sorted(key for key in self._signatures if start <= key < start + count)
+            signatures = np.array([self._signatures.pop(key) for key in keys], dtype=np.uint32)
+            signatures = signatures.reshape(len(keys), self.num_perm)
+            band_keys = self._band_keys(signatures)
+            for key, row in zip(keys, band_keys):
+                for band, band_key in enumerate(row):
+                    bucket = self._buckets[(band, int(band_key))]
+                    bucket.remove(key)
+                    if not bucket:
+                        del self._buckets[(band, int(band_key))]
+
+            order = np.argsort(band_keys.T, axis=1, kind='stable')
+            replacements = []
+            for name, values in (
+                ('dedup.ids.npy', np.asarray(keys, dtype=np.int64) - start),
+                ('dedup.sig.npy', signatures),
+                ('dedup.keys.npy', np.take_along_axis(band_keys.T, order, axis=1)),
+                ('dedup.order.npy', order.astype(np.int64)),
+            ):
+                with open(directory / f'.{name}.tmp', 'wb') as f:
+                    np.save(f, values)
+                replacements.append((directory / f'.{name}.tmp', directory / name))
+            with open(directory / '.dedup.json.tmp', 'w') as f:
+                json.dump(self.params(), f)
+            # dedup.json goes last: it marks the state as complete
+            replacements.append((directory / '.dedup.json.tmp', directory / 'dedup.json'))
+            # Replaced rather than rewritten: a linked segment shares its files with older versions
+            for tmp_path, final_path in replacements:
+                os.replace(tmp_path, final_path)
+            self._saved.append(_SavedSegment(directory, start, live))
+
+    def _usable(self, directory):
+        try:
+            with open(Path(directory) / 'dedup.json', 'r') as f:
+                return json.load(f) == self.params()
+        except FileNotFoundError:
+            return False
+
+    def open(self, directory, start, live=None):
+        """
+        Search the state saved with the segment in `directory`, whose rows
+        start at id `start`; rows whose `live` entry is 0 are never matched.
+        Returns False when there is no state saved with these parameters.
+        """
+        if not self._usable(directory):
+            return False
+        segment = _SavedSegment(directory, start, live)
+        with self._lock:
+            self._saved.append(segment)
+        return True
+
+    def saved_signatures(self, directory):
+        """{local row id: signature} saved with a segment, or {} if unusable"""
+        if not self._usable(directory):
+            return {}
+        segment = _SavedSegment(directory, 0)
+        return {int(i): np.array(signature) for i, signature in zip(segment.ids, segment.signatures)}
@@ -0,0 +1,171 @@
+import hashlib
+import json
+import re
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+
+from src.modules.file_lock import file_lock
+
+DIGEST_SIZE = 16
+
+
+def text_digest(text):
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=DIGEST_SIZE).digest()
+
+
+class EmbeddingCache:
+    """
+    Disk-backed embedding cache for one model, keyed by a hash of the text.
+
+    Rows are appended to vectors.f32 (a float32 matrix read through np.memmap)
+    and keys.bin (one digest per row). Vectors are written before their keys,
+    so a crash mid-append only loses the unfinished rows. Appends hold a
+    file lock, and row numbers come from the files themselves, so several
+    processes can share one cache.
+    """
+
+    def __init__(self, cache_dir, model_name):
+        slug = re.sub(r'[^A-Za-z0-9_.-]+', '_', model_name)
+        self.directory = Path(cache_dir) / slug
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.vectors_path = self.directory / 'vectors.f32'
+        self.keys_path = self.directory / 'keys.bin'
+        self.meta_path = self.directory / 'meta.json'
+        self.lock_path = self.directory / '.lock'
+        self._lock = threading.Lock()
+        self._vectors = None
+
+        self.dim = None
+        self.rows = {}
+        # Rows of keys.bin already read into self.rows
+        self._n_rows = 0
+        with self._locked():
+            self._sync()
+
+    @contextmanager
+    def _locked(self):
+        with self._lock, file_lock(self.lock_path):
+            yield
+
+    def _sync(self):
+        """Read rows appended by other processes. Call with the lock held."""
+        if self.dim is None and self.meta_path.exists():
+            with open(self.meta_path, 'r') as f:
+                self.dim = json.load(f)['dim']
+        if not self.dim or not self.keys_path.exists() or not self.vectors_path.exists():
+            return
+        key_bytes, vector_bytes = self.keys_path.stat().st_size, self.vectors_path.stat().st_size
+        n_rows = min(key_bytes // DIGEST_SIZE, vector_bytes // (4 * self.dim))
+        if key_bytes != n_rows * DIGEST_SIZE or vector_bytes != n_rows * 4 * self.dim:
+            # Drop the half-written tail of an append that died, so new rows stay aligned
+            with open(self.keys_path, 'r+b') as f:
+                f.truncate(n_rows * DIGEST_SIZE)
+            with open(self.vectors_path, 'r+b') as f:
+                f.truncate(n_rows * 4 * self.dim)
+        if n_rows <= self._n_rows:
+            return
+        with open(self.keys_path, 'rb') as f:
+            f.seek(self._n_rows * DIGEST_SIZE)
+            keys = f.read((n_rows - self._n_rows) * DIGEST_SIZE)
+        for row in range(self._n_rows, n_rows):
+            offset = (row - self._n_rows) * DIGEST_SIZE
+            self.rows.setdefault(keys[offset:offset + DIGEST_SIZE], row)
+        self._n_rows = n_rows
+
+    def __len__(self):
+        return len(self.rows)
+
+    def _read(self, rows):
+        if self._vectors is None or max(rows) >= len(self._vectors):
+            # Remap to pick up rows appended since the last read
+            self._vectors = np.memmap(self.vectors_path, dtype='float32', mode='r').reshape(-1, self.dim)
+        return np.asarray(self._vectors[rows])
+
+    def get(self, digests):
+        """Return {position: vector} for the digests that are cached"""
+        if any(d not in self.rows for d in digests):
+            # Another process may have added them
+            with self._locked():
+                self._sync()
+        with self._lock:
+            found = [(i, self.rows[d]) for i, d in enumerate(digests) if d in self.rows]
+            if not found:
+                return {}
+            vectors = self._read([row for _, row in found])
+            return {i: vector for (i, _), vector in zip(found, vectors)}
+
+    def put(self, digests, vectors):
+        vectors = np.asarray(vectors, dtype='float32')
+        with self._locked():
+            self._sync()
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+                with open(self.meta_path, 'w') as f:
+                    json.dump({'dim': self.dim}, f)
+            new = {}
+            for d, v in zip(digests, vectors):
+                if d not in self.rows and d not in new:
+                    new[d] = v
+            if not new:
+                return
+            # _sync() left both files aligned at self._n_rows, whoever wrote them
+            with open(self.vectors_path, 'ab') as f:
+                f.write(np.stack(list(new.values())).tobytes())
+            with open(self.keys_path, 'ab') as f:
+                f.write(b''.join(new))
+            for row, d in enumerate(new, start=self._n_rows):
+                self.rows[d] = row
+            self._n_rows += len(new)
+
+
+class CachedEmbedder:
+    """Embedder wrapper that only sends cache misses to the encoder"""
+
+    def __init__(self, embedder, cache):
+        self.embedder = embedder
+        self.cache = cache
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+
+    def embed(self, texts, batch_size=32):
+        if isinstance(texts, str):
+            texts = [texts]
+        digests = [text_digest(text) for text in texts]
+        cached = self.cache.get(digests)
+
+        # Encode each distinct missing text once
+        missing = {}
+        for i, digest in enumerate(digests):
+            if i not in cached and digest not in missing:
+                missing[digest] = texts[i]
+        if missing:
+            encoded = np.asarray(self.embedder.embed(list(missing.values()), batch_size=batch_size), dtype='float32')
+            self.cache.put(list(missing), encoded)
+            encoded = dict(zip(missing, encoded))
+
+        self.hits += len(cached)
+        self.misses += len(texts) - len(cached)
+        self.bytes_saved += sum(len(texts[i].encode('utf-8')) for i in cached)
+
+        if not texts:
+            return np.empty((0, self.cache.dim or 0), dtype='float32')
+        return np.stack([cached[i] if i in cached else encoded[digests[i]] for i in range(len(texts))])
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            # Text skipped by the encoder, and float32 vectors not recomputed
+            'text_bytes_saved': self.bytes_saved,
+            'vector_bytes_saved': self.hits * 4 * (self.cache.dim or 0),
+            'cache_entries': len(self.cache)
+        }
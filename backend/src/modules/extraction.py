@@ -0,0 +1,220 @@
+import json
+import logging
+import math
+import multiprocessing
+import os
+import signal
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+
+import docx
+import pdfplumber
+
+logger = logging.getLogger(__name__)
+
+# Part of the extraction cache key: bump when extract_text output changes.
+# The pdfplumber version is included because its text layout changes too.
+EXTRACTOR_VERSION = f'1-pdfplumber{pdfplumber.__version__}'
+
+
+class PageTimeout(Exception):
+    pass
+
+
+class ExtractionTimeout(Exception):
+    pass
+
+
+@contextmanager
+def _time_limit(seconds):
+    # SIGALRM only works in the main thread of a process, which is where
+    # pool workers run; elsewhere the page runs without a limit
+    if not seconds or not hasattr(signal, 'SIGALRM') or threading.current_thread() is not threading.main_thread():
+        yield
+        return
+
+    def on_alarm(signum, frame):
+        raise PageTimeout()
+
+    previous = signal.signal(signal.SIGALRM, on_alarm)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def _extract_pages(file_path, start, end, page_timeout=None):
+    """
+    Extract pages [start, end) of a PDF. Returns ([{'text', 'page'}], timed
+    out page numbers). Also the process-pool task: each worker opens the file
+    itself, so only page ranges and text cross process boundaries.
+    """
+    pages_data, timed_out = [], []
+    with pdfplumber.open(file_path) as pdf:
+        for i in range(start, min(end, len(pdf.pages))):
+            page = pdf.pages[i]
+            try:
+                with _time_limit(page_timeout):
+                    text = page.extract_text()
+            except PageTimeout:
+                timed_out.append(i + 1)
+                continue
+            finally:
+                # Parsed page objects are cached on the document; drop them
+                page.flush_cache()
+            if text:
+                pages_data.append({
+                    'text': text,
+                    'page': i + 1
+                })
+    return pages_data, timed_out
+
+
+def extract_pdf(file_path):
+    """Return [{'text', 'page'}] for the pages of a PDF that have text"""
+    pages_data, _ = _extract_pages(file_path, 0, math.inf)
+    return pages_data
+
+
+class PDFExtractor:
+    """
+    Page-parallel PDF text extraction.
+
+    The page range is split across a process pool and the per-range results
+    are reassembled in page order. A page that runs longer than
+    `page_timeout` seconds is skipped. PDFs shorter than `min_parallel_pages`
+    are extracted in the calling thread.
+
+    A worker can die (a PDF that crashes the parser) or hang where the page
+    alarm cannot reach it. Either way the pool is replaced, so other
+    documents keep extracting: a document whose pool broke is retried once
+    on the new pool, and one that made no progress for a range's worth of
+    page timeouts fails with ExtractionTimeout.
+    """
+
+    def __init__(self, workers=None, page_timeout=30, min_parallel_pages=16):
+        self.workers = workers or os.cpu_count() or 1
+        self.page_timeout = page_timeout
+        self.min_parallel_pages = min_parallel_pages
+        self._pool = None
+        self._lock = threading.Lock()
+        self.pages = 0
+        self.seconds = 0.0
+        self.timeouts = 0
+
+    @property
+    def pool(self):
+        with self._lock:
+            if self._pool is None:
+                # spawn: forking a process that runs torch and server threads can deadlock
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context('spawn')
+                )
+            return self._pool
+
+    def _discard_pool(self, pool, kill=False):
+        """Stop using `pool`; the next extraction starts a fresh one"""
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+        if kill:
+            # shutdown() waits for running tasks, and a hung worker never finishes
+            for process in list((pool._processes or {}).values()):
+                process.terminate()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def _extract_parallel(self, file_path, n_pages):
+        pool = self.pool
+        # A few ranges per worker balances uneven pages without reopening the file too often
+        range_size = math.ceil(n_pages / (self.workers * 4))
+        # Each page of a range is bounded by its alarm, so no range finishing
+        # within a range's worth of page timeouts means a worker is stuck
+        stall_seconds = self.page_timeout * (range_size + 1) if self.page_timeout else None
+        try:
+            futures = [
+                pool.submit(_extract_pages, str(file_path), start, start + range_size, self.page_timeout)
+                for start in range(0, n_pages, range_size)
+            ]
+            pending = set(futures)
+            while pending:
+                done, pending = wait(pending, timeout=stall_seconds, return_when=FIRST_COMPLETED)
+                if not done:
+                    self._discard_pool(pool, kill=True)
+                    raise ExtractionTimeout(f"{file_path}: no page range finished in {stall_seconds}s")
+            results = [future.result() for future in futures]
+        except BrokenProcessPool:
+            self._discard_pool(pool)
+            raise
+
+        pages_data, timed_out = [], []
+        for range_pages, range_timed_out in results:
+            pages_data.extend(range_pages)
+            timed_out.extend(range_timed_out)
+        return pages_data, timed_out
+
+    def extract(self, file_path):
+        t_start = time.time()
+        with pdfplumber.open(file_path) as pdf:
+            n_pages = len(pdf.pages)
+
+        if n_pages < self.min_parallel_pages or self.workers == 1:
+            pages_data, timed_out = _extract_pages(file_path, 0, n_pages, self.page_timeout)
+        else:
+            try:
+                pages_data, timed_out = self._extract_parallel(file_path, n_pages)
+            except BrokenProcessPool:
+                # Possibly another document's crash; a second break on a fresh pool is this one's
+                logger.warning(f"PDF worker pool broke while extracting {file_path}; retrying on a new pool")
+                pages_data, timed_out = self._extract_parallel(file_path, n_pages)
+
+        elapsed = time.time() - t_start
+        with self._lock:
+            self.pages += n_pages
+            self.seconds += elapsed
+            self.timeouts += len(timed_out)
+        if timed_out:
+            logger.warning(f"{file_path}: skipped pages {timed_out} after {self.page_timeout}s timeout")
+        logger.info(f"Extracted {n_pages} pages from {file_path} in {elapsed:.1f}s ({n_pages / max(elapsed, 1e-9):.1f} pages/s)")
+        return pages_data
+
+    def stats(self):
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'pages': self.pages,
+                'seconds': self.seconds,
+                'pages_per_second': self.pages / self.seconds if self.seconds else 0.0,
+                'page_timeouts': self.timeouts
+            }
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+
+
+def extract_text(file_path, file_type, pdf_extractor=None):
+    """
+    Extract the text stored in Document.content: a JSON list of pages for
+    PDFs, plain text for everything else.
+    """
+    if file_type == 'pdf':
+        pages_data = pdf_extractor.extract(file_path) if pdf_extractor else extract_pdf(file_path)
+        text_content = json.dumps(pages_data, ensure_ascii=False)
+
+    elif file_type == 'docx':
+        # DOCX has no fixed pages; keep the paragraphs as a single block
+        doc = docx.Document(file_path)
+        text_content = "".join(para.text + "\n" for para in doc.paragraphs)
+
+    else:
+        # txt and fallback for other types
+        with open(file_path, 'rb') as f:
+            text_content = f.read().decode('utf-8', errors='ignore')
+
+    # Sanitize text: Remove NUL bytes which cause Postgres errors
+    return text_content.replace('\x00', '')
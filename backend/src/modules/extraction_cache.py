@@ -0,0 +1,102 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import zlib
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+SUFFIX = '.json.z'
+
+
+def file_sha256(file_path, chunk_bytes=1024 * 1024):
+    sha256 = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(chunk_bytes), b''):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+
+class ExtractionCache:
+    """
+    Content-addressed cache of extracted text.
+
+    Entries are zlib-compressed JSON files named after the SHA-256 of the raw
+    file, its type and the extractor version, so a changed extractor simply
+    misses and its old entries age out. Reads refresh an entry's mtime;
+    when the cache grows past `max_bytes` the least recently used entries
+    are deleted.
+    """
+
+    def __init__(self, directory, version, max_bytes=1024 * 1024 * 1024):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.version = version
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._sizes = {path.name: path.stat().st_size for path in self.directory.glob(f'*{SUFFIX}')}
+        self._bytes = sum(self._sizes.values())
+
+    def _path(self, sha256, file_type):
+        return self.directory / f'{sha256}.{file_type}.v{self.version}{SUFFIX}'
+
+    def get(self, sha256, file_type):
+        """Cached content (text, or a list of {'text', 'page'}), or None"""
+        path = self._path(sha256, file_type)
+        try:
+            with open(path, 'rb') as f:
+                content = json.loads(zlib.decompress(f.read()))
+            os.utime(path)
+        except (OSError, zlib.error, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return content
+
+    def put(self, sha256, file_type, content):
+        path = self._path(sha256, file_type)
+        data = zlib.compress(json.dumps(content, ensure_ascii=False).encode('utf-8'))
+        tmp_path = path.with_name(f'.{path.name}.{threading.get_ident()}.tmp')
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._bytes += len(data) - self._sizes.get(path.name, 0)
+            self._sizes[path.name] = len(data)
+            if self._bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        # Oldest access time first, down to 90% of the limit
+        entries = []
+        for name in self._sizes:
+            try:
+                entries.append(((self.directory / name).stat().st_mtime, name))
+            except OSError:
+                entries.append((0.0, name))
+        for _, name in sorted(entries):
+            if self._bytes <= self.max_bytes * 0.9:
+                break
+            (self.directory / name).unlink(missing_ok=True)
+            self._bytes -= self._sizes.pop(name)
+            self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._sizes),
+                'size_mb': self._bytes / (1024 * 1024),
+                'max_size_mb': self.max_bytes / (1024 * 1024),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions
+            }
@@ -0,0 +1,34 @@
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+
+class LockBusy(Exception):
+    pass
+
+
+@contextmanager
+def file_lock(path, blocking=True):
+    """
+    Exclusive advisory lock on `path` (created if missing), held across
+    processes for the duration of the block. With `blocking=False`, raises
+    LockBusy instead of waiting. The OS drops the lock if the holder dies.
+    Without fcntl the lock is a no-op.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'a+b') as f:
+        if fcntl is not None:
+            try:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+            except BlockingIOError:
+                raise LockBusy(f"{path} is locked by another process")
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
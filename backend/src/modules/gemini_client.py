@@ -0,0 +1,303 @@
+import asyncio
+import logging
+import queue
+import random
+import threading
+import time
+
+from src.modules.rag_system import GeminiGenerator
+
+logger = logging.getLogger(__name__)
+
+_END = object()
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class StreamInterrupted(Exception):
+    """A stream failed after part of the answer was emitted"""
+
+
+class GeminiTransport:
+    """Async calls to one shared GenerativeModel"""
+
+    def __init__(self, api_key, model_name):
+        import google.generativeai as genai
+        genai.configure(api_key=api_key)
+        self.model = genai.GenerativeModel(model_name)
+
+    async def generate(self, prompt):
+        response = await self.model.generate_content_async(prompt)
+        return response.text
+
+    async def stream(self, prompt):
+        response = await self.model.generate_content_async(prompt, stream=True)
+        async for chunk in response:
+            if chunk.text:
+                yield chunk.text
+
+
+def is_retryable(error):
+    """Timeouts, 429 and 5xx are worth retrying; other errors are not"""
+    if isinstance(error, (asyncio.TimeoutError, ConnectionError)):
+        return True
+    status = getattr(error, 'code', None) or getattr(error, 'status_code', None)
+    # google.api_core errors carry the HTTP status as an int `code`
+    return isinstance(status, int) and (status == 429 or 500 <= status < 600)
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive upstream failures and rejects
+    calls for `reset_seconds`. Then one trial call is let through: success
+    closes the circuit, failure opens it again.
+    """
+
+    def __init__(self, failure_threshold=5, reset_seconds=30.0, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+        self.times_opened = 0
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if self.clock() - self.opened_at >= self.reset_seconds:
+            return 'half_open'
+        return 'open'
+
+    def allow(self):
+        state = self.state
+        if state == 'closed':
+            return True
+        if state == 'half_open' and not self.trial_running:
+            self.trial_running = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self.trial_running or self.failures >= self.failure_threshold:
+            if self.opened_at is None or self.trial_running:
+                self.times_opened += 1
+            self.opened_at = self.clock()
+            self.trial_running = False
+
+
+class AsyncGeminiGenerator:
+    """
+    Gemini generator on the async API.
+
+    One transport (and so one client connection) is shared by all requests
+    and driven by a private event loop thread. At most `max_concurrency`
+    calls are in flight upstream; each attempt is limited to
+    `timeout_seconds` and the whole call, including waiting for a slot and
+    retries, to `deadline_seconds`. 429/5xx errors and timeouts are retried
+    with full-jitter exponential backoff, and a circuit breaker fails calls
+    fast while the API keeps failing.
+
+    `agenerate` and `astream` are for async callers. `generate` and
+    `generate_stream` keep the GeminiGenerator interface for threadpool code. Failures come back as
+    "Error ..." strings, like GeminiGenerator.
+    """
+
+    def __init__(self, api_key=None, model_name='gemini-pro', transport=None, max_concurrency=8,
+                 timeout_seconds=30.0, deadline_seconds=60.0, max_retries=3, backoff_seconds=0.5,
+                 backoff_max_seconds=8.0, breaker_failures=5, breaker_reset_seconds=30.0):
+        self.transport = transport or GeminiTransport(api_key, model_name)
+        self.max_concurrency = max_concurrency
+        self.timeout_seconds = timeout_seconds
+        self.deadline_seconds = deadline_seconds
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.backoff_max_seconds = backoff_max_seconds
+        self.breaker = CircuitBreaker(breaker_failures, breaker_reset_seconds)
+        self._counts = {'calls': 0, 'succeeded': 0, 'failed': 0, 'retries': 0, 'timeouts': 0, 'rejected': 0}
+        self._in_flight = 0
+        self._loop = asyncio.new_event_loop()
+        # Created on the loop it will be used from
+        self._semaphore = asyncio.run_coroutine_threadsafe(self._make_semaphore(), self._start_loop()).result()
+
+    def _start_loop(self):
+        thread = threading.Thread(target=self._loop.run_forever, name='gemini-client', daemon=True)
+        thread.start()
+        self._thread = thread
+        return self._loop
+
+    async def _make_semaphore(self):
+        return asyncio.Semaphore(self.max_concurrency)
+
+    def _backoff(self, attempt):
+        return random.uniform(0, min(self.backoff_max_seconds, self.backoff_seconds * 2 ** attempt))
+
+    async def _call(self, attempt_fn):
+        """Run `attempt_fn(timeout)` under the limiter, deadline, retries and breaker"""
+        self._counts['calls'] += 1
+        deadline = time.monotonic() + self.deadline_seconds
+        attempt = 0
+        while True:
+            # Wait for a slot first, so an admitted trial call always reports back
+            if self.breaker.state == 'open':
+                self._reject()
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), timeout=max(deadline - time.monotonic(), 0))
+            except asyncio.TimeoutError:
+                self._counts['timeouts'] += 1
+                self._counts['failed'] += 1
+                raise asyncio.TimeoutError("deadline passed while waiting for a free Gemini API slot")
+            try:
+                if not self.breaker.allow():
+                    self._reject()
+                self._in_flight += 1
+                try:
+                    result = await attempt_fn(max(min(self.timeout_seconds, deadline - time.monotonic()), 0))
+                finally:
+                    self._in_flight -= 1
+            except CircuitOpenError:
+                raise
+            except StreamInterrupted:
+                # Too late to retry, but still a failure of the API
+                self.breaker.record_failure()
+                self._counts['failed'] += 1
+                raise
+            except Exception as e:
+                if isinstance(e, asyncio.TimeoutError):
+                    self._counts['timeouts'] += 1
+                if not is_retryable(e):
+                    # The API answered; a bad request says nothing about its health
+                    self.breaker.record_success()
+                    self._counts['failed'] += 1
+                    raise
+                self.breaker.record_failure()
+                delay = self._backoff(attempt)
+                if attempt >= self.max_retries or time.monotonic() + delay >= deadline:
+                    self._counts['failed'] += 1
+                    raise
+                attempt += 1
+                self._counts['retries'] += 1
+                logger.warning(f"Gemini API call failed ({type(e).__name__}: {e}); retry {attempt} in {delay:.2f}s")
+            else:
+                self.breaker.record_success()
+                self._counts['succeeded'] += 1
+                return result
+            finally:
+                self._semaphore.release()
+            await asyncio.sleep(delay)
+
+    def _reject(self):
+        self._counts['rejected'] += 1
+        self._counts['failed'] += 1
+        raise CircuitOpenError("Gemini API circuit is open after repeated failures")
+
+    async def _generate(self, query, context_chunks):
+        prompt = GeminiGenerator._prompt(query, context_chunks)
+
+        async def attempt(timeout):
+            return await asyncio.wait_for(self.transport.generate(prompt), timeout=timeout)
+
+        try:
+            return await self._call(attempt)
+        except Exception as e:
+            logger.error(f"Gemini API Error: {type(e).__name__}: {e}")
+            return f"Error generating answer from Gemini API: {type(e).__name__}: {e}"
+
+    async def _stream(self, query, context_chunks, emit):
+        """
+        Pass answer pieces to `emit` as they arrive. Attempts are retried only
+        until the first piece has been emitted; the timeout applies to the
+        wait for each piece.
+        """
+        prompt = GeminiGenerator._prompt(query, context_chunks)
+        emitted = False
+
+        async def attempt(timeout):
+            nonlocal emitted
+            pieces = self.transport.stream(prompt).__aiter__()
+            try:
+                while True:
+                    try:
+                        piece = await asyncio.wait_for(pieces.__anext__(), timeout=timeout)
+                    except StopAsyncIteration:
+                        return
+                    emit(piece)
+                    emitted = True
+            except Exception as e:
+                if emitted:
+                    # Too late to retry: the caller already has part of an answer
+                    raise StreamInterrupted(f"stream interrupted: {type(e).__name__}: {e}") from e
+                raise
+
+        try:
+            await self._call(attempt)
+        except Exception as e:
+            logger.error(f"Gemini API Error: {type(e).__name__}: {e}")
+            emit(f"Error generating answer from Gemini API: {type(e).__name__}: {e}")
+
+    async def agenerate(self, query, context_chunks):
+        """Awaitable from any event loop; the call itself runs on the client's loop"""
+        future = asyncio.run_coroutine_threadsafe(self._generate(query, context_chunks), self._loop)
+        return await asyncio.wrap_future(future)
+
+    def generate(self, query, context_chunks):
+        return asyncio.run_coroutine_threadsafe(self._generate(query, context_chunks), self._loop).result()
+
+    def generate_stream(self, query, context_chunks):
+        pieces = queue.Queue()
+        future = asyncio.run_coroutine_threadsafe(
+            self._stream(query, context_chunks, pieces.put), self._loop
+        )
+        future.add_done_callback(lambda _: pieces.put(_END))
+        while True:
+            piece = pieces.get()
+            if piece is _END:
+                break
+            yield piece
+        future.result()
+
+    async def astream(self, query, context_chunks):
+        """generate_stream for async callers: yields pieces on the caller's event loop"""
+        loop = asyncio.get_running_loop()
+        pieces = asyncio.Queue()
+
+        def emit(piece):
+            try:
+                loop.call_soon_threadsafe(pieces.put_nowait, piece)
+            except RuntimeError:  # the caller's loop has closed
+                pass
+
+        future = asyncio.run_coroutine_threadsafe(self._stream(query, context_chunks, emit), self._loop)
+        future.add_done_callback(lambda _: emit(_END))
+        try:
+            while True:
+                piece = await pieces.get()
+                if piece is _END:
+                    break
+                yield piece
+            await asyncio.wrap_future(future)
+        finally:
+            # The caller stopped listening (e.g. the client disconnected)
+            future.cancel()
+
+    def stats(self):
+        return {
+            **self._counts,
+            'in_flight': self._in_flight,
+            'max_concurrency': self.max_concurrency,
+            'circuit': self.breaker.state,
+            'circuit_opened': self.breaker.times_opened
+        }
+
+    def close(self):
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
@@ -1,55 +1,148 @@
 import torch
-from transformers import pipeline, AutoTokenizer, AutoModelForSeq2SeqLM
+from transformers import AutoTokenizer, AutoModelForSeq2SeqLM, TextIteratorStreamer
 import logging
+import threading
+
+from src.modules.batching import MicroBatcher
+from src.modules.context_packer import ContextPacker, TokenCounter
 
 logger = logging.getLogger(__name__)
 
+PROMPT = "Answer the question based on the context below.\n\nContext:\n{context}\n\nQuestion: {query}\n\nAnswer:"
+# Longest Flan-T5 input, including the end-of-sequence token
+MAX_INPUT_TOKENS = 512
+
 class Generator:
-    def __init__(self, model_name="google/flan-t5-small"):
+    """
+    Local seq2seq (Flan-T5) generator.
+
+    Prompts from concurrent requests are collected by a MicroBatcher and
+    decoded together in one padded `generate` call, once `max_batch_size`
+    prompts are queued or the oldest has waited `max_wait_ms`. With
+    `quantize`, the model's Linear layers run as int8 (dynamic quantization),
+    which is smaller and faster on CPU.
+    """
+
+    def __init__(self, model_name="google/flan-t5-small", quantize=False, max_batch_size=8, max_wait_ms=20,
+                 max_new_tokens=200, model=None, tokenizer=None):
         self.model_name = model_name
-        self.pipeline = None
-        self._initialize_model()
+        self.quantize = quantize
+        self.max_new_tokens = max_new_tokens
+        self.model = model
+        self.tokenizer = tokenizer
+        self._lock = threading.Lock()
+        self._tokens_generated = 0
+        self._input_tokens = 0
+        self._padded_input_tokens = 0
+        if self.model is None:
+            self._initialize_model()
+        elif quantize:
+            self.model = self._quantize(self.model)
+        self.batcher = MicroBatcher(
+            self._generate_batch, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms, name='generation-batcher'
+        ) if self.model is not None else None
+
+    @staticmethod
+    def _quantize(model):
+        return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
 
     def _initialize_model(self):
         try:
             logger.info(f"Loading generator model: {self.model_name}")
-            # Use pipeline for easy inference
-            # text2text-generation is suitable for T5 models
-            self.pipeline = pipeline(
-                "text2text-generation",
-                model=self.model_name,
-                device=-1, # Force CPU to avoid CUDA errors if GPU not present/configured
-                model_kwargs={"low_cpu_mem_usage": True}
-            )
-            logger.info("Generator model loaded successfully")
+            self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+            # Runs on CPU, so missing or misconfigured CUDA never matters
+            model = AutoModelForSeq2SeqLM.from_pretrained(self.model_name, low_cpu_mem_usage=True).eval()
+            self.model = self._quantize(model) if self.quantize else model
+            logger.info(f"Generator model loaded successfully{' (int8)' if self.quantize else ''}")
         except Exception as e:
             logger.error(f"Failed to load generator model: {str(e)}")
-            self.pipeline = None
+            self.model = None
+
+    @property
+    def max_context_tokens(self):
+        # Room left for the prompt template and a typical question
+        return MAX_INPUT_TOKENS - 96
+
+    def _prompt(self, query, retrieved_chunks):
+        # Whole chunks (or leading sentences) in relevance order, counted with
+        # the model's own tokenizer, so the question at the end is never cut off
+        counter = TokenCounter(self.tokenizer)
+        budget = MAX_INPUT_TOKENS - 1 - counter.count([PROMPT.format(context='', query=query)])[0]
+        _, chunks, _ = ContextPacker(counter, max(budget, 0)).pack(retrieved_chunks)
+        return PROMPT.format(context="\n".join(chunks), query=query)
+
+    def _generate_batch(self, prompts):
+        inputs = self.tokenizer(
+            prompts, return_tensors="pt", padding=True, truncation=True, max_length=MAX_INPUT_TOKENS
+        )
+        with torch.inference_mode():
+            outputs = self.model.generate(**inputs, max_new_tokens=self.max_new_tokens, do_sample=False)
+        with self._lock:
+            # The decoder start token and the padding after shorter answers are pad tokens
+            self._tokens_generated += int((outputs != self.tokenizer.pad_token_id).sum())
+            self._input_tokens += int(inputs['attention_mask'].sum())
+            self._padded_input_tokens += inputs['attention_mask'].numel()
+        return self.tokenizer.batch_decode(outputs, skip_special_tokens=True)
 
     def generate(self, query, retrieved_chunks):
-        if not self.pipeline:
+        if not self.model:
             return "Error: Generator model not loaded."
 
-        # Truncate chunks if too long (simple char count heuristic approx 4 chars per token)
-        # Model limit is 512 tokens ~ 2000 chars. 
-        # Reserve 200 chars for query + prompt
-        max_context_length = 2000
-        
-        context = "\n".join(retrieved_chunks)
-        if len(context) > max_context_length:
-             context = context[:max_context_length] + "..."
-             
-        prompt = f"Answer the question based on the context below.\n\nContext:\n{context}\n\nQuestion: {query}\n\nAnswer:"
-
         try:
-            # Generate
-            output = self.pipeline(
-                prompt,
-                max_length=200,
-                truncation=True, # Explicitly enable truncation
-                do_sample=False,
-            )
-            return output[0]['generated_text']
+            return self.batcher(self._prompt(query, retrieved_chunks))
         except Exception as e:
             logger.error(f"Error during generation: {str(e)}")
             return "Error generating answer."
+
+    def generate_stream(self, query, retrieved_chunks):
+        """Yield decoded text as the model produces tokens"""
+        if not self.model:
+            yield "Error: Generator model not loaded."
+            return
+
+        # A stream decodes on its own, outside the batcher
+        inputs = self.tokenizer(
+            self._prompt(query, retrieved_chunks), return_tensors="pt", truncation=True, max_length=MAX_INPUT_TOKENS
+        )
+        streamer = TextIteratorStreamer(self.tokenizer, skip_special_tokens=True)
+        errors = []
+
+        def run():
+            try:
+                with torch.inference_mode():
+                    self.model.generate(**inputs, max_new_tokens=self.max_new_tokens, do_sample=False, streamer=streamer)
+            except Exception as e:
+                errors.append(e)
+                streamer.end()
+
+        # generate() blocks until the last token; it feeds the streamer from a thread
+        thread = threading.Thread(target=run, name='generator-stream', daemon=True)
+        thread.start()
+        for text in streamer:
+            yield text
+        thread.join()
+        if errors:
+            logger.error(f"Error during generation: {str(errors[0])}")
+            yield "Error generating answer."
+
+    def stats(self):
+        batching = self.batcher.stats() if self.batcher else {'batches': 0, 'busy_seconds': 0.0}
+        batches, busy = batching['batches'], batching['busy_seconds']
+        with self._lock:
+            return {
+                **batching,
+                'model_name': self.model_name,
+                'quantized': self.quantize,
+                'tokens_generated': self._tokens_generated,
+                'tokens_per_second': self._tokens_generated / busy if busy else 0.0,
+                # Mean share of max_batch_size filled per batch
+                'batch_occupancy': batching['items'] / (batches * batching['max_batch_size']) if batches else 0.0,
+                # Share of padded input positions holding real tokens
+                'padding_efficiency': (
+                    self._input_tokens / self._padded_input_tokens if self._padded_input_tokens else 0.0
+                )
+            }
+
+    def close(self):
+        if self.batcher:
+            self.batcher.close()
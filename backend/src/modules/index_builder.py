@@ -0,0 +1,697 @@
+import json
+import logging
+import os
+import queue
+import shutil
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+from src.database.crud import DocumentCRUD, IndexMetadataCRUD
+from src.modules.rag_system import TextChunker, Embedder, FAISSManager
+from src.modules.context_packer import TokenCounter
+from src.modules.chunk_store import ChunkStore, ChunkStoreWriter, MetadataStore, segment_texts
+from src.modules.sparse_index import write_params, write_postings
+from src.modules.embedding_cache import EmbeddingCache, CachedEmbedder
+from src.modules.dedup import MinHashDeduplicator
+
+logger = logging.getLogger(__name__)
+
+# End-of-stream marker passed between pipeline stages
+_DONE = object()
+
+# Metadata describing where a chunk came from. A chunk that stands in for
+# near-duplicates also lists every source under 'sources'.
+SOURCE_KEYS = ('doc_id', 'source_file', 'page', 'chunk_idx', 'char_start', 'char_end')
+
+
+def parse_content(content):
+    """Documents store either a JSON list of pages or plain text"""
+    try:
+        if content.strip().startswith('['):
+            return json.loads(content)
+    except Exception:
+        pass
+    return content
+
+
+def chunk_sources(meta):
+    return meta.get('sources') or [{key: meta[key] for key in SOURCE_KEYS if key in meta}]
+
+
+def with_sources(meta, sources):
+    """Metadata for a chunk shared by `sources`; the first one is the primary"""
+    new_meta = {key: value for key, value in meta.items() if key not in SOURCE_KEYS and key != 'sources'}
+    new_meta.update(sources[0])
+    if len(sources) > 1:
+        new_meta['sources'] = sources
+    return new_meta
+
+
+class BuildCancelled(Exception):
+    pass
+
+
+class BuildProgress:
+    """
+    Counters a build reports as it runs. Thread-safe: every pipeline stage
+    updates its own counter. Subclasses override `changed()` to publish the
+    counters and `cancelled()` to stop the build between pages.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stage = None
+        self.counters = {
+            'documents_total': 0,
+            'documents_chunked': 0,
+            'chunks_queued': 0,  # new chunks left after dedup
+            'chunks_embedded': 0,
+            'vectors_added': 0
+        }
+        self._streaming_since = None
+
+    def set_stage(self, stage):
+        with self._lock:
+            self.stage = stage
+            if stage == 'streaming':
+                self._streaming_since = time.time()
+        self.changed()
+
+    def add(self, **counts):
+        with self._lock:
+            for name, n in counts.items():
+                self.counters[name] += n
+        self.changed()
+
+    def set(self, **values):
+        with self._lock:
+            self.counters.update(values)
+        self.changed()
+
+    def snapshot(self):
+        """Counters plus vectors/s and an ETA for the streaming stage"""
+        with self._lock:
+            snapshot = dict(self.counters)
+            elapsed = time.time() - self._streaming_since if self._streaming_since else 0.0
+        rate = snapshot['vectors_added'] / elapsed if elapsed else 0.0
+        eta = None
+        if snapshot['documents_chunked'] and rate:
+            # Chunks per document so far, extrapolated to the documents still to read
+            expected = snapshot['chunks_queued'] / snapshot['documents_chunked'] * snapshot['documents_total']
+            eta = max(expected - snapshot['vectors_added'], 0) / rate
+        snapshot['vectors_per_second'] = rate
+        snapshot['eta_seconds'] = eta
+        return snapshot
+
+    def changed(self):
+        pass
+
+    def cancelled(self):
+        return False
+
+
+class _IndexSink:
+    """
+    Adds embedded batches to the index. Without an existing index, the first
+    vectors are held back until there are enough to choose and train one;
+    `estimate_total()` sizes it for the expected final corpus.
+    """
+
+    def __init__(self, builder, index, estimate_total):
+        self.builder = builder
+        self.index = index
+        self.estimate_total = estimate_total
+        self.train_size = builder.config['retrieval'].get('max_train_size', 100000)
+        self._pending = []
+        self._n_pending = 0
+
+    def add(self, embeddings, ids):
+        if self.index is not None:
+            FAISSManager.add(self.index, embeddings, ids)
+            return
+        self._pending.append((embeddings, ids))
+        self._n_pending += len(ids)
+        if self._n_pending >= self.train_size:
+            self._create()
+
+    def _create(self):
+        embeddings = np.concatenate([embeddings for embeddings, _ in self._pending])
+        ids = np.concatenate([ids for _, ids in self._pending])
+        self._pending, self._n_pending = [], 0
+        self.index = self.builder._new_index(embeddings, ids, n_total=self.estimate_total())
+
+    def finish(self):
+        if self.index is None and self._pending:
+            self._create()
+        return self.index
+
+
+class IndexBuilder:
+    """
+    Builds the FAISS index from the documents table.
+
+    Chunk ids are positions in the chunk list and never change once assigned:
+    chunks of deleted or re-uploaded documents are tombstoned (set to None) and
+    removed from FAISS, and new chunks are appended with fresh ids. The lists
+    are compacted once tombstones exceed `compact_threshold`.
+
+    The chunk store is a list of segments, each with its own BM25 postings
+    and MinHash state. A new version links the previous version's segments
+    and writes only the new chunks, so an incremental build never re-reads,
+    re-hashes or re-tokenizes the chunks it keeps. Small trailing segments
+    are rewritten together with the new chunks (see `_segments_to_link`).
+
+    Near-duplicate chunks are embedded once: later copies only add their
+    source to the surviving chunk's metadata.
+
+    A build streams: documents are read a page at a time and chunked on the
+    calling thread, embedded on a second thread and written to the index and
+    chunk store on a third. Bounded queues between the stages hold
+    `pipeline_batch_size * queue_size` chunks. The chunk store seals a
+    segment, with its BM25 postings and MinHash state, every `segment_rows`
+    chunks, so the per-chunk state held in memory is bounded by those
+    settings rather than the corpus. What still grows with the corpus: the
+    FAISS index being built, one live-mask byte per chunk, metadata
+    overrides, and per-document bookkeeping (chunk counts and the list of
+    indexed document ids).
+    """
+
+    def __init__(self, rag_config, index_dir, embedder=None, embedding_cache_dir=None):
+        self.config = rag_config
+        self.index_dir = Path(index_dir)
+        self._embedder = embedder
+        self._chunker = None
+        self._token_counter = None
+        self.embedding_cache_dir = embedding_cache_dir
+
+    @property
+    def embedder(self):
+        # Loaded lazily so a build with nothing to embed never loads the model
+        if self._embedder is None:
+            model_name = self.config['embedding']['model_name']
+            inference = self.config['inference']
+            backend = inference['embedding_backend']
+            self._embedder = Embedder(model_name, backend, inference['onnx_dir'])
+            if self.embedding_cache_dir and self.config['embedding']['use_cache']:
+                # Quantized backends give slightly different vectors; cache them apart
+                cache_name = model_name if backend == 'torch' else f"{model_name}@{backend}"
+                self._embedder = CachedEmbedder(self._embedder, EmbeddingCache(self.embedding_cache_dir, cache_name))
+        return self._embedder
+
+    @property
+    def chunker(self):
+        if self._chunker is None:
+            self._chunker = TextChunker(
+                chunk_size=self.config['chunking']['chunk_size'],
+                overlap=self.config['chunking']['overlap'],
+                snap_to_sentences=self.config['chunking']['snap_to_sentences']
+            )
+        return self._chunker
+
+    @property
+    def token_counter(self):
+        # Counts in the generator's tokenizer, stored as `n_tokens` for ContextPacker
+        if self._token_counter is None:
+            self._token_counter = TokenCounter.load(self.config['generation']['context_tokenizer'])
+        return self._token_counter
+
+    def _load_existing(self):
+        if not FAISSManager.exists(self.index_dir):
+            return None
+        try:
+            # The chunk and metadata stores stay memory-mapped; rows are copied across one by one
+            index, chunks, metadata = FAISSManager.load(str(self.index_dir), self.config['retrieval'])
+        except Exception as e:
+            logger.warning(f"Could not load existing index, rebuilding from scratch: {str(e)}")
+            return None
+        if not FAISSManager.supports_incremental(index):
+            logger.info("Existing index has no chunk ids, rebuilding from scratch")
+            return None
+        if not isinstance(chunks, ChunkStore):
+            logger.info("Existing index predates the chunk store, rebuilding from scratch")
+            return None
+        return index, chunks, metadata
+
+    def _new_deduplicator(self):
+        params = self.config['dedup']
+        return MinHashDeduplicator(
+            threshold=params['threshold'],
+            num_perm=params['num_perm'],
+            bands=params['bands'],
+            shingle_size=params['shingle_size']
+        )
+
+    def _chunk_page(self, db, documents, chunk_counts):
+        """
+        Chunk one page of documents. Returns [(text, meta)] in document order
+        and records each document's chunk count in `chunk_counts`.
+        """
+        rows = []
+
+        # Several documents share each tokenizer call
+        batch_size = self.config['chunking']['batch_documents']
+        for batch_start in range(0, len(documents), batch_size):
+            batch = documents[batch_start:batch_start + batch_size]
+            contents = DocumentCRUD.get_contents(db, [doc.id for doc in batch])
+            chunked = self.chunker.chunk_batch([contents.get(doc.id, '') for doc in batch])
+            token_counts = iter(self.token_counter.count(chunk for chunks, _ in chunked for chunk in chunks))
+
+            for doc, (chunks, metadatas) in zip(batch, chunked):
+                for i, chunk in enumerate(chunks):
+                    # Base metadata
+                    meta = {
+                        'source_file': doc.original_filename,
+                        'doc_id': doc.id,
+                        'chunk_idx': i,
+                        'n_tokens': next(token_counts)
+                    }
+
+                    # Add page and character span metadata if available
+                    if metadatas and i < len(metadatas):
+                        meta.update(metadatas[i])
+
+                    rows.append((chunk, meta))
+
+                chunk_counts[doc.id] = len(chunks)
+
+        return rows
+
+    def _new_index(self, embeddings, ids, n_total=None):
+        params = self.config['retrieval']
+        index = FAISSManager.build_index(embeddings, ids, params, n_total=n_total)
+
+        n_queries = params.get('recall_check_queries', 0)
+        if n_queries and FAISSManager.index_type(index) != 'flat':
+            recall = FAISSManager.recall_at_k(index, embeddings, ids, k=params['k_retrieve'], n_queries=n_queries)
+            logger.info(f"{FAISSManager.index_type(index)} index recall@{params['k_retrieve']}: {recall:.3f}")
+        return index
+
+    def _retype(self, index):
+        """Rebuild the index when the corpus has crossed `flat_threshold` either way"""
+        wanted_type = FAISSManager.choose_index_type(int(index.ntotal), self.config['retrieval'])
+        if FAISSManager.index_type(index) == wanted_type:
+            return index
+        logger.info(f"Rebuilding {FAISSManager.index_type(index)} index as {wanted_type}")
+        ids, vectors = FAISSManager.extract_vectors(index)
+        order = np.argsort(ids)
+        return self._new_index(vectors[order], ids[order])
+
+    def _find_stale(self, metadata, stale_doc_ids, live_doc_ids):
+        """
+        Chunks of deleted documents and of documents being re-indexed. A chunk
+        shared by several documents survives while any of them remain.
+        Returns (removed ids, {id: metadata} for chunks that lost a source).
+
+        Only rows that can be affected are read: those whose primary document
+        is stale, those with several sources and those with overridden
+        metadata. The rest is ruled out from the doc_id column codes.
+        """
+        candidates = set(i for i in metadata.overrides if metadata.live[i])
+        for segment in metadata.segments:
+            if not segment.count:
+                continue
+            affected = np.zeros(segment.count, dtype=bool)
+            if 'doc_id' in segment.columns:
+                codes = [code for code, doc_id in enumerate(segment.strings['doc_id'])
+                         if doc_id in stale_doc_ids or doc_id not in live_doc_ids]
+                affected |= np.isin(segment.columns['doc_id'], codes)
+            if 'sources' in segment.columns:
+                offsets, _ = segment.columns['sources']
+                affected |= np.diff(offsets) > 0
+            affected &= np.asarray(metadata.live[segment.start:segment.start + segment.count], dtype=bool)
+            candidates.update((np.flatnonzero(affected) + segment.start).tolist())
+
+        removed, regrouped = [], {}
+        for i in sorted(candidates):
+            meta = metadata[i]
+            sources = chunk_sources(meta)
+            remaining = [s for s in sources if s['doc_id'] not in stale_doc_ids and s['doc_id'] in live_doc_ids]
+            if not remaining:
+                removed.append(i)
+            elif len(remaining) < len(sources):
+                regrouped[i] = with_sources(meta, remaining)
+        return removed, regrouped
+
+    @staticmethod
+    def _segments_to_link(counts, segment_rows=None):
+        """
+        How many leading segments (of `counts` rows each) a build links as
+        they are; the rest are rewritten with the new chunks. Full segments
+        (`segment_rows` rows) are final. After the last one, a segment is kept
+        only while it has at least twice the rows of all segments after it,
+        so sizes shrink geometrically towards the newest: there are O(log n)
+        partial segments and each chunk is rewritten O(log n) times.
+        """
+        keep, tail = len(counts), 0
+        for k in range(len(counts) - 1, -1, -1):
+            if segment_rows and counts[k] >= segment_rows:
+                break
+            if counts[k] < 2 * tail:
+                keep = k
+            tail += counts[k]
+        return keep
+
+    def _segment_sealer(self, dedup):
+        """Writes a new segment's postings and near-duplicate state once its chunks are on disk"""
+        def seal(segment_dir, start, count):
+            write_postings(segment_dir, segment_texts(segment_dir))
+            if dedup is not None:
+                dedup.write(segment_dir, start, count)
+        return seal
+
+    def _carry_over(self, writer, dedup, chunks, metadata, removed, regrouped, compact_ids=None):
+        """
+        Bring the surviving chunks into the new store. Segments are linked as
+        they are, apart from small trailing ones, which are rewritten under
+        the same ids. With `compact_ids` every surviving chunk is rewritten
+        under a new id instead.
+        """
+        live = np.array(metadata.live, dtype=np.uint8)
+        live[removed] = 0
+        if compact_ids is not None:
+            n_link = 0
+        else:
+            n_link = self._segments_to_link(
+                [s.count for s in metadata.segments], self.config['indexing']['segment_rows']
+            )
+
+        for segment in metadata.segments[:n_link]:
+            segment_live = live[segment.start:segment.start + segment.count]
+            segment_dir = writer.link(segment.directory, segment_live)
+            if not (segment_dir / 'sparse.vocab.json').exists():
+                # Segment written before the sparse index was kept with it
+                write_postings(segment_dir, segment_texts(segment_dir))
+            if dedup is not None and not dedup.open(segment_dir, segment.start, segment_live):
+                # No state saved with the current parameters: hash the segment once
+                for i, text in enumerate(segment_texts(segment_dir)):
+                    if segment_live[i]:
+                        dedup.add(segment.start + i, text)
+                dedup.write(segment_dir, segment.start, segment.count, segment_live)
+
+        # Metadata changed since the linked segments were written
+        for i, meta in list(metadata.overrides.items()) + list(regrouped.items()):
+            if i < len(writer) and live[i]:
+                writer.update(i, meta)
+
+        for segment in metadata.segments[n_link:]:
+            end = segment.start + segment.count
+            if compact_ids is None:
+                ids = range(segment.start, end)
+            else:
+                ids = compact_ids[np.searchsorted(compact_ids, segment.start):np.searchsorted(compact_ids, end)]
+            # Rewritten chunks keep their signatures instead of being hashed again
+            signatures = dedup.saved_signatures(segment.directory) if dedup is not None else {}
+            for i in ids:
+                i = int(i)
+                meta = regrouped.get(i) or metadata[i]
+                text = chunks[i] if live[i] and meta is not None else None
+                # Registered first: the append may seal the row's segment
+                if text is not None and dedup is not None:
+                    signature = signatures.get(i - segment.start)
+                    if signature is not None:
+                        dedup.add_signature(len(writer), signature)
+                    else:
+                        dedup.add(len(writer), text)
+                writer.append(text, meta if text is not None else None)
+
+    def _embed_stage(self, embed_q, write_q, state, progress):
+        batch_size = self.config['embedding']['batch_size']
+        while True:
+            batch = embed_q.get()
+            if batch is _DONE:
+                write_q.put(_DONE)
+                return
+            if state['error'] is not None:
+                # Keep draining so the chunking stage never blocks
+                continue
+            try:
+                start_id, texts, metas, merges = batch
+                embeddings = None
+                if texts:
+                    t_start = time.time()
+                    embeddings = self.embedder.embed(texts, batch_size=batch_size)
+                    state['embed_seconds'] += time.time() - t_start
+                    progress.add(chunks_embedded=len(texts))
+                write_q.put((start_id, texts, metas, merges, embeddings))
+            except Exception as e:
+                state['error'] = e
+
+    def _write_stage(self, write_q, writer, sink, state, progress):
+        while True:
+            batch = write_q.get()
+            if batch is _DONE:
+                return
+            if state['error'] is not None:
+                continue
+            try:
+                start_id, texts, metas, merges, embeddings = batch
+                if texts:
+                    sink.add(embeddings, np.arange(start_id, start_id + len(texts)))
+                    writer.extend(texts, metas)
+                    progress.add(vectors_added=len(texts))
+                # Near-duplicates only add their source to an already written chunk
+                for target, sources in merges:
+                    meta = writer.get_meta(target)
+                    writer.update(target, with_sources(meta, chunk_sources(meta) + sources))
+            except Exception as e:
+                state['error'] = e
+
+    def _run_pipeline(self, db, documents, writer, sink, dedup, state, progress):
+        """
+        Chunk and deduplicate `documents` (an iterator of pages) on this
+        thread while the embed and write stages consume the batches.
+        """
+        indexing = self.config['indexing']
+        embed_q = queue.Queue(maxsize=indexing['queue_size'])
+        write_q = queue.Queue(maxsize=indexing['queue_size'])
+        stages = [
+            threading.Thread(target=self._embed_stage, args=(embed_q, write_q, state, progress),
+                             name='index-embed', daemon=True),
+            threading.Thread(target=self._write_stage, args=(write_q, writer, sink, state, progress),
+                             name='index-write', daemon=True)
+        ]
+        for stage in stages:
+            stage.start()
+
+        next_id = len(writer)
+        batch_size = indexing['pipeline_batch_size']
+        texts, metas, merges = [], [], []
+        try:
+            for page in documents:
+                if state['error'] is not None:
+                    break
+                if progress.cancelled():
+                    raise BuildCancelled()
+                rows = self._chunk_page(db, page, state['chunk_counts'])
+                state['new_chunks'] += len(rows)
+
+                t_start = time.time()
+                for text, meta in rows:
+                    match = dedup.find_or_add(next_id + len(texts), text) if dedup is not None else None
+                    if match is None:
+                        texts.append(text)
+                        metas.append(meta)
+                    else:
+                        merges.append((match, chunk_sources(meta)))
+                        state['duplicates'] += 1
+                    if len(texts) >= batch_size:
+                        embed_q.put((next_id, texts, metas, merges))
+                        next_id += len(texts)
+                        texts, metas, merges = [], [], []
+                if dedup is not None:
+                    state['dedup_seconds'] += time.time() - t_start
+
+                progress.set(
+                    documents_chunked=len(state['chunk_counts']),
+                    chunks_queued=state['new_chunks'] - state['duplicates']
+                )
+            if texts or merges:
+                embed_q.put((next_id, texts, metas, merges))
+        except Exception as e:
+            # Let the other stages drain instead of working on a build that failed
+            state['error'] = state['error'] or e
+        finally:
+            embed_q.put(_DONE)
+            for stage in stages:
+                stage.join()
+
+        if state['error'] is not None:
+            raise state['error']
+
+    def build(self, db, incremental=True, progress=None):
+        """
+        Index new and changed documents.
+
+        With `incremental=False`, or when no usable index exists on disk, every
+        document is re-chunked and re-embedded. Returns a dict of build stats,
+        or None when there was nothing to index. `progress` (a BuildProgress)
+        receives stage counters and can cancel the build with BuildCancelled.
+        Builds of the same index directory wait for each other, also across
+        processes, so each one starts from the version the last one wrote.
+        """
+        with FAISSManager.build_lock(self.index_dir):
+            return self._build(db, incremental, progress)
+
+    def _build(self, db, incremental, progress):
+        progress = progress or BuildProgress()
+        progress.set_stage('preparing')
+        started_at = datetime.utcnow()
+        existing = self._load_existing() if incremental else None
+        indexing = self.config['indexing']
+
+        removed, regrouped, dead = [], {}, 0
+        if existing:
+            index, old_chunks, old_metadata = existing
+            dim = index.d
+            last = IndexMetadataCRUD.get_latest(db)
+            since = last.last_indexed if last else None
+            stale_doc_ids = set(DocumentCRUD.get_pending_ids(db, since))
+            n_documents = len(stale_doc_ids)
+            removed, regrouped = self._find_stale(old_metadata, stale_doc_ids, set(DocumentCRUD.get_ids(db)))
+            dead = len(old_metadata) - int(np.count_nonzero(old_metadata.live))
+        else:
+            index, old_chunks, old_metadata = None, None, []
+            dim = None
+            since = None
+            n_documents = DocumentCRUD.count_ready(db)
+
+        if existing and not n_documents and not removed and not regrouped:
+            logger.info("Index is already up to date")
+            return {
+                'incremental': True,
+                'documents_indexed': 0,
+                'chunks_added': 0,
+                'chunks_removed': 0,
+                'duplicates_skipped': 0,
+                'dedup_ratio': 0.0,
+                'dedup_seconds': 0.0,
+                'embedding_seconds_saved': 0.0,
+                'total_chunks': int(index.ntotal)
+            }
+
+        if removed:
+            index = FAISSManager.remove(index, removed, self.config['retrieval'])
+
+        # Renumber before streaming once enough tombstones have piled up, so
+        # new chunks are appended straight after the surviving ones
+        compact_ids = None
+        n_kept = len(old_metadata) - dead - len(removed)
+        dead += len(removed)
+        if dead and dead / len(old_metadata) >= indexing['compact_threshold']:
+            logger.info(f"Compacting index: dropping {dead} tombstoned chunks")
+            compact_ids, vectors = FAISSManager.extract_vectors(index)
+            order = np.argsort(compact_ids)
+            compact_ids, vectors = compact_ids[order], vectors[order]
+            index = self._new_index(vectors, np.arange(len(compact_ids))) if len(compact_ids) else None
+            n_kept = len(compact_ids)
+            del vectors
+
+        dedup = self._new_deduplicator() if self.config['dedup']['enabled'] else None
+        version, staging_dir = FAISSManager.begin_version(self.index_dir)
+        writer = ChunkStoreWriter(staging_dir, on_seal=self._segment_sealer(dedup),
+                                  segment_rows=indexing['segment_rows'])
+        state = {
+            'error': None, 'chunk_counts': {},
+            'new_chunks': 0, 'duplicates': 0, 'dedup_seconds': 0.0, 'embed_seconds': 0.0
+        }
+        progress.set(documents_total=n_documents)
+
+        def estimate_total():
+            # Sizes a new index for the whole corpus from the chunks per document so far
+            counters = progress.snapshot()
+            if not counters['documents_chunked']:
+                return None
+            return n_kept + int(counters['chunks_queued'] / counters['documents_chunked'] * n_documents)
+
+        sink = _IndexSink(self, index, estimate_total)
+        try:
+            if existing:
+                self._carry_over(writer, dedup, old_chunks, old_metadata, removed, regrouped, compact_ids)
+
+            progress.set_stage('streaming')
+            documents = DocumentCRUD.iter_ready(db, indexing['page_size'], pending=existing is not None, since=since)
+            self._run_pipeline(db, documents, writer, sink, dedup, state, progress)
+            if progress.cancelled():
+                raise BuildCancelled()
+
+            progress.set_stage('finalizing')
+
+            index = sink.finish()
+            if index is None and (dim or FAISSManager.exists(self.index_dir)):
+                # Every indexed document is gone: publish an empty version
+                # rather than keep serving the old one, and finish the build
+                # as usual so document flags and metadata follow
+                logger.info("No documents left: writing an empty index")
+                dim = dim or FAISSManager.load(self.index_dir, mmap=True)[0].d
+                index = FAISSManager.build_index(np.zeros((0, dim), dtype='float32'), params=self.config['retrieval'])
+            if index is None:
+                logger.warning("No documents to index")
+                writer.abort()
+                shutil.rmtree(staging_dir, ignore_errors=True)
+                return None
+            index = self._retype(index)
+
+            retrieval = self.config['retrieval']
+            for tmp_path, final_path in writer.finish() + write_params(
+                    staging_dir, retrieval['bm25_k1'], retrieval['bm25_b']):
+                os.replace(tmp_path, final_path)
+            doc_ids = MetadataStore(staging_dir).distinct('doc_id')
+            FAISSManager.commit_version(
+                self.index_dir, version, staging_dir, index, len(writer),
+                keep_versions=indexing['keep_versions']
+            )
+        except Exception:
+            writer.abort()
+            shutil.rmtree(staging_dir, ignore_errors=True)
+            raise
+
+        # Document flags and the index metadata commit together, in a handful
+        # of statements. Documents changed since the build started stay
+        # pending for the next one, which looks for changes from `started_at`.
+        DocumentCRUD.mark_indexed(db, state['chunk_counts'], unchanged_since=started_at, commit=False)
+        IndexMetadataCRUD.create(
+            db,
+            index_name="main_index",
+            document_ids=sorted(doc_ids),
+            total_chunks=int(index.ntotal),
+            index_size_mb=FAISSManager.disk_size_mb(self.index_dir),
+            last_indexed=started_at
+        )
+
+        total_new, duplicates = state['new_chunks'], state['duplicates']
+        chunks_added = total_new - duplicates
+        t_dedup, t_embed = state['dedup_seconds'], state['embed_seconds']
+        stats = {
+            'incremental': existing is not None,
+            'documents_indexed': len(state['chunk_counts']),
+            'chunks_added': chunks_added,
+            'chunks_removed': len(removed),
+            'duplicates_skipped': duplicates,
+            'dedup_ratio': duplicates / total_new if total_new else 0.0,
+            'dedup_seconds': t_dedup,
+            # Estimated from this build's per-chunk embedding time
+            'embedding_seconds_saved': t_embed / chunks_added * duplicates if chunks_added else 0.0,
+            'embedding_seconds': t_embed,
+            'total_chunks': int(index.ntotal),
+            'version': version
+        }
+        if duplicates:
+            logger.info(
+                f"Dedup: {duplicates} of {total_new} new chunks were near-duplicates "
+                f"({stats['dedup_ratio']:.1%}), ~{stats['embedding_seconds_saved']:.1f}s of embedding saved, "
+                f"dedup took {t_dedup:.1f}s"
+            )
+        if isinstance(self._embedder, CachedEmbedder):
+            stats['embedding_cache'] = self._embedder.stats()
+            self._embedder.reset_stats()
+            logger.info(
+                f"Embedding cache: {stats['embedding_cache']['hits']} hits, "
+                f"{stats['embedding_cache']['misses']} misses "
+                f"({stats['embedding_cache']['hit_rate']:.1%}), "
+                f"{stats['embedding_cache']['text_bytes_saved'] / 1e6:.1f} MB of text not re-encoded"
+            )
+        return stats
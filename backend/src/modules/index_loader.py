@@ -0,0 +1,126 @@
+import logging
+import threading
+from pathlib import Path
+
+from src.modules.rag_system import FAISSManager
+from src.modules.sparse_index import BM25Index
+
+logger = logging.getLogger(__name__)
+
+
+class IndexSnapshot:
+    """
+    One loaded index version.
+
+    Queries acquire the snapshot for as long as they use it. Once a newer
+    version replaces it, the snapshot is retired and drops its index and
+    stores when the last in-flight query releases it.
+    """
+
+    def __init__(self, version, index, chunks, metadata, sparse_index):
+        self.version = version
+        self.index = index
+        self.chunks = chunks
+        self.metadata = metadata
+        self.sparse_index = sparse_index
+        self._lock = threading.Lock()
+        self._refs = 0
+        self._retired = False
+        self.closed = False
+
+    def acquire(self):
+        """Take a reference; False if the snapshot was already released"""
+        with self._lock:
+            if self.closed:
+                return False
+            self._refs += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self._refs -= 1
+            if self._retired and self._refs == 0:
+                self._close()
+
+    def retire(self):
+        with self._lock:
+            self._retired = True
+            if self._refs == 0:
+                self._close()
+
+    def _close(self):
+        # Dropping the references unmaps the old version's files
+        self.index = self.chunks = self.metadata = self.sparse_index = None
+        self.closed = True
+        logger.info(f"Released index version {self.version}")
+
+
+class IndexLoader:
+    """
+    Watches the index manifest and loads new versions off the request path.
+
+    `publish(snapshot)` is called with each newly loaded version; the previous
+    snapshot is retired right after, so queries already running on it finish
+    undisturbed.
+    """
+
+    def __init__(self, index_dir, search_params, publish, poll_seconds=2.0):
+        self.index_dir = Path(index_dir)
+        self.search_params = search_params
+        self.publish = publish
+        self.poll_seconds = poll_seconds
+        self.current = None
+        self._failed_version = None
+        self._refresh_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _latest_version(self):
+        manifest = FAISSManager.current_version(self.index_dir)
+        if manifest is not None:
+            return manifest['version'], self.index_dir / manifest['path']
+        if (self.index_dir / 'index.bin').exists():
+            # Flat layout from before versioned directories
+            return 0, self.index_dir
+        return None, None
+
+    def refresh(self):
+        """Load and publish the current version if it is new. Returns True on swap."""
+        with self._refresh_lock:
+            version, version_dir = self._latest_version()
+            if version is None or version == self._failed_version:
+                return False
+            if self.current is not None and version == self.current.version:
+                return False
+
+            try:
+                index, chunks, metadata = FAISSManager.load(str(version_dir), self.search_params, mmap=True)
+                snapshot = IndexSnapshot(version, index, chunks, metadata, BM25Index.load(version_dir))
+            except Exception as e:
+                # Keep serving the old version; retry once a newer one appears
+                logger.error(f"Failed to load index version {version}: {str(e)}")
+                self._failed_version = version
+                return False
+
+            previous, self.current = self.current, snapshot
+            self.publish(snapshot)
+            if previous is not None:
+                previous.retire()
+            logger.info(f"Index version {version} loaded ({len(chunks)} chunks)")
+            return True
+
+    def _run(self):
+        while not self._stop.wait(self.poll_seconds):
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error(f"Index reload failed: {str(e)}")
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='index-loader', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
@@ -0,0 +1,210 @@
+import inspect
+import json
+import logging
+import re
+from pathlib import Path
+
+import numpy as np
+import torch
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ('torch', 'torch_int8', 'onnx')
+PIPELINE_FILE = 'pipeline.json'
+
+
+def check_backend(backend):
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend: {backend} (expected one of {', '.join(BACKENDS)})")
+
+
+def quantize_int8(module):
+    """Dynamic int8 quantization of every Linear layer, for CPU inference"""
+    return torch.quantization.quantize_dynamic(module, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def export_dir(onnx_dir, model_name):
+    """Where the ONNX export of `model_name` lives"""
+    return Path(onnx_dir) / re.sub(r'[^A-Za-z0-9_.-]+', '__', model_name)
+
+
+def cosine_parity(reference, candidate):
+    """(mean, min) row-wise cosine similarity between two embedding matrices"""
+    reference = np.asarray(reference, dtype=np.float64)
+    candidate = np.asarray(candidate, dtype=np.float64)
+    cosines = (reference * candidate).sum(axis=1) / np.maximum(
+        np.linalg.norm(reference, axis=1) * np.linalg.norm(candidate, axis=1), 1e-12
+    )
+    return float(cosines.mean()), float(cosines.min())
+
+
+def _import_onnxruntime():
+    try:
+        import onnxruntime
+    except ImportError as e:
+        raise ImportError("The onnx backend needs onnxruntime: pip install onnxruntime") from e
+    return onnxruntime
+
+
+def _export_graph(model, tokenizer, output_dir, output_name, quantize):
+    """Trace a Hugging Face encoder to model.onnx (and model.int8.onnx); returns the file to load"""
+    sample = tokenizer(["an example sentence"], ["and its pair"], return_tensors='pt')
+    input_names = [name for name in ('input_ids', 'attention_mask', 'token_type_ids') if name in sample]
+    dynamic_axes = {name: {0: 'batch', 1: 'sequence'} for name in input_names}
+    dynamic_axes[output_name] = {0: 'batch'}
+    path = output_dir / 'model.onnx'
+    model.eval()
+    options = {}
+    if 'dynamo' in inspect.signature(torch.onnx.export).parameters:
+        # The TorchScript exporter handles dynamic_axes without onnxscript
+        options['dynamo'] = False
+    with torch.no_grad():
+        torch.onnx.export(
+            model, tuple(sample[name] for name in input_names), str(path),
+            input_names=input_names, output_names=[output_name], dynamic_axes=dynamic_axes, opset_version=14,
+            **options
+        )
+    if not quantize:
+        return path.name
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+    quantized = output_dir / 'model.int8.onnx'
+    quantize_dynamic(str(path), str(quantized), weight_type=QuantType.QInt8)
+    return quantized.name
+
+
+def export_embedder(model_name, onnx_dir, quantize=False):
+    """Export a SentenceTransformer (transformer + pooling + normalize) for OnnxSentenceEncoder"""
+    from sentence_transformers import SentenceTransformer
+    from sentence_transformers.models import Normalize, Pooling
+
+    model = SentenceTransformer(model_name, device='cpu')
+    transformer = model[0]
+    pooling = next(module for module in model if isinstance(module, Pooling))
+    output_dir = export_dir(onnx_dir, model_name)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    class LastHiddenState(torch.nn.Module):
+        def __init__(self, auto_model):
+            super().__init__()
+            self.auto_model = auto_model
+
+        def forward(self, *inputs):
+            return self.auto_model(*inputs)[0]
+
+    onnx_file = _export_graph(
+        LastHiddenState(transformer.auto_model), transformer.tokenizer, output_dir, 'last_hidden_state', quantize
+    )
+    transformer.tokenizer.save_pretrained(str(output_dir))
+    config = pooling.get_config_dict()
+    with open(output_dir / PIPELINE_FILE, 'w') as f:
+        json.dump({
+            'kind': 'embedder',
+            'model_name': model_name,
+            'file': onnx_file,
+            'max_length': transformer.max_seq_length,
+            'pooling': 'cls' if config.get('pooling_mode_cls_token') else
+                       'max' if config.get('pooling_mode_max_tokens') else 'mean',
+            'normalize': any(isinstance(module, Normalize) for module in model)
+        }, f, indent=2)
+    return output_dir
+
+
+def export_reranker(model_name, onnx_dir, max_length=512, quantize=False):
+    """Export a CrossEncoder (classification head + activation) for OnnxCrossEncoder"""
+    from sentence_transformers import CrossEncoder
+
+    model = CrossEncoder(model_name, max_length=max_length, device='cpu')
+    output_dir = export_dir(onnx_dir, model_name)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    class Logits(torch.nn.Module):
+        def __init__(self, classifier):
+            super().__init__()
+            self.classifier = classifier
+
+        def forward(self, *inputs):
+            return self.classifier(*inputs).logits
+
+    onnx_file = _export_graph(Logits(model.model), model.tokenizer, output_dir, 'logits', quantize)
+    model.tokenizer.save_pretrained(str(output_dir))
+    with open(output_dir / PIPELINE_FILE, 'w') as f:
+        json.dump({
+            'kind': 'reranker',
+            'model_name': model_name,
+            'file': onnx_file,
+            'max_length': max_length,
+            'activation': 'sigmoid' if isinstance(model.default_activation_function, torch.nn.Sigmoid) else 'identity'
+        }, f, indent=2)
+    return output_dir
+
+
+class _OnnxModel:
+    def __init__(self, directory, kind):
+        from transformers import AutoTokenizer
+        onnxruntime = _import_onnxruntime()
+        directory = Path(directory)
+        if not (directory / PIPELINE_FILE).exists():
+            raise FileNotFoundError(f"No ONNX export in {directory}; run export_models.py first")
+        with open(directory / PIPELINE_FILE, 'r') as f:
+            self.pipeline = json.load(f)
+        if self.pipeline['kind'] != kind:
+            raise ValueError(f"{directory} holds a {self.pipeline['kind']} export, not a {kind}")
+        self.tokenizer = AutoTokenizer.from_pretrained(str(directory))
+        self.max_length = self.pipeline['max_length']
+        self.session = onnxruntime.InferenceSession(
+            str(directory / self.pipeline['file']), providers=['CPUExecutionProvider']
+        )
+        self.input_names = [i.name for i in self.session.get_inputs()]
+
+    def _run(self, *texts):
+        encoded = self.tokenizer(
+            *texts, padding=True, truncation=True, max_length=self.max_length, return_tensors='np'
+        )
+        feed = {name: encoded[name].astype(np.int64) for name in self.input_names}
+        return self.session.run(None, feed)[0], encoded['attention_mask']
+
+
+class OnnxSentenceEncoder(_OnnxModel):
+    """SentenceTransformer.encode on an ONNX export"""
+
+    def __init__(self, directory):
+        super().__init__(directory, 'embedder')
+
+    def _pool(self, hidden, mask):
+        mode = self.pipeline['pooling']
+        if mode == 'cls':
+            return hidden[:, 0]
+        mask = mask[..., None].astype(hidden.dtype)
+        if mode == 'max':
+            return np.where(mask > 0, hidden, -1e9).max(axis=1)
+        return (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+
+    def encode(self, texts, batch_size=32, convert_to_tensor=False, **kwargs):
+        single = isinstance(texts, str)
+        texts = [texts] if single else list(texts)
+        batches = []
+        for start in range(0, len(texts), batch_size):
+            hidden, mask = self._run(texts[start:start + batch_size])
+            pooled = self._pool(hidden, mask)
+            if self.pipeline['normalize']:
+                pooled = pooled / np.maximum(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12)
+            batches.append(pooled.astype(np.float32))
+        embeddings = np.concatenate(batches) if batches else np.zeros((0, 0), dtype=np.float32)
+        return embeddings[0] if single else embeddings
+
+
+class OnnxCrossEncoder(_OnnxModel):
+    """CrossEncoder.predict on an ONNX export"""
+
+    def __init__(self, directory):
+        super().__init__(directory, 'reranker')
+
+    def predict(self, pairs, batch_size=32, **kwargs):
+        scores = []
+        for start in range(0, len(pairs), batch_size):
+            batch = pairs[start:start + batch_size]
+            logits, _ = self._run([a for a, _ in batch], [b for _, b in batch])
+            if self.pipeline['activation'] == 'sigmoid':
+                logits = 1 / (1 + np.exp(-logits))
+            scores.append(logits[:, 0] if logits.shape[1] == 1 else logits)
+        return np.concatenate(scores) if scores else np.zeros(0, dtype=np.float32)
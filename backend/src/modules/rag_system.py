@@ -1,10 +1,16 @@
 import os
+import asyncio
+import copy
 import json
 import pickle
+import shutil
 import numpy as np
 import nltk
 from pathlib import Path
 import time
+import hashlib
+import threading
+from collections import OrderedDict
 from typing import List, Dict, Tuple, Optional
 
 try:
@@ -12,15 +18,37 @@ try:
 except LookupError:
     nltk.download('punkt', quiet=True)
 
-from sentence_transformers import SentenceTransformer, util, CrossEncoder
+from sentence_transformers import SentenceTransformer, CrossEncoder
 import faiss
 from transformers import AutoTokenizer, pipeline
 import google.generativeai as genai
 import re
 
+from src.modules.chunk_store import ChunkStore, MetadataStore, ChunkStoreWriter, segment_texts
+from src.modules.sparse_index import SPARSE_FILES, fuse_rankings, write_params, write_postings
+from src.modules.batching import MicroBatcher
+from src.modules.context_packer import ContextPacker, TokenCounter
+from src.modules.file_lock import file_lock
+from src.modules.inference_backends import (
+    check_backend, quantize_int8, export_dir, OnnxSentenceEncoder, OnnxCrossEncoder
+)
+
 class Embedder:
-    def __init__(self, model_name='sentence-transformers/all-MiniLM-L6-v2'):
-        self.model = SentenceTransformer(model_name)
+    """
+    Sentence embeddings on one of the inference BACKENDS: fp32 PyTorch,
+    PyTorch with int8 dynamic quantization, or an ONNX export (see
+    export_models.py) under `onnx_dir` run with onnxruntime.
+    """
+    def __init__(self, model_name='sentence-transformers/all-MiniLM-L6-v2', backend='torch', onnx_dir=None):
+        check_backend(backend)
+        self.model_name = model_name
+        self.backend = backend
+        if backend == 'onnx':
+            self.model = OnnxSentenceEncoder(export_dir(onnx_dir, model_name))
+        else:
+            self.model = SentenceTransformer(model_name, device='cpu' if backend == 'torch_int8' else None)
+            if backend == 'torch_int8':
+                self.model = quantize_int8(self.model)
     
     def embed(self, texts, batch_size=32):
         if isinstance(texts, str):
@@ -30,35 +58,138 @@ class Embedder:
 
 
 class Reranker:
-    def __init__(self, model_name='cross-encoder/ms-marco-MiniLM-L-6-v2'):
-        self.model = CrossEncoder(model_name)
-    
-    def rerank(self, query, chunks, top_k=5):
+    """
+    Cross-encoder reranker.
+
+    (query, chunk) pairs from concurrent requests are scored together in one
+    `predict` call, and scores are kept in an LRU cache keyed by
+    (query hash, chunk id) when the caller passes chunk ids.
+    """
+
+    def __init__(self, model_name='cross-encoder/ms-marco-MiniLM-L-6-v2', max_length=512,
+                 max_batch_size=64, max_wait_ms=5, cache_size=10000, backend='torch', onnx_dir=None):
+        check_backend(backend)
+        self.backend = backend
+        if backend == 'onnx':
+            self.model = OnnxCrossEncoder(export_dir(onnx_dir, model_name))
+        else:
+            self.model = CrossEncoder(model_name, max_length=max_length, device='cpu' if backend == 'torch_int8' else None)
+            if backend == 'torch_int8':
+                self.model.model = quantize_int8(self.model.model)
+        self.max_length = max_length
+        self.cache_size = cache_size
+        # Fast tokenizers are not thread-safe; request threads truncate with
+        # their own copy while the batcher thread runs predict()
+        self._tokenizer = copy.deepcopy(self.model.tokenizer)
+        self._tokenizer_lock = threading.Lock()
+        self.batcher = MicroBatcher(
+            self._score_batch, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms, name='rerank-batcher'
+        )
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def _truncate(self, query, chunks):
+        """
+        Cut each chunk after the last token that fits next to `query` in
+        max_length, so the batched pairs carry no text the cross-encoder
+        would drop and its own truncation never has to cut the query.
+        """
+        tokenizer = self._tokenizer
+        if not chunks or not getattr(tokenizer, 'is_fast', False):
+            # Offsets need a fast tokenizer; predict() still truncates by tokens
+            return chunks
+        with self._tokenizer_lock:
+            # [CLS] query [SEP] chunk [SEP]
+            budget = (self.max_length - tokenizer.num_special_tokens_to_add(pair=True)
+                      - len(tokenizer(query, add_special_tokens=False)['input_ids']))
+            if budget <= 0:
+                return chunks
+            encoded = tokenizer(
+                chunks, add_special_tokens=False, truncation=True, max_length=budget, return_offsets_mapping=True
+            )
+        return [
+            chunk[:offsets[-1][1]] if len(offsets) == budget else chunk
+            for chunk, offsets in zip(chunks, encoded['offset_mapping'])
+        ]
+
+    def _score_batch(self, pairs):
+        return list(self.model.predict(pairs, batch_size=len(pairs)))
+
+    def score(self, query, chunks, chunk_ids=None):
+        scores = [None] * len(chunks)
+        use_cache = chunk_ids is not None and self.cache_size > 0
+        if use_cache:
+            query_hash = hashlib.blake2b(query.encode('utf-8'), digest_size=16).digest()
+            keys = [(query_hash, int(chunk_id)) for chunk_id in chunk_ids]
+            with self._cache_lock:
+                for i, key in enumerate(keys):
+                    if key in self._cache:
+                        self._cache.move_to_end(key)
+                        scores[i] = self._cache[key]
+                self.cache_hits += sum(score is not None for score in scores)
+                self.cache_misses += sum(score is None for score in scores)
+
+        todo = [i for i, score in enumerate(scores) if score is None]
+        futures = {
+            i: self.batcher.submit([query, chunk])
+            for i, chunk in zip(todo, self._truncate(query, [chunks[i] for i in todo]))
+        }
+        for i, future in futures.items():
+            scores[i] = float(future.result())
+
+        if use_cache and futures:
+            with self._cache_lock:
+                for i in futures:
+                    self._cache[keys[i]] = scores[i]
+                    self._cache.move_to_end(keys[i])
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return np.asarray(scores, dtype=np.float32)
+
+    def rerank(self, query, chunks, top_k=5, chunk_ids=None, return_scores=False):
         if not chunks:
-            return []
-        
-        # Create pairs of (query, chunk)
-        pairs = [[query, chunk] for chunk in chunks]
+            return ([], [], []) if return_scores else ([], [])
         
-        # Predict scores
-        scores = self.model.predict(pairs)
+        scores = self.score(query, chunks, chunk_ids)
         
         # Sort by score (descending)
         sorted_indices = np.argsort(scores)[::-1]
         
         # Return top_k
         top_indices = sorted_indices[:top_k]
+        if return_scores:
+            return [chunks[i] for i in top_indices], top_indices, scores[top_indices]
         return [chunks[i] for i in top_indices], top_indices
 
+    def clear_cache(self):
+        """Drop cached scores; chunk ids change meaning when the index is rebuilt"""
+        with self._cache_lock:
+            self._cache.clear()
+
+    def stats(self):
+        with self._cache_lock:
+            lookups = self.cache_hits + self.cache_misses
+            cache = {
+                'entries': len(self._cache),
+                'max_entries': self.cache_size,
+                'hits': self.cache_hits,
+                'misses': self.cache_misses,
+                'hit_rate': self.cache_hits / lookups if lookups else 0.0
+            }
+        return {**self.batcher.stats(), 'score_cache': cache}
+
 
 class GeminiGenerator:
     def __init__(self, api_key, model_name='gemini-pro'):
         genai.configure(api_key=api_key)
         self.model = genai.GenerativeModel(model_name)
     
-    def generate(self, query, context_chunks):
+    @staticmethod
+    def _prompt(query, context_chunks):
         context = "\n\n".join(context_chunks)
-        prompt = f"""You are an expert technical assistant. Answer the question specifically using ONLY the provided context.
+        return f"""You are an expert technical assistant. Answer the question specifically using ONLY the provided context.
 If the answer is not contained in the context, say "I cannot answer this based on the provided documents."
 
 Context:
@@ -67,6 +198,9 @@ Context:
 Question: {query}
 
 Answer:"""
+    
+    def generate(self, query, context_chunks):
+        prompt = self._prompt(query, context_chunks)
         
         try:
             # For newer models like gemini-pro-1.5 or deep-research, we often need Chat sessions
@@ -78,178 +212,784 @@ Answer:"""
         except Exception as e:
             print(f"Gemini API Error: {e}")
             return f"Error generating answer from Gemini API: {e}"
+    
+    def generate_stream(self, query, context_chunks):
+        """Yield the answer in pieces as the API returns them"""
+        prompt = self._prompt(query, context_chunks)
+        try:
+            chat = self.model.start_chat(history=[])
+            for chunk in chat.send_message(prompt, stream=True):
+                if chunk.text:
+                    yield chunk.text
+        except Exception as e:
+            print(f"Gemini API Error: {e}")
+            yield f"Error generating answer from Gemini API: {e}"
 
 
 class TextChunker:
-    def __init__(self, chunk_size=512, overlap=50):
+    """
+    Token-window chunker that slices the original text.
+
+    Pages are tokenized in one batched call of the fast tokenizer, and the
+    offset mapping turns each window of `chunk_size` tokens back into a
+    character span, so chunks keep the source's casing and punctuation.
+    Every chunk's metadata records its span as `char_start` / `char_end`
+    within its page (or the whole text for plain-text documents). With
+    `snap_to_sentences`, windows end and start on sentence boundaries
+    where one is close enough.
+    """
+    # A full stop, question or exclamation mark followed by whitespace
+    SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?])\s+')
+    # Extraction artifacts such as "##tal values"
+    ARTIFACT = re.compile(r'##[a-zA-Z\s]+')
+
+    def __init__(self, chunk_size=512, overlap=50, snap_to_sentences=False, tokenizer=None):
         self.chunk_size = chunk_size
         self.overlap = overlap
-        self.tokenizer = AutoTokenizer.from_pretrained('sentence-transformers/all-MiniLM-L6-v2')
+        self.snap_to_sentences = snap_to_sentences
+        self.tokenizer = tokenizer or AutoTokenizer.from_pretrained('sentence-transformers/all-MiniLM-L6-v2')
+        if not self.tokenizer.is_fast:
+            raise ValueError("TextChunker needs a fast tokenizer for offset mappings")
     
     def chunk(self, text_or_pages):
-        if isinstance(text_or_pages, list):
-            # Pages input: [{'text': '...', 'page': 1}, ...]
-            all_chunks = []
-            all_metadatas = []
-            
-            for page_data in text_or_pages:
-                text = page_data.get('text', '')
-                page_num = page_data.get('page', 1)
-                
-                # Chunk this page
-                page_chunks = self.chunk_text(text)
-                all_chunks.extend(page_chunks)
-                all_metadatas.extend([{'page': page_num}] * len(page_chunks))
-            
-            return all_chunks, all_metadatas
-        else:
-            # Legacy string input
-            return self.chunk_text(text_or_pages), []
+        return self.chunk_batch([text_or_pages])[0]
 
-    def chunk_text(self, text):
-        # --- DATA CLEANING ---
-        # 1. Remove "##tal values" and similar extraction artifacts
-        text = re.sub(r'##[a-zA-Z\s]+', '', text)
-        
-        # 2. Fix known reversed text patterns (simple heuristic: if " noillirt" (trillion backwards) exists)
-        # It's hard to perfectly auto-detect reversed lines without spoiling normal text, 
-        # so we will FILTER out lines that look like garbage/non-english if possible, or just remove common artifacts.
-        # For now, let's remove lines with high density of non-alphanumeric chars or weird tokens.
-        
-        # 3. Clean whitespace
-        text = re.sub(r'\s+', ' ', text).strip()
-        
-        tokens = self.tokenizer.encode(text, add_special_tokens=False)
-        chunks = []
-        for i in range(0, len(tokens), self.chunk_size - self.overlap):
-            chunk_tokens = tokens[i:i + self.chunk_size]
-            chunk_text = self.tokenizer.decode(chunk_tokens, skip_special_tokens=True)
-            if chunk_text.strip():
-                chunks.append(chunk_text)
-        return chunks
+    def chunk_batch(self, documents):
+        """
+        Chunk several documents with one tokenizer call. Each document is a
+        string or a list of pages [{'text': '...', 'page': 1}, ...]; returns
+        a (chunks, metadatas) pair per document.
+        """
+        texts, owners = [], []
+        for doc_idx, text_or_pages in enumerate(documents):
+            if isinstance(text_or_pages, list):
+                for page_data in text_or_pages:
+                    texts.append(self.clean(page_data.get('text', '')))
+                    owners.append((doc_idx, {'page': page_data.get('page', 1)}))
+            else:
+                texts.append(self.clean(text_or_pages))
+                owners.append((doc_idx, {}))
+
+        results = [([], []) for _ in documents]
+        if not texts:
+            return results
+
+        encodings = self.tokenizer(texts, add_special_tokens=False, return_offsets_mapping=True)
+        for text, offsets, (doc_idx, base_meta) in zip(texts, encodings['offset_mapping'], owners):
+            chunks, metadatas = results[doc_idx]
+            for char_start, char_end in self._windows(text, offsets):
+                chunk_text = re.sub(r'\s+', ' ', text[char_start:char_end]).strip()
+                if chunk_text:
+                    chunks.append(chunk_text)
+                    metadatas.append({**base_meta, 'char_start': char_start, 'char_end': char_end})
+        return results
+
+    def clean(self, text):
+        # Artifacts are blanked out rather than deleted so character offsets
+        # still point into the stored text
+        return self.ARTIFACT.sub(lambda m: ' ' * len(m.group()), text)
+
+    def _windows(self, text, offsets):
+        """Yield (char_start, char_end) of each token window"""
+        n_tokens = len(offsets)
+        if not n_tokens:
+            return
+        token_starts = np.fromiter((start for start, _ in offsets), dtype=np.int64, count=n_tokens)
+        # Token indices at which a sentence begins
+        sentence_starts = np.empty(0, dtype=np.int64)
+        if self.snap_to_sentences:
+            boundaries = [m.end() for m in self.SENTENCE_BOUNDARY.finditer(text)]
+            sentence_starts = np.unique(np.searchsorted(token_starts, boundaries))
+
+        start = 0
+        while start < n_tokens:
+            end = min(start + self.chunk_size, n_tokens)
+            if end < n_tokens and len(sentence_starts):
+                # End before the last sentence that starts in the second half of the window
+                i = np.searchsorted(sentence_starts, end, side='right') - 1
+                if i >= 0 and sentence_starts[i] > start + self.chunk_size // 2:
+                    end = int(sentence_starts[i])
+            yield offsets[start][0], offsets[end - 1][1]
+            if end >= n_tokens:
+                break
+
+            next_start = max(end - self.overlap, start + 1)
+            if len(sentence_starts):
+                # Start the overlap on a sentence boundary if one falls inside it
+                i = np.searchsorted(sentence_starts, next_start)
+                if i < len(sentence_starts) and sentence_starts[i] < end:
+                    next_start = int(sentence_starts[i])
+            start = next_start
 
 
 class FAISSManager:
+    # Each save writes a complete new directory under versions/ and then
+    # atomically replaces manifest.json, which names the current version.
+    # Readers resolve the manifest once and only ever see finished versions.
+    MANIFEST = 'manifest.json'
+    VERSIONS_DIR = 'versions'
+    # Held from begin_version() to commit_version(): one writer at a time
+    BUILD_LOCK = '.build.lock'
+    # Pickle/JSON files used before the chunk store
+    LEGACY_FILES = ('chunks.pkl', 'metadata.json')
+
+    INDEX_TYPES = ('flat', 'ivf_flat', 'ivf_pq', 'hnsw')
+
+    @staticmethod
+    def choose_index_type(n_vectors, params=None):
+        params = params or {}
+        index_type = params.get('index_type', 'flat')
+        if index_type not in FAISSManager.INDEX_TYPES:
+            raise ValueError(f"Unknown index type: {index_type}")
+        # Exact search is fast enough for small corpora, and IVF/PQ need
+        # enough vectors to train their codebooks.
+        if n_vectors < params.get('flat_threshold', 20000):
+            return 'flat'
+        return index_type
+    
+    @staticmethod
+    def _nlist(n_vectors):
+        # ~4*sqrt(n) inverted lists, keeping at least 39 training points per list
+        return int(max(1, min(4 * np.sqrt(n_vectors), n_vectors // 39)))
+    
+    @staticmethod
+    def _hnsw_m(n_vectors, params):
+        return params.get('hnsw_m') or (16 if n_vectors < 1_000_000 else 32)
+    
+    @staticmethod
+    def _pq_m(dim, params):
+        # Number of sub-quantizers must divide the vector dimension
+        m = min(params.get('pq_m', 48), dim)
+        while dim % m:
+            m -= 1
+        return m
+    
+    @staticmethod
+    def _training_sample(embeddings, nlist, params):
+        max_size = max(nlist * 39, params.get('max_train_size', 100000))
+        size = min(len(embeddings), nlist * 256, max_size)
+        if size == len(embeddings):
+            return embeddings
+        rng = np.random.default_rng(0)
+        return embeddings[np.sort(rng.choice(len(embeddings), size, replace=False))]
+    
+    @staticmethod
+    def _ivf(index):
+        try:
+            return faiss.downcast_index(faiss.extract_index_ivf(index))
+        except RuntimeError:
+            return None
+    
+    @staticmethod
+    def _hnsw(index):
+        inner = faiss.downcast_index(index.index) if FAISSManager._is_id_map(index) else index
+        return inner if isinstance(inner, faiss.IndexHNSW) else None
+    
     @staticmethod
-    def build_index(embeddings):
+    def _is_id_map(index):
+        return isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2))
+    
+    @staticmethod
+    def index_type(index):
+        ivf = FAISSManager._ivf(index)
+        if ivf is not None:
+            return 'ivf_pq' if isinstance(ivf, faiss.IndexIVFPQ) else 'ivf_flat'
+        if FAISSManager._hnsw(index) is not None:
+            return 'hnsw'
+        return 'flat'
+    
+    @staticmethod
+    def build_index(embeddings, ids=None, params=None, n_total=None):
+        """
+        Build an index of the type selected by `params` (RAG_CONFIG['retrieval']).
+
+        Vectors are stored under stable chunk ids (their position in the chunk
+        list) so documents can be removed or appended later without rebuilding
+        the whole index. When `embeddings` are only the first part of a
+        streamed build, `n_total` (the expected final size) sizes the index.
+        """
+        params = params or {}
         embeddings = np.array(embeddings, dtype='float32')
-        index = faiss.IndexFlatL2(embeddings.shape[1])
-        index.add(embeddings)
+        n_vectors, dim = embeddings.shape
+        n_total = max(n_total or 0, n_vectors)
+        index_type = FAISSManager.choose_index_type(n_total, params)
+        
+        if index_type == 'hnsw':
+            m = FAISSManager._hnsw_m(n_total, params)
+            hnsw = faiss.IndexHNSWFlat(dim, m)
+            hnsw.hnsw.efConstruction = params.get('ef_construction', max(40, 2 * m))
+            index = faiss.IndexIDMap2(hnsw)
+        elif index_type in ('ivf_flat', 'ivf_pq'):
+            # Sized for the final corpus, but trainable on the vectors at hand
+            nlist = min(FAISSManager._nlist(n_total), max(1, n_vectors // 39))
+            quantizer = faiss.IndexFlatL2(dim)
+            if index_type == 'ivf_pq':
+                index = faiss.IndexIVFPQ(quantizer, dim, nlist, FAISSManager._pq_m(dim, params), params.get('pq_bits', 8))
+            else:
+                index = faiss.IndexIVFFlat(quantizer, dim, nlist)
+            # IVF indexes keep their own ids; the hashtable allows reconstruct/remove by id
+            index.set_direct_map_type(faiss.DirectMap.Hashtable)
+            index.train(FAISSManager._training_sample(embeddings, nlist, params))
+        else:
+            index = faiss.IndexIDMap2(faiss.IndexFlatL2(dim))
+        
+        FAISSManager.configure_search(index, params)
+        if ids is None:
+            ids = np.arange(n_vectors)
+        if n_vectors:
+            index.add_with_ids(embeddings, np.asarray(ids, dtype='int64'))
         return index
     
+    @staticmethod
+    def configure_search(index, params=None):
+        """Apply query-time knobs (nprobe for IVF, efSearch for HNSW)"""
+        params = params or {}
+        ivf = FAISSManager._ivf(index)
+        if ivf is not None:
+            ivf.nprobe = min(params.get('nprobe', 16), ivf.nlist)
+        hnsw = FAISSManager._hnsw(index)
+        if hnsw is not None:
+            hnsw.hnsw.efSearch = params.get('ef_search', 64)
+    
+    @staticmethod
+    def supports_incremental(index):
+        # Indexes built before chunk ids were introduced are plain IndexFlatL2
+        # and can only be replaced by a full rebuild.
+        return FAISSManager._is_id_map(index) or FAISSManager._ivf(index) is not None
+    
+    @staticmethod
+    def add(index, embeddings, ids):
+        embeddings = np.array(embeddings, dtype='float32')
+        if len(embeddings):
+            index.add_with_ids(embeddings, np.asarray(ids, dtype='int64'))
+    
+    @staticmethod
+    def remove(index, ids, params=None):
+        """Remove vectors by id. Returns the index, which is rebuilt for HNSW."""
+        if not len(ids):
+            return index
+        ids = np.asarray(ids, dtype='int64')
+        if FAISSManager._hnsw(index) is not None:
+            # HNSW graphs do not support deletion, so rebuild from the stored vectors
+            all_ids, vectors = FAISSManager.extract_vectors(index)
+            keep = ~np.isin(all_ids, ids)
+            return FAISSManager.build_index(vectors[keep], all_ids[keep], params)
+        if FAISSManager._ivf(index) is not None:
+            # Hashtable direct maps only accept an explicit id array
+            index.remove_ids(faiss.IDSelectorArray(ids))
+        else:
+            index.remove_ids(faiss.IDSelectorBatch(ids))
+        return index
+    
+    @staticmethod
+    def extract_vectors(index):
+        """Return (ids, vectors) for every vector stored in the index (lossy for IVF-PQ)."""
+        ivf = FAISSManager._ivf(index)
+        if ivf is not None:
+            invlists = ivf.invlists
+            ids = [
+                faiss.rev_swig_ptr(invlists.get_ids(list_no), invlists.list_size(list_no)).copy()
+                for list_no in range(ivf.nlist) if invlists.list_size(list_no)
+            ]
+            ids = np.concatenate(ids).astype('int64') if ids else np.empty(0, dtype='int64')
+            if not len(ids):
+                return ids, np.empty((0, ivf.d), dtype='float32')
+            return ids, ivf.reconstruct_batch(ids)
+        ids = faiss.vector_to_array(index.id_map).astype('int64')
+        vectors = index.index.reconstruct_n(0, index.index.ntotal)
+        return ids, vectors
+    
+    @staticmethod
+    def reconstruct(index, ids):
+        """
+        Stored vectors for the given chunk ids, or None when the index only
+        keeps lossy codes (IVF-PQ) and callers should re-embed instead.
+        """
+        if FAISSManager.index_type(index) == 'ivf_pq':
+            return None
+        ids = np.asarray(ids, dtype='int64')
+        if not len(ids):
+            return np.empty((0, index.d), dtype='float32')
+        return index.reconstruct_batch(ids)
+    
+    @staticmethod
+    def recall_at_k(index, vectors, ids=None, k=10, n_queries=100, seed=0):
+        """
+        Fraction of the exact top-k neighbours that `index` also returns,
+        using a sample of the indexed vectors as queries.
+        """
+        vectors = np.asarray(vectors, dtype='float32')
+        if not len(vectors):
+            return 1.0
+        ids = np.arange(len(vectors)) if ids is None else np.asarray(ids)
+        k = min(k, len(vectors))
+        rng = np.random.default_rng(seed)
+        queries = vectors[rng.choice(len(vectors), min(n_queries, len(vectors)), replace=False)]
+        
+        _, exact = faiss.knn(queries, vectors, k)
+        _, approx = index.search(queries, k)
+        hits = sum(len(set(a) & set(e)) for a, e in zip(approx, ids[exact]))
+        return hits / (len(queries) * k)
+    
     @staticmethod
     def search(index, query_embedding, k=5):
         query_emb = np.array([query_embedding], dtype='float32')
         distances, indices = index.search(query_emb, k)
-        return indices[0], distances[0]
+        # FAISS pads with -1 when the index holds fewer than k vectors
+        found = indices[0] >= 0
+        return indices[0][found], distances[0][found]
+    
+    @staticmethod
+    def hybrid_search(index, sparse_index, query, query_embedding, k=5, params=None):
+        """
+        Dense search fused with BM25 results by weighted reciprocal rank
+        fusion. Falls back to dense-only search without a sparse index.
+        """
+        params = params or {}
+        sparse_weight = params.get('sparse_weight', 0.0)
+        if sparse_index is None or not sparse_weight:
+            return FAISSManager.search(index, query_embedding, k)
+        
+        # Fetch a deeper candidate list from each side so fusion can reorder
+        depth = k * params.get('fusion_depth', 2)
+        dense_ids, _ = FAISSManager.search(index, query_embedding, depth)
+        sparse_ids, _ = sparse_index.search(query, depth)
+        return fuse_rankings(
+            [dense_ids, sparse_ids],
+            [params.get('dense_weight', 1.0), sparse_weight],
+            k=params.get('rrf_k', 60),
+            limit=k
+        )
+    
+    @staticmethod
+    def current_version(index_dir):
+        """Return the manifest of the current index version, or None"""
+        manifest_path = Path(index_dir) / FAISSManager.MANIFEST
+        if not manifest_path.exists():
+            return None
+        with open(manifest_path, 'r') as f:
+            return json.load(f)
+    
+    @staticmethod
+    def resolve(index_dir):
+        """Directory holding the current version's files"""
+        manifest = FAISSManager.current_version(index_dir)
+        if manifest is None:
+            # Flat layout written before versioned directories
+            return Path(index_dir)
+        return Path(index_dir) / manifest['path']
+    
+    @staticmethod
+    def exists(index_dir):
+        return (FAISSManager.resolve(index_dir) / 'index.bin').exists()
+    
+    @staticmethod
+    def disk_size_mb(index_dir):
+        """On-disk size of the current index version in MB"""
+        version_dir = FAISSManager.resolve(index_dir)
+        # Segments linked from older versions count in full
+        return sum(path.stat().st_size for path in version_dir.rglob('*') if path.is_file()) / (1024 * 1024)
+    
+    @staticmethod
+    def _version_numbers(index_dir):
+        versions_dir = Path(index_dir) / FAISSManager.VERSIONS_DIR
+        if not versions_dir.exists():
+            return []
+        return sorted(int(p.name[1:]) for p in versions_dir.iterdir() if re.fullmatch(r'v\d+', p.name))
+    
+    @staticmethod
+    def _remove_flat_layout(index_dir):
+        index_dir = Path(index_dir)
+        names = ('index.bin', 'store.json') + FAISSManager.LEGACY_FILES + SPARSE_FILES
+        for path in [index_dir / name for name in names] + list(index_dir.glob('chunks.*')) + list(index_dir.glob('meta.*')):
+            if path.is_file():
+                path.unlink()
+    
+    @staticmethod
+    def build_lock(output_dir, blocking=True):
+        """Exclusive lock on writing versions of the index in `output_dir`, across processes"""
+        return file_lock(Path(output_dir) / FAISSManager.BUILD_LOCK, blocking=blocking)
+    
+    @staticmethod
+    def begin_version(output_dir):
+        """
+        Reserve the next version number and create its staging directory.
+        Returns (version, staging_dir); files written there stay invisible to
+        readers until commit_version(). Callers hold build_lock(), so a
+        leftover staging directory belongs to a dead build.
+        """
+        output_dir = Path(output_dir)
+        versions_dir = output_dir / FAISSManager.VERSIONS_DIR
+        versions_dir.mkdir(parents=True, exist_ok=True)
+        
+        manifest = FAISSManager.current_version(output_dir)
+        version = max(FAISSManager._version_numbers(output_dir) + [manifest['version'] if manifest else 0]) + 1
+        staging_dir = versions_dir / f'.v{version:06d}.tmp'
+        if staging_dir.exists():
+            shutil.rmtree(staging_dir)
+        staging_dir.mkdir()
+        return version, staging_dir
+    
+    @staticmethod
+    def commit_version(output_dir, version, staging_dir, index, total_chunks, keep_versions=2):
+        """
+        Write index.bin into the staging directory (which already holds the
+        chunk store and sparse index), publish it and make it current. Only
+        the newest `keep_versions` versions are kept on disk.
+        """
+        output_dir = Path(output_dir)
+        versions_dir = output_dir / FAISSManager.VERSIONS_DIR
+        name = f'v{version:06d}'
+        faiss.write_index(index, str(Path(staging_dir) / 'index.bin'))
+        os.replace(staging_dir, versions_dir / name)
+        
+        # Flip the pointer: readers switch to the new version in one step
+        tmp_manifest = output_dir / f'.{FAISSManager.MANIFEST}.tmp'
+        with open(tmp_manifest, 'w') as f:
+            json.dump({
+                'version': version,
+                'path': f'{FAISSManager.VERSIONS_DIR}/{name}',
+                'created_at': time.time(),
+                'total_chunks': total_chunks
+            }, f)
+        os.replace(tmp_manifest, output_dir / FAISSManager.MANIFEST)
+        
+        FAISSManager._remove_flat_layout(output_dir)
+        # Processes still reading a pruned version keep their open mmaps
+        for old in FAISSManager._version_numbers(output_dir)[:-max(keep_versions, 1)]:
+            shutil.rmtree(versions_dir / f'v{old:06d}', ignore_errors=True)
     
     @staticmethod
-    def save(index, chunks, metadata, output_dir):
-        Path(output_dir).mkdir(parents=True, exist_ok=True)
-        faiss.write_index(index, str(Path(output_dir) / 'index.bin'))
-        with open(Path(output_dir) / 'chunks.pkl', 'wb') as f:
-            pickle.dump(chunks, f)
-        with open(Path(output_dir) / 'metadata.json', 'w') as f:
-            json.dump(metadata, f)
+    def save(index, chunks, metadata, output_dir, sparse_params=None, keep_versions=2):
+        """
+        Write a new index version and make it current. Returns the version
+        number. With `sparse_params` ({'k1', 'b'}) BM25 postings are written too.
+        """
+        def write_segment_postings(segment_dir, start, count):
+            write_postings(segment_dir, segment_texts(segment_dir))
+        
+        with FAISSManager.build_lock(output_dir):
+            version, staging_dir = FAISSManager.begin_version(output_dir)
+            writer = ChunkStoreWriter(staging_dir, on_seal=write_segment_postings if sparse_params is not None else None)
+            try:
+                writer.extend(chunks, metadata)
+                replacements = writer.finish()
+                if sparse_params is not None:
+                    replacements += write_params(staging_dir, sparse_params['k1'], sparse_params['b'])
+                for tmp_path, final_path in replacements:
+                    os.replace(tmp_path, final_path)
+                FAISSManager.commit_version(output_dir, version, staging_dir, index, len(chunks), keep_versions)
+            except Exception:
+                shutil.rmtree(staging_dir, ignore_errors=True)
+                raise
+        return version
     
     @staticmethod
-    def load(input_dir):
-        index = faiss.read_index(str(Path(input_dir) / 'index.bin'))
-        with open(Path(input_dir) / 'chunks.pkl', 'rb') as f:
+    def load(input_dir, search_params=None, mmap=False):
+        """
+        Load the index with its chunk and metadata stores.
+
+        With `mmap=True` the FAISS index is memory-mapped read-only, which is
+        what the query path wants; builders that add vectors need mmap=False.
+        """
+        input_dir = FAISSManager.resolve(input_dir)
+        io_flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY if mmap else 0
+        index = faiss.read_index(str(input_dir / 'index.bin'), io_flags)
+        FAISSManager.configure_search(index, search_params)
+        
+        if ChunkStore.exists(input_dir):
+            return index, ChunkStore(input_dir), MetadataStore(input_dir)
+        
+        # Index written before the chunk store existed
+        with open(input_dir / 'chunks.pkl', 'rb') as f:
             chunks = pickle.load(f)
-        with open(Path(input_dir) / 'metadata.json', 'r') as f:
+        with open(input_dir / 'metadata.json', 'r') as f:
             metadata = json.load(f)
         return index, chunks, metadata
 
 
+NO_GENERATOR_ANSWER = ("I found relevant information in the documents but no LLM is connected to generate a "
+                       "natural language answer. Please see the citations below.")
+
+
+class EmbeddingContext:
+    """
+    Sentence x chunk cosine similarities for one answer.
+
+    Built once per request and shared by AnswerVerifier and CitationMapper, so
+    answer sentences are embedded once and chunk vectors can come straight
+    from the index instead of being re-encoded.
+    """
+    def __init__(self, embedder, answer, chunks, chunk_embeddings=None):
+        self.sentences = nltk.sent_tokenize(answer) if answer else []
+        self.similarities = np.zeros((len(self.sentences), len(chunks)), dtype='float32')
+        if not self.sentences or not chunks:
+            return
+        
+        if chunk_embeddings is None:
+            chunk_embeddings = embedder.embed(chunks)
+        self.chunk_embeddings = np.asarray(chunk_embeddings, dtype='float32')
+        sent_embeddings = np.asarray(embedder.embed(self.sentences), dtype='float32')
+        self.similarities = self._normalize(sent_embeddings) @ self._normalize(self.chunk_embeddings).T
+    
+    @staticmethod
+    def _normalize(vectors):
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+
+class SentenceBuffer:
+    """
+    Splits streamed text into sentences as they complete. A sentence is
+    complete once the tokenizer sees the start of the next one, so
+    boundaries match nltk.sent_tokenize on the whole answer.
+    """
+    def __init__(self):
+        self.text = ''
+    
+    def feed(self, text):
+        """Add text; returns the sentences it completed"""
+        self.text += text
+        sentences = nltk.sent_tokenize(self.text)
+        if len(sentences) < 2:
+            return []
+        self.text = self.text[self.text.rfind(sentences[-1]):]
+        return sentences[:-1]
+    
+    def flush(self):
+        """The remaining sentences at the end of the stream"""
+        sentences = nltk.sent_tokenize(self.text) if self.text.strip() else []
+        self.text = ''
+        return sentences
+
+
 class AnswerVerifier:
+    REFUSAL = "I cannot find sufficient evidence in the documents."
+    
     def __init__(self, embedder, threshold=0.5):
         self.embedder = embedder
         self.threshold = threshold
     
-    def check_grounding(self, answer, chunks):
+    def check_grounding(self, answer, chunks, context=None):
         # Defensive check for empty chunks to prevent max() error
         if not chunks:
             return 0.0, []
         
-        sentences = nltk.sent_tokenize(answer)
-        if not sentences:
+        if context is None:
+            context = EmbeddingContext(self.embedder, answer, chunks)
+        if not context.sentences:
             return 0.0, []
         
-        sent_embeddings = self.embedder.embed(sentences)
-        chunk_embeddings = self.embedder.embed(chunks)
-        
-        supported_count = 0
-        details = []
+        max_similarities = context.similarities.max(axis=1)
+        supported = max_similarities > self.threshold
         
-        for i, sent_emb in enumerate(sent_embeddings):
-            similarities = util.pytorch_cos_sim(sent_emb, chunk_embeddings)[0]
-            # Verify if similarities tensor is not empty (double check)
-            if similarities.numel() == 0:
-                 max_similarity = 0.0
-                 is_supported = False
-            else:
-                 max_similarity = similarities.max().item()
-                 is_supported = max_similarity > self.threshold
-            
-            supported_count += int(is_supported)
-            
-            details.append({
-                'sentence': sentences[i],
+        details = [
+            {
+                'sentence': sentence,
                 'max_similarity': float(max_similarity),
                 'is_supported': bool(is_supported)
-            })
+            }
+            for sentence, max_similarity, is_supported in zip(context.sentences, max_similarities, supported)
+        ]
         
-        confidence = supported_count / len(sentences)
+        confidence = int(supported.sum()) / len(context.sentences)
         return confidence, details
     
-    def filter_answer(self, answer, chunks, confidence_threshold=0.7):
-        confidence, details = self.check_grounding(answer, chunks)
+    def filter_answer(self, answer, chunks, confidence_threshold=0.7, context=None):
+        confidence, details = self.check_grounding(answer, chunks, context)
         if confidence >= confidence_threshold:
             return answer, confidence, details
         else:
-            return "I cannot find sufficient evidence in the documents.", confidence, details
+            return self.REFUSAL, confidence, details
 
 
 class CitationMapper:
     def __init__(self, embedder):
         self.embedder = embedder
     
-    def map_citations(self, answer, chunks, chunk_metadata):
+    def map_citations(self, answer, chunks, chunk_metadata, context=None):
         if not chunks:
             return []
-            
-        sentences = nltk.sent_tokenize(answer)
-        sent_embeddings = self.embedder.embed(sentences)
-        chunk_embeddings = self.embedder.embed(chunks)
+        
+        if context is None:
+            context = EmbeddingContext(self.embedder, answer, chunks)
         
         citations = []
-        for sent, sent_emb in zip(sentences, sent_embeddings):
-            similarities = util.pytorch_cos_sim(sent_emb, chunk_embeddings)[0]
+        for sent, similarities in zip(context.sentences, context.similarities):
+            best_idx = int(similarities.argmax())
+            best_similarity = similarities[best_idx]
             
-            if similarities.numel() == 0:
-                continue
-                
-            best_idx = similarities.argmax().item()
-            best_similarity = similarities[best_idx].item()
-            
-            citations.append({
+            citation = {
                 'sentence': sent,
                 'source_file': chunk_metadata[best_idx].get('source_file', 'Unknown'),
                 'page': chunk_metadata[best_idx].get('page', 'N/A'),
                 'similarity': float(best_similarity)
-            })
+            }
+            # Deduplicated chunks appear in several documents; cite them all
+            if 'sources' in chunk_metadata[best_idx]:
+                citation['sources'] = [
+                    {'source_file': source.get('source_file', 'Unknown'), 'page': source.get('page', 'N/A')}
+                    for source in chunk_metadata[best_idx]['sources']
+                ]
+            citations.append(citation)
         
         return citations
 
 
+def _pieces(generator, query, chunks):
+    """Answer pieces of a blocking generator; one piece if it cannot stream"""
+    generate_stream = getattr(generator, 'generate_stream', None)
+    if generate_stream:
+        yield from generate_stream(query, chunks)
+    else:
+        yield generator.generate(query, chunks)
+
+
+async def _iterate_in_thread(iterable):
+    """Iterate a blocking iterable from async code, each step in a worker thread"""
+    iterator = iter(iterable)
+    end = object()
+    while True:
+        item = await asyncio.to_thread(next, iterator, end)
+        if item is end:
+            return
+        yield item
+
+
+class AnswerStream:
+    """
+    Verification state of one streamed answer. token() records each piece,
+    check() verifies and cites the sentences completed so far, and result()
+    gives the final dict, like answer_question's.
+    """
+    def __init__(self, rag, retrieved_chunks, chunks, metadata, chunk_embeddings, packing, t_start,
+                 has_generator=True):
+        self.rag = rag
+        self.retrieved_chunks = retrieved_chunks
+        self.chunks = chunks
+        self.metadata = metadata
+        self.packing = packing
+        self.t_start = t_start
+        self.has_generator = has_generator
+        # Chunks are embedded once; each sentence then costs one embedding
+        if has_generator and chunk_embeddings is None and chunks:
+            chunk_embeddings = rag.embedder.embed(chunks)
+        self.chunk_embeddings = chunk_embeddings
+        self.answer = []
+        self.support_details = []
+        self.citations = []
+        self.sentences = SentenceBuffer()
+        self._unchecked = []
+        self.t_first = None
+        self.t_checks = 0.0
+    
+    def token(self, piece):
+        """Record a piece of the answer; returns its 'token' event"""
+        if self.t_first is None:
+            self.t_first = time.time() - self.t_start
+        self.answer.append(piece)
+        self._unchecked.append(piece)
+        return 'token', {'text': piece}
+    
+    def check(self, final=False):
+        """
+        Verify and cite the sentences completed since the last call (with
+        `final`, also the rest of the answer); returns their 'sentence' events.
+        """
+        t_check = time.time()
+        sentences = []
+        for piece in self._unchecked:
+            sentences += self.sentences.feed(piece)
+        self._unchecked = []
+        if final:
+            sentences += self.sentences.flush()
+        
+        events = []
+        for sentence in sentences:
+            context = EmbeddingContext(self.rag.embedder, sentence, self.chunks, self.chunk_embeddings)
+            _, details = self.rag.verifier.check_grounding(sentence, self.chunks, context)
+            sentence_citations = self.rag.mapper.map_citations(sentence, self.chunks, self.metadata, context)
+            for i, detail in enumerate(details):
+                self.support_details.append(detail)
+                citation = sentence_citations[i] if i < len(sentence_citations) else None
+                if citation:
+                    self.citations.append(citation)
+                events.append(('sentence', {'index': len(self.support_details) - 1, **detail, 'citation': citation}))
+        self.t_checks += time.time() - t_check
+        return events
+    
+    def result(self):
+        """The 'done' data; the refusal replaces an answer with too few supported sentences"""
+        if not self.has_generator:
+            t_total = time.time() - self.t_start
+            return {
+                'answer': NO_GENERATOR_ANSWER,
+                'confidence': 1.0,
+                'citations': [],
+                'retrieved_chunks': self.retrieved_chunks,
+                'support_details': [],
+                'context': self.packing,
+                'latency': {
+                    'first_token_ms': float(t_total * 1000),
+                    'generation_ms': float(t_total * 1000),
+                    'verification_ms': 0.0,
+                    'citation_ms': 0.0,
+                    'total_ms': float(t_total * 1000)
+                }
+            }
+        
+        t_generate = time.time() - self.t_start - self.t_checks
+        support_details = self.support_details
+        supported = sum(detail['is_supported'] for detail in support_details)
+        confidence = supported / len(support_details) if support_details else 0.0
+        final_answer = ''.join(self.answer)
+        citations = self.citations
+        t_cite = time.time()
+        if confidence < self.rag.config['verification']['confidence_threshold']:
+            # Same outcome as filter_answer: the client replaces what it streamed
+            final_answer = AnswerVerifier.REFUSAL
+            context = EmbeddingContext(self.rag.embedder, final_answer, self.chunks, self.chunk_embeddings)
+            citations = self.rag.mapper.map_citations(final_answer, self.chunks, self.metadata, context)
+        t_cite = time.time() - t_cite
+        t_total = time.time() - self.t_start
+        
+        return {
+            'answer': final_answer,
+            'confidence': float(confidence),
+            'citations': citations,
+            'retrieved_chunks': self.retrieved_chunks,
+            'support_details': support_details,
+            'context': self.packing,
+            'latency': {
+                'first_token_ms': float((self.t_first if self.t_first is not None else t_total) * 1000),
+                'generation_ms': float(t_generate * 1000),
+                'verification_ms': float(self.t_checks * 1000),
+                'citation_ms': float(t_cite * 1000),
+                'total_ms': float(t_total * 1000)
+            }
+        }
+
+
 class RAGSystem:
-    def __init__(self, config):
+    def __init__(self, config, embedder=None):
         self.config = config
-        self.embedder = Embedder(config['embedding']['model_name'])
-        self.reranker = Reranker()
+        inference = config['inference']
+        self.embedder = embedder or Embedder(
+            config['embedding']['model_name'], inference['embedding_backend'], inference['onnx_dir']
+        )
+        retrieval = config['retrieval']
+        self.reranker = Reranker(
+            retrieval['rerank_model_name'],
+            backend=inference['rerank_backend'],
+            onnx_dir=inference['onnx_dir'],
+            max_length=retrieval['rerank_max_length'],
+            max_batch_size=retrieval['rerank_batch_size'],
+            max_wait_ms=retrieval['rerank_max_wait_ms'],
+            cache_size=retrieval['rerank_cache_size']
+        ) if retrieval['use_reranker'] else None
         self.verifier = AnswerVerifier(self.embedder, config['verification']['similarity_threshold'])
         self.mapper = CitationMapper(self.embedder)
+        self._packer = None
         self.index = None
         self.chunks = None
         self.metadata = None
@@ -280,49 +1020,109 @@ class RAGSystem:
             return True
         return False
     
-    def answer_question(self, query, retrieved_chunks, chunk_metadata, generator):
-        t_start = time.time()
-        
-        # Rerank retrieved chunks
+    @property
+    def packer(self):
+        # The tokenizer is loaded on first use
+        generation = self.config['generation']
+        if self._packer is None and generation.get('context_packing'):
+            self._packer = ContextPacker(
+                TokenCounter.load(generation['context_tokenizer']), generation['max_context_tokens']
+            )
+        return self._packer
+    
+    def _select_chunks(self, query, retrieved_chunks, chunk_metadata, chunk_embeddings, chunk_ids, generator=None):
+        """
+        Rerank retrieved chunks and pack them into the generator's context
+        budget; returns (chunks, metadata, embeddings, packing stats) to
+        answer from.
+        """
+        scores = None
         if self.reranker and retrieved_chunks:
-            reranked_chunks, top_indices = self.reranker.rerank(query, retrieved_chunks, top_k=5)
+            retrieved_chunks, top_indices, scores = self.reranker.rerank(
+                query, retrieved_chunks, top_k=self.config['retrieval']['k_rerank'], chunk_ids=chunk_ids,
+                return_scores=True
+            )
             # Filter metadata to match reranked chunks
-            reranked_metadata = [chunk_metadata[i] for i in top_indices]
-            
-            # Use reranked results for generation
-            final_chunks = reranked_chunks
-            final_metadata = reranked_metadata
-        else:
-            final_chunks = retrieved_chunks
-            final_metadata = chunk_metadata
-
-        # Generate answer
+            chunk_metadata = [chunk_metadata[i] for i in top_indices]
+            if chunk_embeddings is not None:
+                chunk_embeddings = np.asarray(chunk_embeddings)[top_indices]
+        
+        if not self.packer or not generator:
+            return retrieved_chunks, chunk_metadata, chunk_embeddings, None
+        positions, packed_chunks, packing = self.packer.pack(
+            retrieved_chunks, chunk_metadata, scores, getattr(generator, 'max_context_tokens', None)
+        )
+        # Verification and citations only consider what the generator saw
+        if chunk_embeddings is not None:
+            chunk_embeddings = np.asarray(chunk_embeddings)[positions]
+        return packed_chunks, [chunk_metadata[i] for i in positions], chunk_embeddings, packing
+    
+    def _generator(self, generator):
         # Use simple argument check: if `generator` is passed from app.py, use it.
         # Otherwise use self.generator if available.
-        active_generator = generator if generator else hasattr(self, 'generator') and self.generator
-
+        return generator if generator else hasattr(self, 'generator') and self.generator
+    
+    def answer_question(self, query, retrieved_chunks, chunk_metadata, generator, chunk_embeddings=None,
+                        chunk_ids=None):
+        """
+        Rerank, pack, generate, verify and cite. `chunk_embeddings` are the
+        index vectors of `retrieved_chunks` (see FAISSManager.reconstruct);
+        when omitted, chunks are re-embedded for verification. `chunk_ids`
+        enable the reranker score cache.
+        """
+        t_start = time.time()
+        active_generator = self._generator(generator)
+        selected = self._select_chunks(
+            query, retrieved_chunks, chunk_metadata, chunk_embeddings, chunk_ids, active_generator
+        )
+        answer = active_generator.generate(query, selected[0]) if active_generator else None
+        return self._result(answer, retrieved_chunks, *selected, t_start)
+    
+    async def aanswer_question(self, query, retrieved_chunks, chunk_metadata, generator, chunk_embeddings=None,
+                               chunk_ids=None):
+        """
+        answer_question for async callers. Generation is awaited (through
+        `agenerate` when the generator has one); reranking, packing,
+        verification and citations run in worker threads.
+        """
+        t_start = time.time()
+        active_generator = self._generator(generator)
+        selected = await asyncio.to_thread(
+            self._select_chunks, query, retrieved_chunks, chunk_metadata, chunk_embeddings, chunk_ids, active_generator
+        )
+        answer = None
         if active_generator:
-            answer = active_generator.generate(query, final_chunks)
-            t_generate = time.time() - t_start
-            
+            agenerate = getattr(active_generator, 'agenerate', None)
+            if agenerate:
+                answer = await agenerate(query, selected[0])
+            else:
+                answer = await asyncio.to_thread(active_generator.generate, query, selected[0])
+        return await asyncio.to_thread(self._result, answer, retrieved_chunks, *selected, t_start)
+    
+    def _result(self, answer, retrieved_chunks, final_chunks, final_metadata, chunk_embeddings, packing, t_start):
+        """Verify and cite a generated answer (None without a generator); returns the result dict"""
+        t_generate = time.time() - t_start
+        if answer is not None:
             # Verify
+            context = EmbeddingContext(self.embedder, answer, final_chunks, chunk_embeddings)
             final_answer, confidence, support_details = self.verifier.filter_answer(
-                answer, final_chunks, self.config['verification']['confidence_threshold']
+                answer, final_chunks, self.config['verification']['confidence_threshold'], context
             )
             t_verify = time.time() - t_start - t_generate
             
             # Citations
-            citations = self.mapper.map_citations(final_answer, final_chunks, final_metadata)
+            if final_answer != answer:
+                # The answer was replaced by the refusal message; cite that instead
+                context = EmbeddingContext(self.embedder, final_answer, final_chunks, chunk_embeddings)
+            citations = self.mapper.map_citations(final_answer, final_chunks, final_metadata, context)
             t_cite = time.time() - t_start - t_generate - t_verify
             
         else:
-            answer = "I found relevant information in the documents but no LLM is connected to generate a natural language answer. Please see the citations below."
-            final_answer = answer
+            final_answer = NO_GENERATOR_ANSWER
             confidence = 1.0
             support_details = []
             citations = []
             
-            t_generate = time.time() - t_start
             t_verify = 0
             t_cite = 0
         
@@ -334,10 +1134,73 @@ class RAGSystem:
             'citations': citations,
             'retrieved_chunks': retrieved_chunks,
             'support_details': support_details,
+            'context': packing,
             'latency': {
                 'generation_ms': float(t_generate * 1000),
                 'verification_ms': float(t_verify * 1000),
                 'citation_ms': float(t_cite * 1000),
                 'total_ms': float(t_total * 1000)
             }
-        }
\ No newline at end of file
+        }
+    
+    def answer_question_stream(self, query, retrieved_chunks, chunk_metadata, generator, chunk_embeddings=None,
+                               chunk_ids=None):
+        """
+        Streaming answer_question. Yields (event, data) pairs: 'token' for
+        each piece of generated text, 'sentence' with the grounding and
+        citation of each sentence as soon as it completes, and finally 'done'
+        with the same result dict as answer_question.
+        """
+        t_start = time.time()
+        
+        active_generator = self._generator(generator)
+        selected = self._select_chunks(
+            query, retrieved_chunks, chunk_metadata, chunk_embeddings, chunk_ids, active_generator
+        )
+        stream = AnswerStream(self, retrieved_chunks, *selected, t_start, has_generator=bool(active_generator))
+        if not active_generator:
+            yield stream.token(NO_GENERATOR_ANSWER)
+            yield 'done', stream.result()
+            return
+        
+        for piece in _pieces(active_generator, query, selected[0]):
+            if piece:
+                yield stream.token(piece)
+                yield from stream.check()
+        yield from stream.check(final=True)
+        yield 'done', stream.result()
+    
+    async def aanswer_question_stream(self, query, retrieved_chunks, chunk_metadata, generator, chunk_embeddings=None,
+                                      chunk_ids=None):
+        """
+        answer_question_stream as an async generator. Pieces come from the
+        generator's `astream` when it has one, otherwise from its blocking
+        stream in a worker thread; sentence checks run in worker threads.
+        """
+        t_start = time.time()
+        
+        active_generator = self._generator(generator)
+        selected = await asyncio.to_thread(
+            self._select_chunks, query, retrieved_chunks, chunk_metadata, chunk_embeddings, chunk_ids, active_generator
+        )
+        stream = await asyncio.to_thread(
+            AnswerStream, self, retrieved_chunks, *selected, t_start, has_generator=bool(active_generator)
+        )
+        if not active_generator:
+            yield stream.token(NO_GENERATOR_ANSWER)
+            yield 'done', stream.result()
+            return
+        
+        astream = getattr(active_generator, 'astream', None)
+        if astream:
+            pieces = astream(query, selected[0])
+        else:
+            pieces = _iterate_in_thread(_pieces(active_generator, query, selected[0]))
+        async for piece in pieces:
+            if piece:
+                yield stream.token(piece)
+                for event in await asyncio.to_thread(stream.check):
+                    yield event
+        for event in await asyncio.to_thread(stream.check, True):
+            yield event
+        yield 'done', await asyncio.to_thread(stream.result)
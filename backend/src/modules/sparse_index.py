@@ -0,0 +1,257 @@
+import json
+import os
+import re
+from array import array
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+
+from src.modules.chunk_store import read_segments
+
+# Lowercased words; part numbers and versions such as "XJ-220" or "v2.1"
+# stay single tokens so exact identifiers can match.
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[-_./][a-z0-9]+)*")
+
+SPARSE_FILES = ('sparse.vocab.json', 'sparse.offsets.npy', 'sparse.docs.npy', 'sparse.tfs.npy', 'sparse.doclen.npy')
+# BM25 parameters of an index kept per chunk store segment
+PARAMS_FILE = 'sparse.json'
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def _invert(texts):
+    """(terms, offsets, docs, tfs, doc_lengths) of the chunks in `texts`; None or '' has no postings"""
+    vocab = {}
+    # Typed arrays keep postings compact while they are collected
+    term_ids, doc_ids, tfs = array('q'), array('i'), array('q')
+    doc_lengths = array('i')
+
+    for doc_id, text in enumerate(texts):
+        tokens = tokenize(text) if text else []
+        doc_lengths.append(len(tokens))
+        for term, tf in Counter(tokens).items():
+            term_ids.append(vocab.setdefault(term, len(vocab)))
+            doc_ids.append(doc_id)
+            tfs.append(tf)
+
+    term_ids = np.frombuffer(term_ids, dtype=np.int64) if term_ids else np.empty(0, dtype=np.int64)
+    # Stable sort keeps each posting list ordered by chunk id
+    order = np.argsort(term_ids, kind='stable')
+    offsets = np.zeros(len(vocab) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(term_ids, minlength=len(vocab)), out=offsets[1:])
+    return (
+        list(vocab),
+        offsets,
+        np.frombuffer(doc_ids, dtype=np.int32)[order] if doc_ids else np.empty(0, dtype=np.int32),
+        np.minimum(np.frombuffer(tfs, dtype=np.int64) if tfs else np.empty(0, dtype=np.int64),
+                   np.iinfo(np.uint16).max).astype(np.uint16)[order],
+        np.frombuffer(doc_lengths, dtype=np.int32).copy() if doc_lengths else np.empty(0, dtype=np.int32)
+    )
+
+
+def _save(directory, header, offsets, docs, tfs, doc_lengths):
+    """Write postings to `.tmp` files; returns (tmp_path, final_path) pairs"""
+    directory = Path(directory)
+    replacements = []
+
+    def tmp(name):
+        replacements.append((directory / f'.{name}.tmp', directory / name))
+        return directory / f'.{name}.tmp'
+
+    with open(tmp('sparse.vocab.json'), 'w') as f:
+        json.dump(header, f)
+    for name, values in (
+        ('sparse.offsets.npy', offsets),
+        ('sparse.docs.npy', docs),
+        ('sparse.tfs.npy', tfs),
+        ('sparse.doclen.npy', doc_lengths),
+    ):
+        with open(tmp(name), 'wb') as f:
+            np.save(f, values)
+    return replacements
+
+
+def write_postings(directory, texts):
+    """Write the postings of one chunk store segment; `texts` are its chunks in id order"""
+    terms, offsets, docs, tfs, doc_lengths = _invert(texts)
+    for tmp_path, final_path in _save(directory, {'terms': terms}, offsets, docs, tfs, doc_lengths):
+        os.replace(tmp_path, final_path)
+
+
+def write_params(directory, k1, b):
+    """Mark the chunk store in `directory` as carrying a sparse index; returns (tmp_path, final_path)"""
+    tmp_path = Path(directory) / f'.{PARAMS_FILE}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump({'k1': k1, 'b': b}, f)
+    return [(tmp_path, Path(directory) / PARAMS_FILE)]
+
+
+class _Postings:
+    """Inverted lists and chunk lengths of one segment; doc ids are relative to `start`"""
+
+    def __init__(self, terms, offsets, docs, tfs, lengths, start=0):
+        self.terms = terms
+        self.vocab = {term: i for i, term in enumerate(terms)}
+        self.offsets = offsets
+        self.docs = docs
+        self.tfs = tfs
+        self.lengths = lengths
+        self.start = start
+
+    @classmethod
+    def load(cls, directory, start=0):
+        """(postings, header) saved in `directory`, memory-mapped"""
+        directory = Path(directory)
+        with open(directory / 'sparse.vocab.json', 'r') as f:
+            header = json.load(f)
+        postings = cls(
+            header['terms'],
+            np.load(directory / 'sparse.offsets.npy', mmap_mode='r'),
+            np.load(directory / 'sparse.docs.npy', mmap_mode='r'),
+            np.load(directory / 'sparse.tfs.npy', mmap_mode='r'),
+            np.load(directory / 'sparse.doclen.npy', mmap_mode='r'),
+            start
+        )
+        return postings, header
+
+    def get(self, term):
+        """(chunk ids, term frequencies, chunk lengths) of `term`, or None"""
+        term_id = self.vocab.get(term)
+        if term_id is None:
+            return None
+        start, end = self.offsets[term_id], self.offsets[term_id + 1]
+        docs = self.docs[start:end]
+        return docs.astype(np.int64) + self.start, self.tfs[start:end], self.lengths[docs]
+
+
+class BM25Index:
+    """
+    Lexical inverted index with BM25 scoring.
+
+    Postings are kept per chunk store segment: for term t they are
+    docs[offsets[t]:offsets[t + 1]] (chunk ids relative to the segment's
+    first id) with matching term frequencies in tfs. Everything stays
+    memory-mapped; a query only reads the postings of its terms and scores
+    the chunks they name. Tombstoned chunks (length 0, or 0 in the chunk
+    store's `live` mask) are skipped, so document frequencies only count
+    live chunks.
+    """
+
+    def __init__(self, segments, live=None, k1=1.2, b=0.75):
+        self.segments = segments
+        self.live = live
+        self.k1 = k1
+        self.b = b
+        # Collection statistics: one pass over the lengths, a segment at a time
+        self.n_docs, total_length = 0, 0
+        for segment in segments:
+            lengths = np.asarray(segment.lengths, dtype=np.int64)
+            if live is not None:
+                lengths = lengths * live[segment.start:segment.start + len(lengths)]
+            self.n_docs += int(np.count_nonzero(lengths))
+            total_length += int(lengths.sum())
+        self.avg_length = total_length / max(self.n_docs, 1)
+
+    @classmethod
+    def build(cls, chunks, k1=1.2, b=0.75):
+        """
+        Index `chunks` in memory as one segment. Index builds instead write
+        postings with each chunk store segment, so they never hold more than
+        one segment's postings.
+        """
+        terms, offsets, docs, tfs, doc_lengths = _invert(chunks)
+        return cls([_Postings(terms, offsets, docs, tfs, doc_lengths)], k1=k1, b=b)
+
+    def __len__(self):
+        return sum(len(segment.lengths) for segment in self.segments)
+
+    def _postings(self, term):
+        """(chunk ids, term frequencies, lengths) of the live chunks containing `term`"""
+        hits = [hit for hit in (segment.get(term) for segment in self.segments) if hit is not None]
+        if not hits:
+            return None
+        docs, tfs, lengths = (np.concatenate(parts) for parts in zip(*hits))
+        alive = lengths > 0
+        if self.live is not None:
+            alive &= self.live[docs] > 0
+        return docs[alive], tfs[alive].astype(np.float32), lengths[alive]
+
+    def search(self, query, k=10):
+        """Return (chunk_ids, scores) of the top-k chunks for `query`"""
+        terms = set(tokenize(query))
+        if not terms or not self.n_docs:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        # One (chunk id, partial score) pair per posting of a query term
+        ids, partials = [], []
+        for term in terms:
+            postings = self._postings(term)
+            if postings is None or not len(postings[0]):
+                continue
+            docs, tfs, lengths = postings
+            df = len(docs)
+            idf = np.log(1 + (self.n_docs - df + 0.5) / (df + 0.5))
+            length_norm = self.k1 * (1 - self.b + self.b * lengths / max(self.avg_length, 1e-9))
+            ids.append(docs)
+            partials.append(idf * tfs * (self.k1 + 1) / (tfs + length_norm))
+        if not ids:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        candidates, positions = np.unique(np.concatenate(ids), return_inverse=True)
+        scores = np.bincount(positions, weights=np.concatenate(partials)).astype(np.float32)
+        top = np.arange(len(candidates))
+        if len(top) > k:
+            top = np.argpartition(scores, -k)[-k:]
+        top = top[np.argsort(scores[top])[::-1]]
+        return candidates[top].astype(np.int64), scores[top]
+
+    def write(self, directory):
+        """
+        Write a single-segment index on its own to `.tmp` files and return
+        (tmp_path, final_path) pairs to os.replace
+        """
+        if len(self.segments) != 1:
+            raise ValueError("Only an index built in one piece can be written on its own")
+        segment = self.segments[0]
+        header = {'k1': self.k1, 'b': self.b, 'terms': segment.terms}
+        return _save(directory, header, segment.offsets, segment.docs, segment.tfs, segment.lengths)
+
+    @classmethod
+    def load(cls, directory):
+        """Load the index saved with the chunk store (or on its own), or None if there is none"""
+        directory = Path(directory)
+        if (directory / PARAMS_FILE).exists():
+            with open(directory / PARAMS_FILE, 'r') as f:
+                params = json.load(f)
+            segments = [_Postings.load(segment_dir, start)[0] for segment_dir, start, _ in read_segments(directory)]
+            live = np.load(directory / 'chunks.live.npy', mmap_mode='r')
+            return cls(segments, live, k1=params['k1'], b=params['b'])
+
+        if not (directory / 'sparse.vocab.json').exists():
+            return None
+        # Written next to index.bin before chunk store segments
+        postings, header = _Postings.load(directory)
+        return cls([postings], k1=header['k1'], b=header['b'])
+
+
+def fuse_rankings(rankings, weights, k=60, limit=None):
+    """
+    Weighted reciprocal rank fusion: score(d) = sum_i w_i / (k + rank_i(d)).
+
+    `rankings` are lists of chunk ids, best first. Returns (ids, scores).
+    """
+    fused = {}
+    for ranking, weight in zip(rankings, weights):
+        if not weight:
+            continue
+        for rank, doc_id in enumerate(ranking):
+            doc_id = int(doc_id)
+            fused[doc_id] = fused.get(doc_id, 0.0) + weight / (k + rank + 1)
+    ordered = sorted(fused.items(), key=lambda item: item[1], reverse=True)[:limit]
+    return (
+        np.asarray([doc_id for doc_id, _ in ordered], dtype=np.int64),
+        np.asarray([score for _, score in ordered], dtype=np.float32)
+    )
@@ -10,6 +10,8 @@ class QueryResponse(BaseModel):
     latency_ms: float
     retrieved_chunks: List[str]
     support_details: List[Dict]
+    # Prompt packing: tokens used of the budget, chunks packed/trimmed/dropped
+    context: Optional[Dict] = None
 
 class DocumentResponse(BaseModel):
     id: str
@@ -17,6 +19,7 @@ class DocumentResponse(BaseModel):
     original_filename: str
     file_type: str
     file_size: int
+    status: Optional[str] = None
     processed: bool
     indexed: bool
     chunk_count: int
@@ -28,6 +31,24 @@ class DocumentResponse(BaseModel):
 class DocumentListResponse(BaseModel):
     total: int
     documents: List[DocumentResponse]
+    next_cursor: Optional[str] = None
+
+class IndexBuildJobResponse(BaseModel):
+    id: str
+    status: str
+    incremental: bool
+    triggers: int
+    cancel_requested: bool
+    stage: Optional[str] = None
+    progress: Optional[Dict] = None
+    stats: Optional[Dict] = None
+    error: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    
+    class Config:
+        from_attributes = True
 
 class IndexStatusResponse(BaseModel):
     index_exists: bool
@@ -35,6 +56,7 @@ class IndexStatusResponse(BaseModel):
     total_chunks: int
     index_size_mb: float
     last_updated: Optional[datetime]
+    active_job: Optional[IndexBuildJobResponse] = None
 
 class HealthResponse(BaseModel):
     status: str
@@ -0,0 +1,53 @@
+import sys
+import os
+from unittest.mock import patch
+
+# Add backend to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.modules.answer_cache import SemanticAnswerCache
+
+def test_similar_question_hits_and_distant_one_misses():
+    cache = SemanticAnswerCache(threshold=0.9)
+    cache.store([1.0, 0.0, 0.0], 1, {'answer': 'cached'})
+
+    # cos = 0.995
+    assert cache.lookup([1.0, 0.1, 0.0], 1) == {'answer': 'cached'}
+    # cos = 0.707
+    assert cache.lookup([1.0, 1.0, 0.0], 1) is None
+    assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 1
+
+def test_hits_are_copies():
+    cache = SemanticAnswerCache()
+    cache.store([1.0, 0.0], 1, {'answer': 'cached'})
+    cache.lookup([1.0, 0.0], 1)['answer'] = 'changed by a caller'
+    assert cache.lookup([1.0, 0.0], 1) == {'answer': 'cached'}
+
+def test_entries_expire_after_ttl():
+    cache = SemanticAnswerCache(ttl_seconds=60)
+    with patch('src.modules.answer_cache.time.time', return_value=1000.0):
+        cache.store([1.0, 0.0], 1, {'answer': 'old'})
+    with patch('src.modules.answer_cache.time.time', return_value=1059.0):
+        assert cache.lookup([1.0, 0.0], 1) == {'answer': 'old'}
+    with patch('src.modules.answer_cache.time.time', return_value=1061.0):
+        assert cache.lookup([1.0, 0.0], 1) is None
+    assert cache.stats()['entries'] == 0 and cache.stats()['evictions'] == 1
+
+def test_least_recently_used_entry_is_evicted():
+    cache = SemanticAnswerCache(max_entries=2)
+    cache.store([1.0, 0.0, 0.0], 1, {'answer': 'a'})
+    cache.store([0.0, 1.0, 0.0], 1, {'answer': 'b'})
+    # Using 'a' makes 'b' the least recently used
+    assert cache.lookup([1.0, 0.0, 0.0], 1) == {'answer': 'a'}
+    cache.store([0.0, 0.0, 1.0], 1, {'answer': 'c'})
+
+    assert cache.lookup([0.0, 1.0, 0.0], 1) is None
+    assert cache.lookup([1.0, 0.0, 0.0], 1) == {'answer': 'a'}
+    assert cache.lookup([0.0, 0.0, 1.0], 1) == {'answer': 'c'}
+    assert cache.stats()['evictions'] == 1
+
+def test_new_index_version_drops_everything():
+    cache = SemanticAnswerCache()
+    cache.store([1.0, 0.0], 1, {'answer': 'from v1'})
+    assert cache.lookup([1.0, 0.0], 2) is None
+    assert cache.stats()['entries'] == 0 and cache.stats()['index_version'] == 2
@@ -0,0 +1,110 @@
+import sys
+import os
+import asyncio
+import copy
+import re
+import numpy as np
+import pytest
+from unittest.mock import patch
+
+# Add backend to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import config
+from src.modules.rag_system import RAGSystem, SentenceBuffer, AnswerVerifier
+from src.modules.context_packer import ContextPacker, TokenCounter
+
+WORDS = ['cat', 'dog', 'moon']
+CHUNKS = ['cats purr and cats sleep', 'dogs bark at dogs']
+METADATA = [{'source_file': 'cats.txt', 'page': 1}, {'source_file': 'dogs.txt', 'page': 2}]
+
+def split_sentences(text):
+    return [s for s in re.split(r'(?<=[.!?])\s+', text.strip()) if s]
+
+@pytest.fixture(autouse=True)
+def punkt():
+    # punkt data may not be installed; a regex splitter stands in for it
+    with patch('src.modules.rag_system.nltk.sent_tokenize', side_effect=split_sentences):
+        yield
+
+class WordEmbedder:
+    def embed(self, texts, batch_size=32):
+        texts = [texts] if isinstance(texts, str) else texts
+        return np.array([[t.count(w) for w in WORDS] + [0.01] for t in texts], dtype='float32')
+
+class StreamingGenerator:
+    def __init__(self, pieces):
+        self.pieces = pieces
+
+    def generate_stream(self, query, chunks):
+        yield from self.pieces
+
+def make_rag():
+    rag_config = copy.deepcopy(config.RAG_CONFIG)
+    rag_config['retrieval']['use_reranker'] = False
+    rag_config['verification'].update(similarity_threshold=0.5, confidence_threshold=0.5)
+    rag = RAGSystem(rag_config, embedder=WordEmbedder())
+    rag._packer = ContextPacker(TokenCounter())
+    return rag
+
+def test_sentence_buffer_emits_completed_sentences():
+    buffer = SentenceBuffer()
+    assert buffer.feed('The cat ') == []
+    assert buffer.feed('sleeps. The dog') == ['The cat sleeps.']
+    assert buffer.feed(' barks.') == []
+    assert buffer.flush() == ['The dog barks.']
+
+def test_stream_checks_each_sentence_as_it_completes():
+    pieces = ['The cat ', 'purrs. ', 'The dog ', 'barks. The moon', ' is cheese.']
+    events = list(make_rag().answer_question_stream('q', CHUNKS, METADATA, StreamingGenerator(pieces)))
+
+    kinds = [event for event, _ in events]
+    # The first sentence is verified before the rest of the answer streams
+    assert kinds == ['token', 'token', 'token', 'sentence', 'token', 'sentence', 'token', 'sentence', 'done']
+    sentences = [data for event, data in events if event == 'sentence']
+    assert [s['is_supported'] for s in sentences] == [True, True, False]
+    assert [s['citation']['source_file'] for s in sentences[:2]] == ['cats.txt', 'dogs.txt']
+
+    result = events[-1][1]
+    assert result['answer'] == ''.join(pieces)
+    assert result['confidence'] == pytest.approx(2 / 3)
+    assert len(result['support_details']) == 3 and len(result['citations']) == 3
+
+def test_unsupported_stream_ends_with_refusal():
+    events = list(make_rag().answer_question_stream(
+        'q', CHUNKS, METADATA, StreamingGenerator(['The moon ', 'is cheese.'])
+    ))
+    result = events[-1][1]
+    assert result['answer'] == AnswerVerifier.REFUSAL and result['confidence'] == 0.0
+
+class AsyncGenerator:
+    """Answers only through the async interface"""
+    def __init__(self, pieces):
+        self.pieces = pieces
+
+    async def agenerate(self, query, chunks):
+        return ''.join(self.pieces)
+
+    async def astream(self, query, chunks):
+        for piece in self.pieces:
+            yield piece
+
+async def collect(events):
+    return [event async for event in events]
+
+@pytest.mark.parametrize('generator', [StreamingGenerator, AsyncGenerator])
+def test_async_stream_matches_the_blocking_one(generator):
+    pieces = ['The cat ', 'purrs. ', 'The dog ', 'barks. The moon', ' is cheese.']
+    expected = list(make_rag().answer_question_stream('q', CHUNKS, METADATA, StreamingGenerator(pieces)))
+    events = asyncio.run(collect(make_rag().aanswer_question_stream('q', CHUNKS, METADATA, generator(pieces))))
+
+    assert [event for event, _ in events] == [event for event, _ in expected]
+    assert events[-1][1]['answer'] == expected[-1][1]['answer']
+    assert events[-1][1]['support_details'] == expected[-1][1]['support_details']
+
+def test_async_answer_awaits_agenerate():
+    result = asyncio.run(make_rag().aanswer_question(
+        'q', CHUNKS, METADATA, AsyncGenerator(['The cat purrs. ', 'The dog barks.'])
+    ))
+    assert result['answer'] == 'The cat purrs. The dog barks.'
+    assert result['confidence'] == 1.0 and len(result['citations']) == 2
@@ -0,0 +1,63 @@
+import sys
+import os
+import threading
+import numpy as np
+
+# Add backend to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.modules.batching import MicroBatcher, BatchingEmbedder
+
+class FakeEmbedder:
+    def __init__(self):
+        self.calls = []
+
+    def embed(self, texts, batch_size=32):
+        self.calls.append(len(texts))
+        return np.array([[len(t), 1.0] for t in texts], dtype=np.float32)
+
+def test_concurrent_items_share_a_batch():
+    started = threading.Event()
+    release = threading.Event()
+
+    def process(items):
+        started.set()
+        release.wait()
+        return [item * 2 for item in items]
+
+    batcher = MicroBatcher(process, max_batch_size=8, max_wait_ms=0)
+    # The first batch blocks the worker, so the rest queue up together
+    first = batcher.submit(0)
+    started.wait(timeout=5)
+    futures = [batcher.submit(i) for i in range(1, 6)]
+    release.set()
+    assert first.result(timeout=5) == 0
+    assert [f.result(timeout=5) for f in futures] == [2, 4, 6, 8, 10]
+    stats = batcher.stats()
+    assert stats['items'] == 6
+    assert stats['batch_size_histogram'].get(5) == 1
+    batcher.close()
+
+def test_batch_errors_reach_every_caller():
+    def process(items):
+        raise ValueError("boom")
+
+    batcher = MicroBatcher(process, max_batch_size=4, max_wait_ms=1)
+    future = batcher.submit("x")
+    try:
+        future.result(timeout=5)
+        assert False, "expected ValueError"
+    except ValueError:
+        pass
+    batcher.close()
+
+def test_batching_embedder_matches_direct_embedding():
+    fake = FakeEmbedder()
+    embedder = BatchingEmbedder(fake, max_batch_size=4, max_wait_ms=1)
+    vectors = embedder.embed(["a", "bbb"])
+    assert vectors.shape == (2, 2)
+    assert list(vectors[:, 0]) == [1.0, 3.0]
+    # Jobs larger than one batch bypass the queue
+    embedder.embed(["x"] * 10)
+    assert fake.calls[-1] == 10
+    embedder.batcher.close()
@@ -0,0 +1,109 @@
+import sys
+import os
+import pytest
+import subprocess
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+# Add backend to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.database.models import Base, IndexBuildJob
+from src.database.crud import IndexBuildJobCRUD
+from src.modules.build_jobs import BuildWorker
+from src.modules.index_builder import BuildCancelled
+
+@pytest.fixture
+def session_factory(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'jobs.db'}")
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(bind=engine)
+
+class FakeBuilder:
+    """Reports progress like IndexBuilder.build"""
+    def __init__(self):
+        self.builds = []
+
+    def build(self, db, incremental=True, progress=None):
+        self.builds.append(incremental)
+        progress.set(documents_total=2)
+        progress.set_stage('streaming')
+        progress.set(documents_chunked=2, chunks_queued=10)
+        progress.add(chunks_embedded=10, vectors_added=10)
+        if progress.cancelled():
+            raise BuildCancelled()
+        return {'total_chunks': 10, 'incremental': incremental, 'chunks_added': 10, 'chunks_removed': 0}
+
+def make_worker(session_factory, builder):
+    worker = BuildWorker({}, '/unused', session_factory, flush_seconds=0)
+    worker.builder = builder
+    return worker
+
+def test_triggers_coalesce_and_builds_run_one_at_a_time(session_factory):
+    db = session_factory()
+    first, coalesced = IndexBuildJobCRUD.enqueue(db, incremental=True)
+    assert not coalesced
+    second, coalesced = IndexBuildJobCRUD.enqueue(db, incremental=False)
+    assert coalesced and second.id == first.id
+    assert second.triggers == 2 and not second.incremental
+
+    assert IndexBuildJobCRUD.claim_next(db, 1).id == first.id
+    # Triggers during a running build queue exactly one follow-up job
+    follow_up, _ = IndexBuildJobCRUD.enqueue(db)
+    assert IndexBuildJobCRUD.enqueue(db)[0].id == follow_up.id
+    assert IndexBuildJobCRUD.claim_next(db, 2) is None
+    assert IndexBuildJobCRUD.get_active(db).id == first.id
+
+def test_worker_records_progress_and_stats(session_factory):
+    db = session_factory()
+    job, _ = IndexBuildJobCRUD.enqueue(db, incremental=False)
+    builder = FakeBuilder()
+    assert make_worker(session_factory, builder).run_once()
+    assert not make_worker(session_factory, builder).run_once()
+
+    db.expire_all()
+    job = IndexBuildJobCRUD.get(db, job.id)
+    assert builder.builds == [False]
+    assert job.status == 'succeeded' and job.stage == 'done'
+    assert job.stats['total_chunks'] == 10
+    assert job.progress['vectors_added'] == 10 and job.progress['eta_seconds'] == 0
+
+def test_cancel_queued_and_running_jobs(session_factory):
+    db = session_factory()
+    queued, _ = IndexBuildJobCRUD.enqueue(db)
+    assert IndexBuildJobCRUD.request_cancel(db, queued.id).status == 'cancelled'
+
+    running, _ = IndexBuildJobCRUD.enqueue(db)
+    assert running.id != queued.id
+    IndexBuildJobCRUD.request_cancel(db, running.id)  # still queued: cancelled outright
+    running, _ = IndexBuildJobCRUD.enqueue(db)
+
+    class CancellingBuilder(FakeBuilder):
+        def build(self, db, incremental=True, progress=None):
+            IndexBuildJobCRUD.request_cancel(db, running.id)
+            return super().build(db, incremental, progress)
+
+    make_worker(session_factory, CancellingBuilder()).run_once()
+    db.expire_all()
+    assert IndexBuildJobCRUD.get(db, running.id).status == 'cancelled'
+
+def test_only_jobs_of_dead_workers_are_failed(session_factory):
+    exited = subprocess.Popen([sys.executable, '-c', 'pass'])
+    exited.wait()
+    db = session_factory()
+    for job_id, pid in (('alive', os.getppid()), ('dead', exited.pid), ('own', os.getpid()), ('unknown', None)):
+        db.add(IndexBuildJob(id=job_id, status='running', worker_pid=pid))
+    db.commit()
+
+    assert IndexBuildJobCRUD.fail_interrupted(db) == 3
+    db.expire_all()
+    assert IndexBuildJobCRUD.get(db, 'alive').status == 'running'
+    assert {IndexBuildJobCRUD.get(db, job_id).status for job_id in ('dead', 'own', 'unknown')} == {'failed'}
+
+def test_run_until_done_returns_the_finished_job(session_factory):
+    db = session_factory()
+    job, _ = IndexBuildJobCRUD.enqueue(db, incremental=False)
+    builder = FakeBuilder()
+    job = make_worker(session_factory, builder).run_until_done(job.id)
+    assert job.status == 'succeeded' and job.stats['total_chunks'] == 10
+    assert builder.builds == [False]
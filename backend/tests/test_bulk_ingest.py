@@ -0,0 +1,130 @@
+import sys
+import os
+import io
+import json
+import tarfile
+import zipfile
+import pytest
+from concurrent.futures import Future
+from unittest.mock import MagicMock, patch
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+# Add backend to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import config
+from src.database.models import Base, Document
+from src.modules.bulk_ingest import BulkIngestor
+
+@pytest.fixture
+def session_factory(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'docs.db'}")
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(bind=engine)
+
+def make_zip(entries):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        for name, data in entries.items():
+            archive.writestr(name, data)
+    buffer.seek(0)
+    return buffer
+
+def make_tar(entries):
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode='w:gz') as archive:
+        for name, data in entries.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+    buffer.seek(0)
+    return buffer
+
+def make_ingestor(session_factory, raw_dir, submitted, batch_size=2):
+    def submit(document_id, path, file_type):
+        submitted.append((document_id, path, file_type))
+        future = Future()
+        future.set_result(('failed', 'bad pdf') if file_type == 'pdf' else ('ready', None))
+        return future
+    raw_dir.mkdir()
+    return BulkIngestor(session_factory, raw_dir, submit, batch_size=batch_size, chunk_bytes=4)
+
+def test_ingests_files_and_archive_entries_in_batches(session_factory, tmp_path):
+    submitted = []
+    ingestor = make_ingestor(session_factory, tmp_path / 'raw', submitted)
+    uploads = [
+        ('notes.txt', io.BytesIO(b'plain notes')),
+        ('library.zip', make_zip({'a/one.txt': b'one', 'b/one.txt': b'other one', 'image.png': b'x'})),
+        ('papers.tar.gz', make_tar({'../escape.txt': b'two', 'paper.pdf': b'%PDF'})),
+        ('broken.zip', io.BytesIO(b'not a zip')),
+    ]
+    results = list(ingestor.ingest(uploads))
+
+    statuses = {result['filename']: result['status'] for result in results}
+    assert statuses == {
+        'notes.txt': 'pending', 'a/one.txt': 'pending', 'b/one.txt': 'pending', 'image.png': 'skipped',
+        '../escape.txt': 'pending', 'paper.pdf': 'pending', 'broken.zip': 'error'
+    }
+    assert len(submitted) == 5
+
+    db = session_factory()
+    documents = {doc.id: doc for doc in db.query(Document).all()}
+    assert sorted(documents) == sorted(document_id for document_id, _, _ in submitted)
+    # Same-named entries get distinct files, all inside raw_dir
+    paths = [doc.filename for doc in documents.values()]
+    assert len(set(paths)) == 5
+    assert all(os.path.dirname(path) == str(tmp_path / 'raw') for path in paths)
+    assert {doc.status for doc in documents.values()} == {'pending'}
+    other = next(doc for doc in documents.values() if doc.file_size == len(b'other one'))
+    with open(other.filename, 'rb') as f:
+        assert f.read() == b'other one'
+
+def test_wait_reports_extraction_outcome(session_factory, tmp_path):
+    ingestor = make_ingestor(session_factory, tmp_path / 'raw', [])
+    uploads = [('a.txt', io.BytesIO(b'a')), ('b.pdf', io.BytesIO(b'%PDF')), ('c.txt', io.BytesIO(b'c'))]
+    results = {result['filename']: result for result in ingestor.ingest(uploads, wait=True)}
+    assert results['a.txt']['status'] == 'ready' and results['c.txt']['status'] == 'ready'
+    assert results['b.pdf']['status'] == 'failed' and results['b.pdf']['error'] == 'bad pdf'
+
+@pytest.mark.parametrize('wait', [False, True])
+def test_bulk_upload_route_streams_a_result_per_file(session_factory, tmp_path, wait):
+    import app as app_module
+
+    def submit(task, document_id, path, file_type):
+        future = Future()
+        future.set_result(('failed', 'bad pdf') if file_type == 'pdf' else ('ready', None))
+        return future
+
+    files = [
+        ('files', ('a.txt', b'alpha')),
+        ('files', ('b.txt', b'beta')),
+        ('files', ('c.pdf', b'%PDF')),
+        ('files', ('image.png', b'x')),
+        ('files', ('bundle.zip', make_zip({'d.txt': b'delta'}).read())),
+        ('files', ('broken.zip', b'not a zip')),
+    ]
+    with patch.object(app_module.config, 'RAW_DIR', tmp_path), \
+            patch.object(app_module, 'SessionLocal', session_factory), \
+            patch.object(app_module, 'extraction_pool', MagicMock(submit=MagicMock(side_effect=submit))), \
+            patch.dict(config.RAG_CONFIG['ingestion'], bulk_insert_batch=2):
+        response = TestClient(app_module.app).post(f"/api/documents/bulk?wait={str(wait).lower()}", files=files)
+
+    assert response.status_code == 200
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    results, summary = {line['filename']: line for line in lines[:-1]}, lines[-1]['summary']
+    stored = 'ready' if wait else 'pending'
+    assert {name: result['status'] for name, result in results.items()} == {
+        'a.txt': stored, 'b.txt': stored, 'c.pdf': 'failed' if wait else 'pending', 'd.txt': stored,
+        'image.png': 'skipped', 'broken.zip': 'error'
+    }
+    assert results['d.txt']['archive'] == 'bundle.zip'
+    assert sum(summary.values()) == 6
+
+    db = session_factory()
+    documents = {doc.original_filename: doc for doc in db.query(Document).all()}
+    assert sorted(documents) == ['a.txt', 'b.txt', 'c.pdf', 'd.txt']
+    assert {documents[name].id for name in documents} == {results[name]['document_id'] for name in documents}
+    with open(documents['d.txt'].filename, 'rb') as f:
+        assert f.read() == b'delta'
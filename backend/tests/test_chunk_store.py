@@ -0,0 +1,107 @@
+import pytest
+import sys
+import os
+
+# Add backend to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.modules.chunk_store import ChunkStore, MetadataStore, ChunkStoreWriter
+
+def write_store(directory, chunks, metadata):
+    writer = ChunkStoreWriter(directory)
+    writer.extend(chunks, metadata)
+    for tmp_path, final_path in writer.finish():
+        os.replace(tmp_path, final_path)
+
+def test_roundtrip_with_tombstones(tmp_path):
+    """Chunks and metadata read back lazily, tombstones come back as None"""
+    chunks = ["First chunk", None, "Ünïcode chunk ✓"]
+    metadata = [
+        {'source_file': 'a.pdf', 'doc_id': 'doc-a', 'chunk_idx': 0, 'page': 3},
+        None,
+        {'source_file': 'b.txt', 'doc_id': 'doc-b', 'chunk_idx': 0},
+    ]
+    write_store(tmp_path, chunks, metadata)
+
+    store = ChunkStore(tmp_path)
+    meta = MetadataStore(tmp_path)
+
+    assert len(store) == 3
+    assert store[0] == "First chunk"
+    assert store[1] is None
+    assert store[2] == "Ünïcode chunk ✓"
+    assert meta[0] == metadata[0]
+    assert meta[1] is None
+    # Missing values are omitted rather than returned as sentinels
+    assert meta[2] == metadata[2]
+    assert list(store) == chunks
+
+def test_strings_are_interned(tmp_path):
+    """Repeated source files share one entry in the string table"""
+    chunks = [f"chunk {i}" for i in range(4)]
+    metadata = [{'source_file': 'same.pdf', 'doc_id': 'doc', 'chunk_idx': i} for i in range(4)]
+    write_store(tmp_path, chunks, metadata)
+
+    segment, = MetadataStore(tmp_path).segments
+    assert segment.strings['source_file'] == ['same.pdf']
+    assert list(segment.column('chunk_idx')) == [0, 1, 2, 3]
+
+def test_unknown_columns_are_typed_from_first_value(tmp_path):
+    """Extra metadata keys get int, str or JSON columns"""
+    chunks = ["a", "b"]
+    metadata = [
+        {'doc_id': 'x', 'char_start': 0, 'sources': [{'doc_id': 'x', 'page': 1}]},
+        {'doc_id': 'y', 'char_start': 10},
+    ]
+    write_store(tmp_path, chunks, metadata)
+
+    meta = MetadataStore(tmp_path)
+    assert meta.column_types['char_start'] == 'int'
+    assert meta.column_types['sources'] == 'json'
+    assert meta[0]['sources'] == [{'doc_id': 'x', 'page': 1}]
+    assert 'sources' not in meta[1]
+
+def test_type_mismatch_is_rejected(tmp_path):
+    writer = ChunkStoreWriter(tmp_path)
+    writer.append("a", {'page': 1})
+    with pytest.raises(TypeError):
+        writer.append("b", {'page': 'N/A'})
+    writer.abort()
+    assert not ChunkStore.exists(tmp_path)
+
+def test_linked_segments_are_shared_and_overridden(tmp_path):
+    """A new store links an old segment, tombstones and updates its rows without rewriting it"""
+    old_dir, new_dir = tmp_path / 'old', tmp_path / 'new'
+    write_store(old_dir, ["a", "b"], [{'doc_id': 'x', 'chunk_idx': 0}, {'doc_id': 'y', 'chunk_idx': 0}])
+
+    writer = ChunkStoreWriter(new_dir)
+    segment_dir = writer.link(MetadataStore(old_dir).segments[0].directory, [1, 1])
+    writer.remove(0)
+    writer.update(1, {'doc_id': 'z', 'chunk_idx': 0})
+    writer.append("c", {'doc_id': 'w', 'chunk_idx': 0})
+    for tmp_file, final_file in writer.finish():
+        os.replace(tmp_file, final_file)
+
+    assert os.stat(segment_dir / 'chunks.bin').st_ino == os.stat(old_dir / 'seg000000' / 'chunks.bin').st_ino
+    store, meta = ChunkStore(new_dir), MetadataStore(new_dir)
+    assert list(store) == [None, "b", "c"]
+    assert meta[1] == {'doc_id': 'z', 'chunk_idx': 0} and meta[2]['doc_id'] == 'w'
+    assert meta.distinct('doc_id') == {'z', 'w'}
+    # The old store is untouched
+    assert list(ChunkStore(old_dir)) == ["a", "b"] and MetadataStore(old_dir)[1]['doc_id'] == 'y'
+
+def test_segments_are_sealed_every_segment_rows(tmp_path):
+    sealed = []
+    writer = ChunkStoreWriter(tmp_path, on_seal=lambda segment_dir, start, count: sealed.append((start, count)),
+                              segment_rows=2)
+    writer.extend(["a", "b", "c"], [{'chunk_idx': i} for i in range(3)])
+    assert sealed == [(0, 2)]
+    # Rows of a sealed segment are updated through the overrides
+    writer.update(1, {'chunk_idx': 7})
+    assert writer.get_meta(1) == {'chunk_idx': 7}
+    for tmp_file, final_file in writer.finish():
+        os.replace(tmp_file, final_file)
+
+    assert sealed == [(0, 2), (2, 1)]
+    assert list(ChunkStore(tmp_path)) == ["a", "b", "c"]
+    assert [MetadataStore(tmp_path)[i]['chunk_idx'] for i in range(3)] == [0, 7, 2]
@@ -0,0 +1,57 @@
+import sys
+import os
+
+# Add backend to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.modules.context_packer import ContextPacker, overlap_length
+
+class WordCounter:
+    """One token per word"""
+    def __init__(self):
+        self.calls = 0
+
+    def count(self, texts):
+        texts = list(texts)
+        self.calls += bool(texts)
+        return [len(text.split()) for text in texts]
+
+def words(prefix, n):
+    return ' '.join(f'{prefix}{i}' for i in range(n))
+
+def test_packs_by_score_and_fills_gaps_with_smaller_chunks():
+    chunks = [words('a', 30), words('b', 50), words('c', 10)]
+    metadata = [{'n_tokens': 30}, {'n_tokens': 50}, {'n_tokens': 10}]
+    counter = WordCounter()
+    packer = ContextPacker(counter, max_tokens=70, separator_tokens=1, min_span_tokens=100)
+    positions, texts, stats = packer.pack(chunks, metadata, scores=[0.5, 0.9, 0.1])
+
+    # b fits, a does not and is too long to trim, c fills the remaining space
+    assert positions == [1, 2] and texts == [chunks[1], chunks[2]]
+    assert stats['tokens_used'] == 61 and stats['chunks_dropped'] == 1
+    # Precomputed counts: no tokenizer calls at query time
+    assert counter.calls == 0
+
+def test_trims_to_leading_sentences():
+    chunks = ['One two three. Four five six. Seven eight nine ten eleven.']
+    positions, texts, stats = ContextPacker(WordCounter(), max_tokens=7, min_span_tokens=2).pack(chunks)
+    assert texts == ['One two three. Four five six.']
+    assert stats['chunks_trimmed'] == 1 and stats['tokens_used'] == 6
+
+def test_removes_overlap_between_adjacent_windows():
+    text = ' '.join(f'word{i}' for i in range(40))
+    first, second = text[:text.index('word30') - 1], text[text.index('word20'):]
+    assert overlap_length(first, second) == len(first) - text.index('word20')
+
+    chunks = [second, first, first]
+    metadata = [
+        {'doc_id': 'd', 'page': 1, 'chunk_idx': 1},
+        {'doc_id': 'd', 'page': 1, 'chunk_idx': 0},
+        {'doc_id': 'other', 'page': 1, 'chunk_idx': 0},
+    ]
+    positions, texts, stats = ContextPacker(WordCounter(), max_tokens=1000).pack(chunks, metadata)
+    assert positions == [0, 1, 2]
+    # The earlier window loses the ten words already packed with the later one;
+    # the same text from another document is kept
+    assert texts[1] == words('word', 20) and texts[2] == first
+    assert stats['overlap_tokens_removed'] == 10
@@ -0,0 +1,45 @@
+import sys
+import os
+
+# Add backend to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.modules.dedup import MinHashDeduplicator
+
+BOILERPLATE = ("This policy applies to all employees and contractors of the company. "
+               "Questions about this policy should be directed to the compliance office.")
+
+def test_near_duplicates_map_to_first_copy():
+    dedup = MinHashDeduplicator(threshold=0.8)
+    assert dedup.find_or_add(0, BOILERPLATE) is None
+    # Same text with different whitespace and case
+    assert dedup.find_or_add(1, "  " + BOILERPLATE.upper()) == 0
+    assert dedup.find_or_add(2, "Refunds are processed within fourteen days of the return request.") is None
+
+def test_small_edit_still_matches_but_distinct_text_does_not():
+    dedup = MinHashDeduplicator(threshold=0.5)
+    dedup.add(0, BOILERPLATE)
+    edited = BOILERPLATE.replace("compliance office", "compliance team")
+    assert dedup.find_or_add(1, edited) == 0
+    assert dedup.find_or_add(2, "Completely different text about warranty coverage for two years.") is None
+
+def test_empty_text_is_never_a_duplicate():
+    dedup = MinHashDeduplicator()
+    assert dedup.signature("...") is None
+    assert dedup.find_or_add(0, "") is None
+
+def test_saved_state_is_searched_in_place(tmp_path):
+    dedup = MinHashDeduplicator(threshold=0.8)
+    dedup.add(5, BOILERPLATE)
+    dedup.write(tmp_path, start=5, count=1)
+    assert not dedup._signatures
+
+    later = MinHashDeduplicator(threshold=0.8)
+    assert later.open(tmp_path, start=5)
+    assert later.find_or_add(9, BOILERPLATE.upper()) == 5
+    # A tombstoned row is never matched
+    gone = MinHashDeduplicator(threshold=0.8)
+    assert gone.open(tmp_path, start=5, live=[0])
+    assert gone.find_or_add(9, BOILERPLATE) is None
+    # State saved with other parameters is not used
+    assert not MinHashDeduplicator(num_perm=64).open(tmp_path, start=5)
@@ -0,0 +1,90 @@
+import sys
+import os
+import json
+import pytest
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine, event, inspect
+from sqlalchemy.orm import sessionmaker
+
+# Add backend to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.database.models import Base, Document, DocumentPage
+from src.database.crud import DocumentCRUD, IndexMetadataCRUD
+
+@pytest.fixture
+def db(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'docs.db'}")
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+def add_document(db, name, created_at, content=None):
+    document = Document(filename=name, original_filename=name, file_type='txt', file_size=1,
+                        created_at=created_at, content=content)
+    db.add(document)
+    db.commit()
+    return document.id
+
+def test_pages_are_compressed_and_round_trip(db):
+    pages = [{'text': 'first page ' * 100, 'page': 1}, {'text': 'second page', 'page': 2}]
+    pdf_id = DocumentCRUD.create(db, 'a.pdf', 'a.pdf', 'pdf', None, 1, status='pending').id
+    DocumentCRUD.set_content(db, pdf_id, pages)
+    txt_id = DocumentCRUD.create(db, 'b.txt', 'b.txt', 'txt', 'plain text', 1).id
+    legacy_id = add_document(db, 'c.pdf', datetime.utcnow(), content=json.dumps([{'text': 'old', 'page': 1}]))
+
+    stored = db.query(DocumentPage).filter(DocumentPage.document_id == pdf_id).order_by(DocumentPage.seq).all()
+    assert len(stored) == 2 and len(stored[0].data) < len(pages[0]['text'])
+
+    contents = DocumentCRUD.get_contents(db, [pdf_id, txt_id, legacy_id])
+    assert contents[pdf_id] == pages
+    assert contents[txt_id] == 'plain text'
+    assert contents[legacy_id] == [{'text': 'old', 'page': 1}]
+
+    DocumentCRUD.delete(db, pdf_id)
+    assert DocumentCRUD.get_content(db, pdf_id) is None
+    assert db.query(DocumentPage).filter(DocumentPage.document_id == pdf_id).count() == 0
+
+def test_listing_pages_by_keyset_without_loading_content(db):
+    start = datetime(2024, 1, 1)
+    ids = [add_document(db, f"{i}.txt", start + timedelta(minutes=i), content='x' * 1000) for i in range(5)]
+    db.expunge_all()
+
+    seen, cursor = [], None
+    while True:
+        documents, cursor = DocumentCRUD.list_page(db, limit=2, cursor=cursor)
+        assert all('content' in inspect(document).unloaded for document in documents)
+        seen.extend(document.id for document in documents)
+        if cursor is None:
+            break
+    assert seen == ids[::-1]
+    assert DocumentCRUD.count(db) == 5
+
+def test_mark_indexed_updates_in_bulk_with_index_metadata(db):
+    started = datetime.utcnow()
+    ids = [add_document(db, f"{i}.txt", started) for i in range(3)]
+    db.query(Document).update({Document.updated_at: started - timedelta(seconds=1)})
+    # Re-extracted while the build was running: must stay pending
+    db.query(Document).filter(Document.id == ids[2]).update({Document.updated_at: started + timedelta(seconds=1)})
+    db.commit()
+
+    statements = []
+    event.listen(db.get_bind(), 'before_cursor_execute', lambda *args: statements.append(args[2]))
+    counts = {ids[0]: 4, ids[1]: 7, ids[2]: 1}
+    assert DocumentCRUD.mark_indexed(db, counts, unchanged_since=started, commit=False) == 2
+    assert sum(statement.startswith('UPDATE documents') for statement in statements) == 1
+
+    db.rollback()
+    assert not db.query(Document).filter(Document.indexed == True).count()
+
+    DocumentCRUD.mark_indexed(db, counts, unchanged_since=started, commit=False)
+    IndexMetadataCRUD.create(db, "main_index", document_ids=ids[:2], total_chunks=11, index_size_mb=0.1)
+    db.expire_all()
+    documents = {doc.id: doc for doc in db.query(Document).all()}
+    assert [(documents[i].indexed, documents[i].processed, documents[i].chunk_count) for i in ids] == [
+        (True, True, 4), (True, True, 7), (False, False, 0)
+    ]
+    # Not bumped: a build starting from `started` must not see them as changed
+    assert documents[ids[0]].updated_at == started - timedelta(seconds=1)
+    assert IndexMetadataCRUD.create(db, "main_index", ids[:2], 11, 0.1, last_indexed=started).last_indexed == started
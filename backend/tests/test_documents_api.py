@@ -4,6 +4,7 @@ from unittest.mock import MagicMock, patch
 from sqlalchemy.orm import Session
 import sys
 import os
+from datetime import datetime
 
 # Add backend to path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -34,11 +35,16 @@ def test_health_check():
     assert response.status_code == 200
     assert response.json()["status"] == "healthy"
 
+@pytest.fixture
+def raw_dir(tmp_path):
+    # Uploads land in a temporary RAW_DIR and no extraction is started
+    with patch('app.config.RAW_DIR', tmp_path), patch('app.extraction_pool') as pool:
+        yield tmp_path, pool
+
 @patch('src.database.crud.DocumentCRUD.create')
-@patch('builtins.open', new_callable=MagicMock)
-@patch('os.path.exists', return_value=False)
-def test_upload_document(mock_exists, mock_open, mock_create):
+def test_upload_document(mock_create, raw_dir):
     """Test document upload endpoint"""
+    directory, pool = raw_dir
     # Mock DocumentCRUD.create response
     mock_doc = MagicMock(spec=Document)
     mock_doc.id = "123"
@@ -54,29 +60,46 @@ def test_upload_document(mock_exists, mock_open, mock_create):
     assert response.status_code == 200
     assert "document_id" in response.json()
     assert response.json()["filename"] == "test.txt"
+    assert (directory / "test.txt").read_bytes() == b'test content'
+    pool.submit.assert_called_once()
+
+@patch('src.database.crud.DocumentCRUD.create')
+def test_uploads_with_the_same_name_keep_their_own_files(mock_create, raw_dir):
+    directory, pool = raw_dir
+    mock_create.return_value = MagicMock(spec=Document, id="123", content_hash="abc")
 
-@patch('src.database.crud.DocumentCRUD.get_all')
-def test_get_documents(mock_get_all):
+    for content in (b'first version', b'second version'):
+        assert client.post("/api/documents/upload", files={'file': ('same.txt', content)}).status_code == 200
+
+    paths = [call.kwargs['filename'] for call in mock_create.call_args_list]
+    assert paths[0] != paths[1]
+    # Extraction of the first upload still reads the first file
+    assert [open(path, 'rb').read() for path in paths] == [b'first version', b'second version']
+    assert [call.args[2] for call in pool.submit.call_args_list] == paths
+
+@patch('src.database.crud.DocumentCRUD.count', return_value=3)
+@patch('src.database.crud.DocumentCRUD.list_page')
+def test_get_documents(mock_list_page, mock_count):
     """Test get documents endpoint"""
     # Mock data
-    doc1 = MagicMock(spec=Document)
-    doc1.id = "1"
-    doc1.filename = "doc1.txt"
-    doc1.upload_date = "2023-01-01"
+    doc1 = Document(id="1", filename="doc1.txt", original_filename="doc1.txt", file_type="txt",
+                    file_size=10, status="ready", processed=True, indexed=True, chunk_count=2,
+                    created_at=datetime(2023, 1, 2))
+    doc2 = Document(id="2", filename="doc2.txt", original_filename="doc2.txt", file_type="txt",
+                    file_size=20, status="ready", processed=False, indexed=False, chunk_count=0,
+                    created_at=datetime(2023, 1, 1))
     
-    doc2 = MagicMock(spec=Document)
-    doc2.id = "2"
-    doc2.filename = "doc2.txt"
-    doc2.upload_date = "2023-01-02"
-    
-    mock_get_all.return_value = [doc1, doc2]
+    mock_list_page.return_value = ([doc1, doc2], "2023-01-01T00:00:00|2")
 
-    response = client.get("/api/documents")
+    response = client.get("/api/documents?limit=2")
 
     assert response.status_code == 200
     data = response.json()
-    assert data["total"] == 2
+    # total counts every document, not just this page
+    assert data["total"] == 3
     assert len(data["documents"]) == 2
+    assert data["next_cursor"] == "2023-01-01T00:00:00|2"
+    assert mock_list_page.call_args[0][1:] == (2, None)
 
 @patch('src.database.crud.DocumentCRUD.delete')
 def test_delete_document(mock_delete):
@@ -86,3 +109,40 @@ def test_delete_document(mock_delete):
     assert response.status_code == 200
     assert response.json() == {"message": "Document deleted"}
     mock_delete.assert_called_once()
+
+@patch('src.database.crud.DocumentCRUD.get')
+def test_get_document_status(mock_get):
+    """Test upload status polling endpoint"""
+    doc = MagicMock(spec=Document)
+    doc.id = "123"
+    doc.status = "pending"
+    doc.error = None
+    doc.file_size = 12
+    doc.content_hash = "abc"
+    mock_get.return_value = doc
+
+    response = client.get("/api/documents/123/status")
+
+    assert response.status_code == 200
+    assert response.json()["status"] == "pending"
+
+    mock_get.return_value = None
+    assert client.get("/api/documents/missing/status").status_code == 404
+
+def test_extraction_cache_is_keyed_on_the_file_as_extracted(tmp_path):
+    from src.modules.extraction_cache import ExtractionCache, file_sha256
+    import app as app_module
+
+    path = tmp_path / 'notes.txt'
+    path.write_text("old text")
+    cache = ExtractionCache(tmp_path / 'cache', version=1)
+    cache.put(file_sha256(path), 'txt', "old text")
+    path.write_text("new text")  # replaced after its upload was hashed
+
+    with patch.object(app_module, 'extraction_cache', cache), \
+            patch.object(app_module, 'SessionLocal'), \
+            patch.object(app_module, 'DocumentCRUD') as crud:
+        assert app_module.process_extraction("123", str(path), 'txt') == ('ready', None)
+
+    assert crud.set_content.call_args.args[2] != "old text"
+    assert cache.get(file_sha256(path), 'txt') == crud.set_content.call_args.args[2]
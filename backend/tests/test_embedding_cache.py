@@ -0,0 +1,65 @@
+import sys
+import os
+import numpy as np
+
+# Add backend to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.modules.embedding_cache import EmbeddingCache, CachedEmbedder, text_digest
+
+class CountingEmbedder:
+    def __init__(self):
+        self.calls = []
+
+    def embed(self, texts, batch_size=32):
+        self.calls.append(list(texts))
+        return np.array([[len(t), sum(map(ord, t)) % 101, 1.0] for t in texts], dtype='float32')
+
+def expected(texts):
+    return CountingEmbedder().embed(texts)
+
+def test_only_misses_reach_the_encoder(tmp_path):
+    encoder = CountingEmbedder()
+    embedder = CachedEmbedder(encoder, EmbeddingCache(tmp_path, 'model'))
+
+    assert np.array_equal(embedder.embed(['a', 'bb', 'a']), expected(['a', 'bb', 'a']))
+    # A text repeated within one batch is encoded once
+    assert encoder.calls == [['a', 'bb']]
+
+    assert np.array_equal(embedder.embed(['bb', 'ccc', 'a']), expected(['bb', 'ccc', 'a']))
+    assert encoder.calls[-1] == ['ccc']
+    stats = embedder.stats()
+    assert stats['hits'] == 2 and stats['misses'] == 4 and stats['cache_entries'] == 3
+
+def test_entries_survive_reopening(tmp_path):
+    CachedEmbedder(CountingEmbedder(), EmbeddingCache(tmp_path, 'model')).embed(['a', 'bb'])
+
+    encoder = CountingEmbedder()
+    reopened = CachedEmbedder(encoder, EmbeddingCache(tmp_path, 'model'))
+    assert np.array_equal(reopened.embed(['bb', 'a']), expected(['bb', 'a']))
+    assert encoder.calls == []
+    # Another model name is another cache
+    assert len(EmbeddingCache(tmp_path, 'other-model')) == 0
+
+def test_caches_sharing_a_directory_stay_aligned(tmp_path):
+    # Two processes with the cache open: each appends after the other's rows
+    first, second = EmbeddingCache(tmp_path, 'model'), EmbeddingCache(tmp_path, 'model')
+    first.put([text_digest('a')], expected(['a']))
+    second.put([text_digest('bb')], expected(['bb']))
+    first.put([text_digest('ccc')], expected(['ccc']))
+
+    for cache in (first, second, EmbeddingCache(tmp_path, 'model')):
+        found = cache.get([text_digest(t) for t in ('a', 'bb', 'ccc')])
+        assert np.array_equal(np.stack([found[i] for i in range(3)]), expected(['a', 'bb', 'ccc']))
+
+def test_half_written_rows_are_dropped(tmp_path):
+    cache = EmbeddingCache(tmp_path, 'model')
+    cache.put([text_digest('a')], expected(['a']))
+    # A writer died after its vector but before its key
+    with open(cache.vectors_path, 'ab') as f:
+        f.write(expected(['bb']).tobytes())
+
+    reopened = EmbeddingCache(tmp_path, 'model')
+    reopened.put([text_digest('ccc')], expected(['ccc']))
+    found = EmbeddingCache(tmp_path, 'model').get([text_digest('a'), text_digest('ccc')])
+    assert np.array_equal(np.stack([found[0], found[1]]), expected(['a', 'ccc']))
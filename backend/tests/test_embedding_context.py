@@ -0,0 +1,69 @@
+import sys
+import os
+import copy
+import re
+import numpy as np
+import pytest
+from unittest.mock import patch
+
+# Add backend to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import config
+from src.modules.rag_system import RAGSystem, FAISSManager
+from src.modules.context_packer import ContextPacker, TokenCounter
+
+WORDS = ['cat', 'dog', 'moon', 'sun']
+CHUNKS = ['cats purr and cats sleep', 'dogs bark at dogs']
+METADATA = [{'source_file': 'cats.txt'}, {'source_file': 'dogs.txt'}]
+
+@pytest.fixture(autouse=True)
+def punkt():
+    # punkt data may not be installed; a regex splitter stands in for it
+    with patch('src.modules.rag_system.nltk.sent_tokenize',
+               side_effect=lambda text: [s for s in re.split(r'(?<=[.!?])\s+', text.strip()) if s]):
+        yield
+
+class RecordingEmbedder:
+    def __init__(self):
+        self.calls = []
+
+    def embed(self, texts, batch_size=32):
+        texts = [texts] if isinstance(texts, str) else list(texts)
+        self.calls.append(texts)
+        return np.array([[t.count(w) for w in WORDS] + [0.01] * 12 for t in texts], dtype='float32')
+
+class FixedGenerator:
+    def generate(self, query, chunks):
+        return "The cat purrs. The dog barks."
+
+def answer(chunk_embeddings):
+    embedder = RecordingEmbedder()
+    rag_config = copy.deepcopy(config.RAG_CONFIG)
+    rag_config['retrieval']['use_reranker'] = False
+    rag_config['verification'].update(similarity_threshold=0.5, confidence_threshold=0.5)
+    rag = RAGSystem(rag_config, embedder=embedder)
+    rag._packer = ContextPacker(TokenCounter())
+    result = rag.answer_question('q', CHUNKS, METADATA, FixedGenerator(), chunk_embeddings)
+    return result, embedder.calls
+
+def test_index_vectors_are_reused():
+    index = FAISSManager.build_index(RecordingEmbedder().embed(CHUNKS))
+    result, calls = answer(FAISSManager.reconstruct(index, [0, 1]))
+
+    # Only the answer sentences are encoded, once for verification and citations together
+    assert calls == [["The cat purrs.", "The dog barks."]]
+    assert result['confidence'] == 1.0
+    assert [c['source_file'] for c in result['citations']] == ['cats.txt', 'dogs.txt']
+
+def test_ivf_pq_chunks_are_re_embedded():
+    vectors = np.random.RandomState(0).rand(300, 16).astype('float32')
+    index = FAISSManager.build_index(vectors, params={
+        'index_type': 'ivf_pq', 'flat_threshold': 0, 'pq_m': 4, 'pq_bits': 4
+    })
+    # PQ codes are lossy, so there are no vectors to hand over
+    assert FAISSManager.reconstruct(index, [0, 1]) is None
+
+    result, calls = answer(None)
+    assert calls == [CHUNKS, ["The cat purrs.", "The dog barks."]]
+    assert result['confidence'] == 1.0
@@ -0,0 +1,105 @@
+import sys
+import os
+import time
+import pytest
+from concurrent.futures import Future
+from unittest.mock import MagicMock
+
+# Add backend to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.modules.extraction import (
+    PDFExtractor, PageTimeout, ExtractionTimeout, _time_limit, extract_pdf, extract_text
+)
+
+def write_pdf(path, page_texts):
+    """Write a minimal PDF with one line of Helvetica text per page"""
+    n = len(page_texts)
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        ("<< /Type /Pages /Kids [%s] /Count %d >>" % (" ".join(f"{4 + 2 * i} 0 R" for i in range(n)), n)).encode(),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    for i, text in enumerate(page_texts):
+        stream = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET".encode()
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {5 + 2 * i} 0 R >>".encode()
+        )
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    path.write_bytes(bytes(out))
+
+def test_parallel_extraction_keeps_page_order(tmp_path):
+    pdf_path = tmp_path / "manual.pdf"
+    write_pdf(pdf_path, [f"Page number {i + 1}" for i in range(20)])
+
+    extractor = PDFExtractor(workers=2, min_parallel_pages=4)
+    try:
+        pages = extractor.extract(pdf_path)
+    finally:
+        extractor.shutdown()
+
+    assert [p['page'] for p in pages] == list(range(1, 21))
+    assert pages == extract_pdf(pdf_path)
+    assert extractor.stats()['pages'] == 20
+
+def test_small_pdf_is_extracted_in_process(tmp_path):
+    pdf_path = tmp_path / "short.pdf"
+    write_pdf(pdf_path, ["Hello", "World"])
+    extractor = PDFExtractor(workers=4, min_parallel_pages=16)
+    assert '"page": 2' in extract_text(pdf_path, 'pdf', extractor)
+    assert extractor._pool is None
+
+def test_time_limit_interrupts_slow_work():
+    with pytest.raises(PageTimeout):
+        with _time_limit(0.05):
+            time.sleep(1)
+
+def test_broken_pool_is_replaced(tmp_path):
+    pdf_path = tmp_path / "manual.pdf"
+    write_pdf(pdf_path, [f"Page number {i + 1}" for i in range(8)])
+    extractor = PDFExtractor(workers=2, min_parallel_pages=4)
+    try:
+        # A worker dies, as it would on a PDF that crashes the parser
+        broken = extractor.pool
+        broken.submit(os._exit, 1)
+        deadline = time.time() + 30
+        while not broken._broken and time.time() < deadline:
+            time.sleep(0.05)
+
+        assert [p['page'] for p in extractor.extract(pdf_path)] == list(range(1, 9))
+        assert extractor._pool is not broken
+    finally:
+        extractor.shutdown()
+
+def test_stuck_worker_fails_the_document_and_resets_the_pool(tmp_path):
+    pdf_path = tmp_path / "manual.pdf"
+    write_pdf(pdf_path, [f"Page number {i + 1}" for i in range(8)])
+
+    class HungPool:
+        """Accepts work and never finishes it"""
+        def __init__(self):
+            self._processes = {1: MagicMock()}
+
+        def submit(self, *args):
+            return Future()
+
+        def shutdown(self, **kwargs):
+            pass
+
+    extractor = PDFExtractor(workers=2, min_parallel_pages=4, page_timeout=0.05)
+    extractor._pool = hung = HungPool()
+    with pytest.raises(ExtractionTimeout):
+        extractor.extract(pdf_path)
+    hung._processes[1].terminate.assert_called_once()
+    assert extractor._pool is None
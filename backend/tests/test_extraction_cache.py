@@ -0,0 +1,45 @@
+import sys
+import os
+import time
+
+# Add backend to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.modules.extraction_cache import ExtractionCache, file_sha256
+
+PAGES = [{'text': 'first page', 'page': 1}, {'text': 'second page', 'page': 2}]
+
+def test_hit_miss_and_extractor_version(tmp_path):
+    raw = tmp_path / 'paper.pdf'
+    raw.write_bytes(b'%PDF same bytes')
+    sha256 = file_sha256(raw)
+
+    cache = ExtractionCache(tmp_path / 'processed', version=1)
+    assert cache.get(sha256, 'pdf') is None
+    cache.put(sha256, 'pdf', PAGES)
+    assert cache.get(sha256, 'pdf') == PAGES
+    assert cache.get(sha256, 'txt') is None
+    assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 2
+
+    # Entries survive a restart; a new extractor version never reads old ones
+    assert ExtractionCache(tmp_path / 'processed', version=1).get(sha256, 'pdf') == PAGES
+    upgraded = ExtractionCache(tmp_path / 'processed', version=2)
+    assert upgraded.get(sha256, 'pdf') is None
+    assert upgraded.stats()['entries'] == 1
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = ExtractionCache(tmp_path, version=1, max_bytes=10 ** 9)
+    for key in ('a', 'b', 'c'):
+        cache.put(key, 'txt', os.urandom(300).hex())
+    entry_bytes = cache.stats()['size_mb'] * 1024 * 1024 / 3
+
+    past = time.time() - 100
+    for key in ('a', 'b', 'c'):
+        os.utime(cache._path(key, 'txt'), (past, past))
+    assert cache.get('a', 'txt') is not None  # 'a' is now the most recent
+
+    cache.max_bytes = int(entry_bytes * 2.5)
+    cache.put('d', 'txt', os.urandom(300).hex())
+    assert cache.get('b', 'txt') is None and cache.get('c', 'txt') is None
+    assert cache.get('a', 'txt') is not None and cache.get('d', 'txt') is not None
+    assert cache.stats()['evictions'] == 2
@@ -0,0 +1,140 @@
+import sys
+import os
+import asyncio
+import threading
+
+# Add backend to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.modules.gemini_client import AsyncGeminiGenerator, CircuitBreaker
+
+class ApiError(Exception):
+    def __init__(self, code):
+        super().__init__(f"HTTP {code}")
+        self.code = code
+
+class FakeTransport:
+    """Plays back `script` (answers, exceptions or delays in seconds) one call at a time"""
+    def __init__(self, script=(), default='answer'):
+        self.script = list(script)
+        self.default = default
+        self.calls = 0
+        self.active = 0
+        self.peak = 0
+
+    async def generate(self, prompt):
+        self.calls += 1
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            step = self.script.pop(0) if self.script else self.default
+            if isinstance(step, Exception):
+                raise step
+            if isinstance(step, float):
+                await asyncio.sleep(step)
+                return 'slow answer'
+            return step
+        finally:
+            self.active -= 1
+
+    async def stream(self, prompt):
+        step = self.script.pop(0) if self.script else self.default
+        if isinstance(step, Exception):
+            raise step
+        if isinstance(step, tuple):  # (text, error raised after it)
+            step, error = step
+            yield step
+            raise error
+        for word in step.split(' '):
+            yield word + ' '
+
+def make_client(transport, **kwargs):
+    options = dict(max_concurrency=2, timeout_seconds=1.0, deadline_seconds=5.0, max_retries=3,
+                   backoff_seconds=0.001, backoff_max_seconds=0.01, breaker_failures=3, breaker_reset_seconds=60)
+    options.update(kwargs)
+    return AsyncGeminiGenerator(transport=transport, **options)
+
+def test_retries_transient_errors_but_not_bad_requests():
+    transport = FakeTransport([ApiError(429), ApiError(503), 0.5, 'answer'])
+    client = make_client(transport, timeout_seconds=0.1, breaker_failures=10)
+    assert client.generate('q', ['c']) == 'answer'
+    assert transport.calls == 4
+    assert client.stats()['retries'] == 3 and client.stats()['timeouts'] == 1
+
+    transport.script = [ApiError(400)]
+    assert client.generate('q', ['c']).startswith('Error generating answer')
+    assert transport.calls == 5
+    client.close()
+
+def test_concurrency_cap_and_deadline():
+    transport = FakeTransport(default=0.2)
+    client = make_client(transport, max_concurrency=2, max_retries=0)
+    threads = [threading.Thread(target=client.generate, args=('q', ['c'])) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert transport.peak == 2 and client.stats()['succeeded'] == 6
+
+    # Queued calls give up at the deadline instead of holding their caller
+    transport.calls = 0
+    client.deadline_seconds = 0.3
+    results = [None] * 4
+    def call(i):
+        results[i] = client.generate('q', ['c'])
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sum(r == 'slow answer' for r in results) == 2
+    assert sum(r.startswith('Error') for r in results) == 2
+    client.close()
+
+def test_circuit_breaker_opens_and_recovers():
+    now = [0.0]
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=10, clock=lambda: now[0])
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == 'open' and not breaker.allow()
+    now[0] = 10
+    assert breaker.allow() and not breaker.allow()  # one trial call at a time
+    breaker.record_failure()
+    assert breaker.state == 'open'
+    now[0] = 20
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == 'closed' and breaker.times_opened == 2
+
+    transport = FakeTransport(default=ApiError(500))
+    client = make_client(transport, max_retries=5)
+    assert client.generate('q', ['c']).startswith('Error')
+    # Three failures open the circuit; later calls fail without reaching the API
+    assert transport.calls == 3
+    assert 'CircuitOpenError' in client.generate('q', ['c'])
+    assert transport.calls == 3 and client.stats()['circuit'] == 'open'
+    client.close()
+
+def test_stream_and_async_callers():
+    client = make_client(FakeTransport([ApiError(503), 'streamed answer', 'async answer']))
+    assert ''.join(client.generate_stream('q', ['c'])) == 'streamed answer '
+    assert asyncio.run(client.agenerate('q', ['c'])) == 'async answer'
+    client.close()
+
+def test_stream_failing_midway_counts_against_the_circuit():
+    client = make_client(FakeTransport([('partial ', ApiError(503))]), breaker_failures=1)
+    pieces = list(client.generate_stream('q', ['c']))
+    # Not retried: the caller already has part of the answer
+    assert pieces[0] == 'partial ' and pieces[1].startswith('Error')
+    assert client.stats()['circuit'] == 'open' and client.stats()['failed'] == 1
+    client.close()
+
+def test_astream_yields_on_the_callers_loop():
+    client = make_client(FakeTransport(['async stream']))
+
+    async def collect():
+        return [piece async for piece in client.astream('q', ['c'])]
+
+    assert asyncio.run(collect()) == ['async ', 'stream ']
+    client.close()
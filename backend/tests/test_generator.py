@@ -0,0 +1,71 @@
+import sys
+import os
+import threading
+import torch
+from transformers import T5Config, T5ForConditionalGeneration
+
+# Add backend to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.modules.generator import Generator
+
+class WordTokenizer:
+    """Maps words to ids; 0 is padding, 1 end of sequence"""
+    pad_token_id = 0
+    eos_token_id = 1
+
+    def _encode(self, text, add_special_tokens=True):
+        ids = [2 + sum(map(ord, word)) % 60 for word in text.split()]
+        return ids + [self.eos_token_id] if add_special_tokens else ids
+
+    def __call__(self, texts, return_tensors=None, padding=False, truncation=False, max_length=None,
+                 add_special_tokens=True, verbose=True):
+        single = isinstance(texts, str)
+        encoded = [self._encode(text, add_special_tokens)[:max_length] for text in ([texts] if single else texts)]
+        if return_tensors != 'pt':
+            return {'input_ids': encoded}
+        width = max(map(len, encoded))
+        input_ids = torch.tensor([ids + [0] * (width - len(ids)) for ids in encoded])
+        return {'input_ids': input_ids, 'attention_mask': (input_ids != 0).long()}
+
+    def batch_decode(self, outputs, skip_special_tokens=True):
+        return [' '.join(str(int(i)) for i in row if i > 1) for row in outputs]
+
+def tiny_t5():
+    torch.manual_seed(0)
+    config = T5Config(vocab_size=64, d_model=16, d_ff=32, d_kv=8, num_layers=1, num_heads=2,
+                      decoder_start_token_id=0, pad_token_id=0, eos_token_id=1)
+    return T5ForConditionalGeneration(config).eval()
+
+def make_generator(**kwargs):
+    return Generator('tiny-t5', model=tiny_t5(), tokenizer=WordTokenizer(), max_new_tokens=8, **kwargs)
+
+def test_concurrent_prompts_decode_in_one_padded_batch():
+    generator = make_generator(max_batch_size=4, max_wait_ms=500)
+    questions = ['what is it', 'why', 'how does the thing work here', 'who']
+    expected = {q: generator._generate_batch([generator._prompt(q, ['some context'])])[0] for q in questions}
+
+    answers = {}
+    threads = [
+        threading.Thread(target=lambda q=q: answers.__setitem__(q, generator.generate(q, ['some context'])))
+        for q in questions
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # Padding does not change any answer
+    assert answers == expected
+    stats = generator.stats()
+    assert stats['batches'] == 1 and stats['batch_occupancy'] == 1.0
+    assert stats['tokens_generated'] > 0 and stats['tokens_per_second'] > 0
+    assert 0 < stats['padding_efficiency'] < 1
+    generator.close()
+
+def test_int8_quantized_model():
+    generator = make_generator(quantize=True)
+    assert isinstance(generator.model.lm_head, torch.ao.nn.quantized.dynamic.Linear)
+    assert isinstance(generator.generate('what is it', ['some context']), str)
+    assert generator.stats()['quantized']
+    generator.close()
@@ -0,0 +1,342 @@
+import sys
+import os
+import copy
+import json
+import threading
+import numpy as np
+import pytest
+from unittest.mock import patch
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+# Add backend to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import config
+from src.database.crud import DocumentCRUD
+from src.database.models import Base
+from src.modules.index_builder import IndexBuilder, BuildProgress
+from src.modules.rag_system import FAISSManager
+from src.modules.dedup import MinHashDeduplicator
+from src.modules.sparse_index import BM25Index
+from src.modules.context_packer import TokenCounter
+
+DUPLICATE = "the quick brown fox jumps over the lazy dog again and again"
+
+class Doc:
+    def __init__(self, doc_id, content):
+        self.id = doc_id
+        self.content = content
+        self.original_filename = f"{doc_id}.txt"
+
+class SplitChunker:
+    """One chunk per '|'-separated part"""
+    def chunk_batch(self, documents):
+        return [(document.split('|'), []) for document in documents]
+
+class HashEmbedder:
+    def __init__(self):
+        self.calls = []
+
+    def embed(self, texts, batch_size=32):
+        self.calls.append(len(texts))
+        return np.array([[sum(map(ord, t)) % 97, len(t), 1, 2] for t in texts], dtype='float32')
+
+def make_builder(index_dir, embedder):
+    rag_config = copy.deepcopy(config.RAG_CONFIG)
+    rag_config['indexing'].update(page_size=1, pipeline_batch_size=2, queue_size=1)
+    builder = IndexBuilder(rag_config, index_dir, embedder=embedder)
+    builder._chunker = SplitChunker()
+    builder._token_counter = TokenCounter()
+    return builder
+
+def serve(crud, documents):
+    """Point the patched DocumentCRUD at `documents`"""
+    crud.iter_ready.side_effect = lambda db, page_size, **kwargs: iter(
+        [documents[i:i + page_size] for i in range(0, len(documents), page_size)]
+    )
+    crud.get_contents.side_effect = lambda db, ids: {doc.id: doc.content for doc in documents if doc.id in ids}
+    crud.count_ready.return_value = len(documents)
+
+def test_streaming_build_batches_and_merges_duplicates(tmp_path):
+    embedder = HashEmbedder()
+    builder = make_builder(tmp_path, embedder)
+    documents = [Doc('a', f"x|y|z|{DUPLICATE}"), Doc('b', f"p|q|{DUPLICATE}")]
+
+    with patch('src.modules.index_builder.DocumentCRUD') as crud, \
+            patch('src.modules.index_builder.IndexMetadataCRUD'):
+        serve(crud, documents)
+        stats = builder.build(None, incremental=False)
+
+    assert stats['chunks_added'] == 6 and stats['duplicates_skipped'] == 1
+    # Embedded in pipeline batches, never the whole corpus at once
+    assert max(embedder.calls) <= 2 and sum(embedder.calls) == 6
+
+    index, chunks, metadata = FAISSManager.load(tmp_path)
+    assert index.ntotal == 6
+    assert list(chunks) == ['x', 'y', 'z', DUPLICATE, 'p', 'q']
+    assert [s['doc_id'] for s in metadata[3]['sources']] == ['a', 'b']
+    # Token counts for prompt packing are stored with each chunk
+    assert metadata[3]['n_tokens'] == TokenCounter().count([DUPLICATE])[0]
+
+def test_failed_build_keeps_current_version(tmp_path):
+    documents = [Doc('a', "x|y|z")]
+    with patch('src.modules.index_builder.DocumentCRUD') as crud, \
+            patch('src.modules.index_builder.IndexMetadataCRUD'):
+        serve(crud, documents)
+        assert make_builder(tmp_path, HashEmbedder()).build(None, incremental=False)['version'] == 1
+
+        class FailingEmbedder:
+            def embed(self, texts, batch_size=32):
+                raise RuntimeError("model crashed")
+
+        with pytest.raises(RuntimeError):
+            make_builder(tmp_path, FailingEmbedder()).build(None, incremental=False)
+
+    assert FAISSManager.current_version(tmp_path)['version'] == 1
+    assert os.listdir(tmp_path / 'versions') == ['v000001']
+
+def serve_incremental(crud, documents, pending):
+    """Later builds: `documents` exist, the ids in `pending` are new or changed"""
+    serve(crud, [doc for doc in documents if doc.id in pending])
+    crud.get_ids.return_value = [doc.id for doc in documents]
+    crud.get_pending_ids.return_value = list(pending)
+
+def first_build(tmp_path, documents, dedup=False, **indexing):
+    builder = make_builder(tmp_path, HashEmbedder())
+    builder.config['indexing'].update(indexing)
+    builder.config['dedup']['enabled'] = dedup
+    with patch('src.modules.index_builder.DocumentCRUD') as crud, \
+            patch('src.modules.index_builder.IndexMetadataCRUD'):
+        serve(crud, documents)
+        builder.build(None, incremental=False)
+    return builder
+
+def incremental_build(builder, documents, pending=()):
+    with patch('src.modules.index_builder.DocumentCRUD') as crud, \
+            patch('src.modules.index_builder.IndexMetadataCRUD'):
+        serve_incremental(crud, documents, pending)
+        return builder.build(None, incremental=True)
+
+def index_ids(index):
+    return sorted(int(i) for i in FAISSManager.extract_vectors(index)[0])
+
+def test_deleted_document_is_tombstoned(tmp_path):
+    a, b = Doc('a', "a1|a2"), Doc('b', "b1|b2|b3")
+    builder = first_build(tmp_path, [a, b], compact_threshold=1.1)
+
+    stats = incremental_build(builder, [b])
+    assert stats['chunks_removed'] == 2 and stats['chunks_added'] == 0
+
+    index, chunks, metadata = FAISSManager.load(tmp_path)
+    # Ids keep their positions; a's chunks become tombstones
+    assert list(chunks) == [None, None, 'b1', 'b2', 'b3']
+    assert metadata[0] is None and metadata[2]['doc_id'] == 'b'
+    assert index_ids(index) == [2, 3, 4]
+
+def test_new_document_appends_only_its_vectors(tmp_path):
+    a = Doc('a', "a1|a2")
+    builder = first_build(tmp_path, [a])
+    _, _, before = FAISSManager.load(tmp_path)
+    before = [before[i] for i in range(len(before))]
+
+    embedder = HashEmbedder()
+    builder._embedder = embedder
+    c = Doc('c', "c1|c2|c3")
+    stats = incremental_build(builder, [a, c], pending=['c'])
+    assert stats['incremental'] and stats['chunks_added'] == 3
+    assert sum(embedder.calls) == 3
+
+    index, chunks, metadata = FAISSManager.load(tmp_path)
+    assert list(chunks) == ['a1', 'a2', 'c1', 'c2', 'c3']
+    assert [metadata[i] for i in range(2)] == before
+    assert index_ids(index) == [0, 1, 2, 3, 4]
+    # The new vectors sit under the new ids
+    assert np.allclose(index.reconstruct(3), HashEmbedder().embed(['c2'])[0])
+
+def test_compaction_renumbers_without_losing_live_chunks(tmp_path):
+    a, b = Doc('a', "a1|a2|a3"), Doc('b', "b1|b2")
+    builder = first_build(tmp_path, [a, b], compact_threshold=0.25)
+
+    stats = incremental_build(builder, [b])
+    assert stats['chunks_removed'] == 3
+
+    index, chunks, metadata = FAISSManager.load(tmp_path)
+    assert list(chunks) == ['b1', 'b2']
+    assert [metadata[i]['chunk_idx'] for i in range(2)] == [0, 1]
+    assert index_ids(index) == [0, 1]
+    # Each renumbered id still points at its own chunk's vector
+    assert np.allclose(FAISSManager.reconstruct(index, [0, 1]), HashEmbedder().embed(['b1', 'b2']))
+
+def test_incremental_build_links_segments_and_hashes_only_new_chunks(tmp_path):
+    a = Doc('a', f"a1 alpha|{DUPLICATE}")
+    builder = first_build(tmp_path, [a], dedup=True)
+    old_dir = FAISSManager.resolve(tmp_path)
+
+    c = Doc('c', f"c1 gamma|{DUPLICATE}")
+    hashed = []
+    signature = MinHashDeduplicator.signature
+    with patch.object(MinHashDeduplicator, 'signature', autospec=True,
+                      side_effect=lambda self, text: hashed.append(text) or signature(self, text)):
+        stats = incremental_build(builder, [a, c], pending=['c'])
+    assert stats['chunks_added'] == 1 and stats['duplicates_skipped'] == 1
+    # The kept chunks are neither hashed nor copied
+    assert hashed == ["c1 gamma", DUPLICATE]
+    new_dir = FAISSManager.resolve(tmp_path)
+    assert os.stat(new_dir / 'seg000000' / 'chunks.bin').st_ino == os.stat(old_dir / 'seg000000' / 'chunks.bin').st_ino
+
+    _, chunks, metadata = FAISSManager.load(tmp_path)
+    assert list(chunks) == ["a1 alpha", DUPLICATE, "c1 gamma"]
+    assert [s['doc_id'] for s in metadata[1]['sources']] == ['a', 'c']
+    sparse = BM25Index.load(new_dir)
+    assert list(sparse.search("gamma", k=3)[0]) == [2] and list(sparse.search("alpha", k=3)[0]) == [0]
+
+def test_small_trailing_segments_are_rewritten(tmp_path):
+    assert IndexBuilder._segments_to_link([100]) == 1
+    assert IndexBuilder._segments_to_link([100, 30, 10]) == 3
+    assert IndexBuilder._segments_to_link([100, 10, 10]) == 1
+
+    builder = first_build(tmp_path, [Doc('a', "a1 one|a2 two")], dedup=True)
+    documents = [Doc('a', "a1 one|a2 two")]
+    for name in 'bc':
+        documents.append(Doc(name, f"{name}1 three"))
+        incremental_build(builder, documents, pending=[name])
+    assert [s['count'] for s in json.load(open(FAISSManager.resolve(tmp_path) / 'store.json'))['segments']] == [2, 1, 1]
+
+    documents.append(Doc('d', "d1 four"))
+    hashed = []
+    signature = MinHashDeduplicator.signature
+    with patch.object(MinHashDeduplicator, 'signature', autospec=True,
+                      side_effect=lambda self, text: hashed.append(text) or signature(self, text)):
+        incremental_build(builder, documents, pending=['d'])
+    # Everything was rewritten into one segment, reusing the saved signatures
+    assert hashed == ["d1 four"]
+    assert [s['count'] for s in json.load(open(FAISSManager.resolve(tmp_path) / 'store.json'))['segments']] == [5]
+    _, chunks, _ = FAISSManager.load(tmp_path)
+    assert list(chunks) == ["a1 one", "a2 two", "b1 three", "c1 three", "d1 four"]
+    assert sorted(BM25Index.load(FAISSManager.resolve(tmp_path)).search("three", k=5)[0]) == [2, 3]
+
+def test_build_seals_a_segment_every_segment_rows_chunks(tmp_path):
+    assert IndexBuilder._segments_to_link([4, 4, 1, 1], segment_rows=4) == 2
+
+    builder = make_builder(tmp_path, HashEmbedder())
+    builder.config['indexing']['segment_rows'] = 2
+    documents = [Doc('a', f"a1 one|{DUPLICATE}|a3 three"), Doc('b', f"b1 four|{DUPLICATE}")]
+    with patch('src.modules.index_builder.DocumentCRUD') as crud, \
+            patch('src.modules.index_builder.IndexMetadataCRUD'):
+        serve(crud, documents)
+        builder.build(None, incremental=False)
+
+    version_dir = FAISSManager.resolve(tmp_path)
+    assert [s['count'] for s in json.load(open(version_dir / 'store.json'))['segments']] == [2, 2]
+    _, chunks, metadata = FAISSManager.load(tmp_path)
+    assert list(chunks) == ["a1 one", DUPLICATE, "a3 three", "b1 four"]
+    # The duplicate was merged into a sealed segment through the overrides
+    assert [s['doc_id'] for s in metadata[1]['sources']] == ['a', 'b']
+    assert list(np.load(version_dir / 'seg000000' / 'dedup.ids.npy')) == [0, 1]
+    assert list(BM25Index.load(version_dir).search("four", k=4)[0]) == [3]
+
+    # Rewritten rows roll over into new segments with their MinHash state
+    builder.config['indexing']['segment_rows'] = 3
+    documents.append(Doc('c', "c1 five"))
+    incremental_build(builder, documents, pending=['c'])
+    version_dir = FAISSManager.resolve(tmp_path)
+    assert [s['count'] for s in json.load(open(version_dir / 'store.json'))['segments']] == [3, 2]
+    assert list(np.load(version_dir / 'seg000000' / 'dedup.ids.npy')) == [0, 1, 2]
+    assert list(np.load(version_dir / 'seg000001' / 'dedup.ids.npy')) == [0, 1]
+
+def test_builds_wait_for_the_build_lock(tmp_path):
+    a, b = Doc('a', "a1|a2"), Doc('b', "b1")
+    builder = first_build(tmp_path, [a])
+    results = []
+
+    with FAISSManager.build_lock(tmp_path):
+        thread = threading.Thread(target=lambda: results.append(incremental_build(builder, [a, b], pending=['b'])))
+        thread.start()
+        thread.join(0.5)
+        # Another builder holds the lock: nothing is staged meanwhile
+        assert thread.is_alive()
+        assert os.listdir(tmp_path / 'versions') == ['v000001']
+    thread.join()
+
+    assert results[0]['version'] == 2 and results[0]['chunks_added'] == 1
+    assert FAISSManager.current_version(tmp_path)['version'] == 2
+
+def test_document_updated_during_a_build_is_indexed_by_the_next(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'docs.db'}")
+    Base.metadata.create_all(bind=engine)
+    session_factory = sessionmaker(bind=engine)
+    db = session_factory()
+    a = DocumentCRUD.create(db, 'a.txt', 'a.txt', 'txt', "a1|a2", 1).id
+
+    class UpdatingEmbedder(HashEmbedder):
+        """Re-extracts document a the first time it embeds after being armed"""
+        armed = False
+
+        def embed(self, texts, batch_size=32):
+            if self.armed:
+                self.armed = False
+                other = session_factory()
+                DocumentCRUD.set_content(other, a, "a3")
+                other.close()
+            return super().embed(texts, batch_size)
+
+    embedder = UpdatingEmbedder()
+    builder = make_builder(tmp_path / 'index', embedder)
+    builder.build(db, incremental=False)
+
+    DocumentCRUD.create(db, 'b.txt', 'b.txt', 'txt', "b1", 1)
+    embedder.armed = True
+    assert builder.build(db, incremental=True)['documents_indexed'] == 1  # b; a changed after it was read
+
+    stats = builder.build(db, incremental=True)
+    assert stats['documents_indexed'] == 1
+    _, chunks, _ = FAISSManager.load(tmp_path / 'index')
+    assert sorted(chunk for chunk in chunks if chunk is not None) == ['a3', 'b1']
+    db.close()
+
+def test_deleting_every_document_publishes_an_empty_version(tmp_path):
+    builder = first_build(tmp_path, [Doc('a', "a1|a2"), Doc('b', "b1")])
+
+    with patch('src.modules.index_builder.DocumentCRUD') as crud, \
+            patch('src.modules.index_builder.IndexMetadataCRUD') as metadata_crud:
+        serve_incremental(crud, [], pending=())
+        stats = builder.build(None, incremental=True)
+
+    assert stats['chunks_removed'] == 3 and stats['total_chunks'] == 0 and stats['version'] == 2
+    assert metadata_crud.create.call_args.kwargs['document_ids'] == []
+    assert metadata_crud.create.call_args.kwargs['total_chunks'] == 0
+
+    index, chunks, metadata = FAISSManager.load(tmp_path)
+    assert index.ntotal == 0 and len(chunks) == 0
+    assert len(FAISSManager.search(index, np.ones(4, dtype='float32'), k=5)[0]) == 0
+    assert len(BM25Index.load(FAISSManager.resolve(tmp_path)).search("a1", 5)[0]) == 0
+
+    # Later documents are appended to the empty version
+    stats = incremental_build(builder, [Doc('c', "c1|c2")], pending=['c'])
+    assert stats['chunks_added'] == 2 and stats['total_chunks'] == 2
+
+@pytest.mark.parametrize('incremental', [True, False])
+def test_build_with_no_documents_left_finishes_like_any_other(tmp_path, incremental):
+    builder = first_build(tmp_path, [Doc('a', "a1|a2")])
+
+    class StageLog(BuildProgress):
+        def __init__(self):
+            super().__init__()
+            self.stages = []
+
+        def changed(self):
+            if not self.stages or self.stages[-1] != self.stage:
+                self.stages.append(self.stage)
+
+    progress = StageLog()
+    with patch('src.modules.index_builder.DocumentCRUD') as crud, \
+            patch('src.modules.index_builder.IndexMetadataCRUD') as metadata_crud:
+        serve_incremental(crud, [], pending=())
+        stats = builder.build(None, incremental=incremental, progress=progress)
+
+    assert progress.stages == ['preparing', 'streaming', 'finalizing']
+    assert stats['total_chunks'] == 0 and stats['version'] == 2
+    crud.mark_indexed.assert_called_once()
+    assert metadata_crud.create.call_args.kwargs['total_chunks'] == 0
+    assert FAISSManager.load(tmp_path)[0].ntotal == 0
@@ -0,0 +1,49 @@
+import sys
+import os
+import numpy as np
+import pytest
+
+# Add backend to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.modules.rag_system import FAISSManager
+
+PARAMS = {'flat_threshold': 500, 'pq_m': 4, 'pq_bits': 4, 'nprobe': 4, 'ef_search': 64}
+
+def vectors(n, dim=16, seed=0):
+    return np.random.RandomState(seed).rand(n, dim).astype('float32')
+
+@pytest.mark.parametrize('index_type', ['ivf_flat', 'ivf_pq', 'hnsw'])
+def test_small_corpora_stay_flat(index_type):
+    params = dict(PARAMS, index_type=index_type)
+    assert FAISSManager.choose_index_type(499, params) == 'flat'
+    assert FAISSManager.choose_index_type(500, params) == index_type
+    assert FAISSManager.index_type(FAISSManager.build_index(vectors(100), params=params)) == 'flat'
+
+@pytest.mark.parametrize('index_type', ['ivf_flat', 'ivf_pq', 'hnsw'])
+def test_large_corpora_get_the_configured_type(index_type):
+    index = FAISSManager.build_index(vectors(1000), params=dict(PARAMS, index_type=index_type))
+    assert FAISSManager.index_type(index) == index_type
+    assert index.ntotal == 1000 and FAISSManager.supports_incremental(index)
+
+def test_expected_total_sizes_a_streamed_index():
+    # The first batch is small, but the final corpus will cross flat_threshold
+    index = FAISSManager.build_index(vectors(100), params=dict(PARAMS, index_type='ivf_flat'), n_total=5000)
+    assert FAISSManager.index_type(index) == 'ivf_flat'
+
+def test_unknown_index_type_is_rejected():
+    with pytest.raises(ValueError):
+        FAISSManager.choose_index_type(10, {'index_type': 'lsh'})
+
+def test_recall_at_k():
+    data = vectors(300)
+    flat = FAISSManager.build_index(data)
+    assert FAISSManager.recall_at_k(flat, data, k=5, n_queries=50) == 1.0
+
+    # Recall compares ids, so an index holding other ids recalls nothing
+    shifted = FAISSManager.build_index(data, np.arange(300) + 1000)
+    assert FAISSManager.recall_at_k(shifted, data, k=5, n_queries=50) == 0.0
+    assert FAISSManager.recall_at_k(shifted, data, np.arange(300) + 1000, k=5, n_queries=50) == 1.0
+
+    hnsw = FAISSManager.build_index(vectors(1000), params=dict(PARAMS, index_type='hnsw'))
+    assert 0.9 <= FAISSManager.recall_at_k(hnsw, vectors(1000), k=5, n_queries=50) <= 1.0
@@ -0,0 +1,43 @@
+import sys
+import os
+import numpy as np
+
+# Add backend to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.modules.rag_system import FAISSManager
+from src.modules.index_loader import IndexLoader
+
+def save_version(index_dir, n_chunks, keep_versions=2):
+    vectors = np.random.RandomState(n_chunks).rand(n_chunks, 8).astype('float32')
+    index = FAISSManager.build_index(vectors)
+    chunks = [f"chunk {i}" for i in range(n_chunks)]
+    metadata = [{'source_file': 'a.txt', 'doc_id': 'a', 'chunk_idx': i} for i in range(n_chunks)]
+    return FAISSManager.save(index, chunks, metadata, index_dir, keep_versions=keep_versions)
+
+def test_save_writes_new_version_and_prunes_old_ones(tmp_path):
+    assert not FAISSManager.exists(tmp_path)
+    assert [save_version(tmp_path, n) for n in (3, 4, 5)] == [1, 2, 3]
+    assert FAISSManager.current_version(tmp_path)['version'] == 3
+    assert sorted(os.listdir(tmp_path / 'versions')) == ['v000002', 'v000003']
+
+    index, chunks, _ = FAISSManager.load(tmp_path)
+    assert index.ntotal == 5 and len(chunks) == 5
+
+def test_loader_swaps_and_releases_after_queries_drain(tmp_path):
+    published = []
+    loader = IndexLoader(tmp_path, None, published.append)
+    assert not loader.refresh()
+
+    save_version(tmp_path, 3)
+    assert loader.refresh()
+    old = published[-1]
+    assert old.acquire()  # an in-flight query
+
+    save_version(tmp_path, 4)
+    assert loader.refresh()
+    assert published[-1].version == 2 and len(published[-1].chunks) == 4
+    # The old version stays usable until the query releases it
+    assert old.chunks[0] == "chunk 0"
+    old.release()
+    assert old.closed and not old.acquire()
@@ -0,0 +1,109 @@
+import sys
+import os
+import numpy as np
+import pytest
+import torch
+
+# Add backend to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import config
+from src.modules.inference_backends import check_backend, cosine_parity, export_dir
+from src.modules.rag_system import Embedder, Reranker
+
+WORDS = "the cat dog sat on mat a bird flew over house red blue quick brown fox jumps lazy".split()
+TEXTS = [
+    "the cat sat on the mat", "a bird flew over the red house", "the quick brown fox jumps",
+    "the lazy dog", "a blue house", "the fox jumps over the lazy dog"
+]
+
+@pytest.fixture(scope='module')
+def tiny_models(tmp_path_factory):
+    """Randomly initialised two-layer BERT encoder and cross-encoder, saved like Hub checkpoints"""
+    from transformers import BertConfig, BertForSequenceClassification, BertModel, BertTokenizerFast
+
+    directory = tmp_path_factory.mktemp('models')
+    vocab = directory / 'vocab.txt'
+    vocab.write_text('\n'.join(['[PAD]', '[UNK]', '[CLS]', '[SEP]', '[MASK]'] + WORDS))
+    tokenizer = BertTokenizerFast(vocab_file=str(vocab))
+    sizes = dict(vocab_size=5 + len(WORDS), hidden_size=64, num_hidden_layers=2, num_attention_heads=4,
+                 intermediate_size=128, max_position_embeddings=64)
+    torch.manual_seed(0)
+    paths = {}
+    for name, model in (('embedder', BertModel(BertConfig(**sizes))),
+                        ('reranker', BertForSequenceClassification(BertConfig(num_labels=1, **sizes)))):
+        paths[name] = str(directory / name)
+        model.save_pretrained(paths[name])
+        tokenizer.save_pretrained(paths[name])
+    return paths
+
+def test_unknown_backend_is_rejected():
+    with pytest.raises(ValueError):
+        check_backend('tensorrt')
+
+def test_export_dir_is_one_directory_per_model(tmp_path):
+    path = export_dir(tmp_path, 'sentence-transformers/all-MiniLM-L6-v2')
+    assert path.parent == tmp_path and '/' not in path.name
+
+def test_cosine_parity():
+    a = np.array([[1.0, 0.0], [0.0, 2.0]])
+    assert cosine_parity(a, a) == pytest.approx((1.0, 1.0))
+    assert cosine_parity(a, np.array([[1.0, 1.0], [0.0, 1.0]]))[1] == pytest.approx(np.sqrt(0.5))
+
+def test_int8_embedder_matches_fp32(tiny_models):
+    reference = Embedder(tiny_models['embedder']).embed(TEXTS)
+    quantized = Embedder(tiny_models['embedder'], backend='torch_int8')
+    assert any(isinstance(m, torch.ao.nn.quantized.dynamic.Linear) for m in quantized.model.modules())
+    assert cosine_parity(reference, quantized.embed(TEXTS))[1] >= 0.99
+
+def test_int8_reranker_matches_fp32(tiny_models):
+    reference = Reranker(tiny_models['reranker'], max_length=64, cache_size=0)
+    quantized = Reranker(tiny_models['reranker'], max_length=64, cache_size=0, backend='torch_int8')
+    try:
+        expected, scores = reference.score('the cat', TEXTS), quantized.score('the cat', TEXTS)
+    finally:
+        reference.batcher.close()
+        quantized.batcher.close()
+    assert np.abs(expected - scores).max() < 0.01
+
+@pytest.mark.parametrize('quantize', [False, True])
+def test_onnx_embedder_matches_fp32(tiny_models, tmp_path, quantize):
+    pytest.importorskip('onnx')
+    pytest.importorskip('onnxruntime')
+    from src.modules.inference_backends import export_embedder
+
+    export_embedder(tiny_models['embedder'], tmp_path, quantize=quantize)
+    reference = Embedder(tiny_models['embedder']).embed(TEXTS)
+    exported = Embedder(tiny_models['embedder'], backend='onnx', onnx_dir=tmp_path).embed(TEXTS)
+    assert exported.shape == reference.shape
+    assert cosine_parity(reference, exported)[1] >= (0.99 if quantize else 0.9999)
+
+def test_onnx_reranker_matches_fp32(tiny_models, tmp_path):
+    pytest.importorskip('onnx')
+    pytest.importorskip('onnxruntime')
+    from src.modules.inference_backends import export_reranker
+
+    export_reranker(tiny_models['reranker'], tmp_path, max_length=64)
+    reference = Reranker(tiny_models['reranker'], max_length=64, cache_size=0)
+    exported = Reranker(tiny_models['reranker'], max_length=64, cache_size=0, backend='onnx', onnx_dir=tmp_path)
+    try:
+        expected, scores = reference.score('the cat', TEXTS), exported.score('the cat', TEXTS)
+    finally:
+        reference.batcher.close()
+        exported.batcher.close()
+    assert np.abs(expected - scores).max() < 1e-4
+
+def test_int8_matches_fp32_on_configured_embedder():
+    # The real accuracy guard; needs the model in the local Hugging Face cache
+    from huggingface_hub import try_to_load_from_cache
+
+    model_name = config.RAG_CONFIG['embedding']['model_name']
+    if not isinstance(try_to_load_from_cache(model_name, 'config.json'), str):
+        pytest.skip(f"{model_name} is not in the local Hugging Face cache")
+    texts = [
+        "The warranty covers manufacturing defects for two years.",
+        "Accidental damage is not covered by the warranty.",
+        "Quarterly revenue grew by twelve percent."
+    ]
+    reference = Embedder(model_name).embed(texts)
+    assert cosine_parity(reference, Embedder(model_name, backend='torch_int8').embed(texts))[1] >= 0.99
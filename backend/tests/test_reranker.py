@@ -0,0 +1,92 @@
+import sys
+import os
+import threading
+import numpy as np
+import pytest
+import torch
+
+# Add backend to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.modules.rag_system import Reranker
+
+WORDS = "the cat dog sat on mat a bird flew over house red blue quick brown fox jumps lazy".split()
+
+@pytest.fixture(scope='module')
+def model_dir(tmp_path_factory):
+    """A randomly initialised two-layer cross-encoder, saved like a Hub checkpoint"""
+    from transformers import BertConfig, BertForSequenceClassification, BertTokenizerFast
+
+    directory = tmp_path_factory.mktemp('cross-encoder')
+    (directory / 'vocab.txt').write_text('\n'.join(['[PAD]', '[UNK]', '[CLS]', '[SEP]', '[MASK]'] + WORDS))
+    torch.manual_seed(0)
+    BertForSequenceClassification(BertConfig(
+        vocab_size=5 + len(WORDS), hidden_size=32, num_hidden_layers=2, num_attention_heads=2,
+        intermediate_size=64, max_position_embeddings=64, num_labels=1
+    )).save_pretrained(directory)
+    BertTokenizerFast(vocab_file=str(directory / 'vocab.txt')).save_pretrained(directory)
+    return str(directory)
+
+class RecordingModel:
+    """Passes predict() through to the cross-encoder, recording each batch"""
+    def __init__(self, model):
+        self.model = model
+        self.tokenizer = model.tokenizer
+        self.batches = []
+
+    def predict(self, pairs, batch_size=32):
+        self.batches.append([tuple(pair) for pair in pairs])
+        return self.model.predict(pairs, batch_size=batch_size)
+
+def make_reranker(model_dir, **kwargs):
+    reranker = Reranker(model_dir, max_length=32, **kwargs)
+    reranker.model = RecordingModel(reranker.model)
+    return reranker
+
+def test_chunks_are_cut_to_the_tokens_that_fit(model_dir):
+    reranker = make_reranker(model_dir, cache_size=0)
+    long_chunk = ' '.join(WORDS * 10)
+    reranker.score('the quick fox', [long_chunk, 'a red house'])
+    reranker.batcher.close()
+
+    (_, cut), (_, short) = reranker.model.batches[0]
+    assert long_chunk.startswith(cut) and short == 'a red house'
+    # [CLS] query [SEP] chunk [SEP] fills max_length exactly
+    tokenizer = reranker.model.tokenizer
+    assert len(tokenizer('the quick fox', cut)['input_ids']) == 32
+
+def test_scores_are_cached_by_query_and_chunk_id(model_dir):
+    reranker = make_reranker(model_dir)
+    chunks = ['the cat sat', 'a dog flew', 'the red fox']
+    first = reranker.score('cat', chunks, chunk_ids=[0, 1, 2])
+    again = reranker.score('cat', chunks[1:], chunk_ids=[1, 2])
+    assert np.allclose(again, first[1:])
+    assert len(reranker.model.batches) == 1
+
+    # Another query, or a cleared cache, is scored again
+    reranker.score('dog', chunks[:1], chunk_ids=[0])
+    reranker.clear_cache()
+    reranker.score('cat', chunks[:1], chunk_ids=[0])
+    reranker.batcher.close()
+    assert len(reranker.model.batches) == 3
+    cache = reranker.stats()['score_cache']
+    assert cache['hits'] == 2 and cache['misses'] == 5
+
+def test_concurrent_requests_share_a_predict_call(model_dir):
+    reranker = make_reranker(model_dir, cache_size=0, max_batch_size=8, max_wait_ms=500)
+    start = threading.Barrier(4)
+    results = {}
+
+    def request(i):
+        start.wait()
+        results[i] = reranker.score(f'query {WORDS[i]}', ['the cat sat', 'a dog flew'])
+
+    threads = [threading.Thread(target=request, args=(i,)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    reranker.batcher.close()
+
+    assert [len(batch) for batch in reranker.model.batches] == [8]
+    assert all(len(scores) == 2 for scores in results.values())
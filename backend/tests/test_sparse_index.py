@@ -0,0 +1,109 @@
+import sys
+import os
+import numpy as np
+
+# Add backend to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.modules.sparse_index import BM25Index, fuse_rankings, tokenize
+
+CHUNKS = [
+    "Replace filter XJ-220 every six months.",
+    "The warranty covers parts and labour for two years.",
+    None,  # tombstoned chunk
+    "Filter housing XJ-221 is not compatible with older models.",
+]
+
+def test_tokenize_keeps_part_numbers():
+    assert tokenize("Order part XJ-220 (v2.1)") == ["order", "part", "xj-220", "v2.1"]
+
+def test_exact_identifier_ranks_first():
+    index = BM25Index.build(CHUNKS)
+    ids, scores = index.search("xj-220 filter", k=3)
+    assert ids[0] == 0
+    assert 2 not in ids
+    assert list(scores) == sorted(scores, reverse=True)
+
+def test_unknown_terms_return_nothing():
+    index = BM25Index.build(CHUNKS)
+    ids, _ = index.search("nonexistent", k=3)
+    assert len(ids) == 0
+
+def test_save_and_load_roundtrip(tmp_path):
+    index = BM25Index.build(CHUNKS)
+    for tmp_file, final_file in index.write(tmp_path):
+        os.replace(tmp_file, final_file)
+
+    loaded = BM25Index.load(tmp_path)
+    expected_ids, expected_scores = index.search("warranty parts", k=2)
+    ids, scores = loaded.search("warranty parts", k=2)
+    assert list(ids) == list(expected_ids)
+    assert np.allclose(scores, expected_scores)
+    assert BM25Index.load(tmp_path / "missing") is None
+
+def test_fusion_rewards_agreement():
+    ids, _ = fuse_rankings([[1, 2, 3], [3, 4]], weights=[1.0, 1.0], k=60, limit=2)
+    assert list(ids) == [3, 1]
+    # A zero weight removes that ranking entirely
+    ids, _ = fuse_rankings([[1, 2], [4]], weights=[1.0, 0.0])
+    assert list(ids) == [1, 2]
+
+def write_version(directory, texts, link=None, remove=()):
+    """A chunk store with postings per segment, linking the segments of `link`"""
+    from src.modules.chunk_store import ChunkStoreWriter, MetadataStore, segment_texts
+    from src.modules.sparse_index import write_params, write_postings
+
+    writer = ChunkStoreWriter(directory, on_seal=lambda segment_dir, start, count: write_postings(
+        segment_dir, segment_texts(segment_dir)))
+    if link is not None:
+        for segment in MetadataStore(link).segments:
+            writer.link(segment.directory, np.ones(segment.count, dtype=np.uint8))
+    for i in remove:
+        writer.remove(i)
+    writer.extend(texts, [{'doc_id': 'd'}] * len(texts))
+    for tmp_file, final_file in writer.finish() + write_params(directory, 1.2, 0.75):
+        os.replace(tmp_file, final_file)
+
+def test_segments_score_like_one_index(tmp_path):
+    """Postings split over segments, with a chunk tombstoned later, score like a single index"""
+    texts = [text for text in CHUNKS if text is not None] + ["Filter XJ-220 fits the warranty model."]
+    write_version(tmp_path / 'v1', texts[:2])
+    write_version(tmp_path / 'v2', texts[2:], link=tmp_path / 'v1', remove=[1])
+
+    loaded = BM25Index.load(tmp_path / 'v2')
+    assert len(loaded.segments) == 2
+    expected = BM25Index.build([texts[0], None] + texts[2:])
+    for query in ("xj-220 filter", "warranty parts", "compatible"):
+        ids, scores = loaded.search(query, k=4)
+        expected_ids, expected_scores = expected.search(query, k=4)
+        assert list(ids) == list(expected_ids) and 1 not in ids
+        assert np.allclose(scores, expected_scores)
+
+def test_search_matches_reference_bm25_and_stays_memory_mapped(tmp_path):
+    texts = ["red apple pie", "green apple", "red red car", "blue car", "apple car red"]
+    write_version(tmp_path / 'v1', texts)
+    write_version(tmp_path / 'v2', [], link=tmp_path / 'v1', remove=[3])
+    index = BM25Index.load(tmp_path / 'v2')
+    assert all(isinstance(segment.lengths, np.memmap) for segment in index.segments)
+    assert isinstance(index.live, np.memmap)
+
+    live = [tokenize(text) if i != 3 else [] for i, text in enumerate(texts)]
+    n = sum(1 for tokens in live if tokens)
+    avg = sum(map(len, live)) / n
+    def reference(query):
+        scores = {}
+        for term in set(tokenize(query)):
+            df = sum(term in tokens for tokens in live)
+            for i, tokens in enumerate(live):
+                tf = tokens.count(term)
+                if tf:
+                    idf = np.log(1 + (n - df + 0.5) / (df + 0.5))
+                    scores[i] = scores.get(i, 0.0) + idf * tf * 2.2 / (tf + 1.2 * (0.25 + 0.75 * len(tokens) / avg))
+        return scores
+
+    for query in ("red car", "apple", "blue"):
+        ids, scores = index.search(query, k=10)
+        expected = reference(query)
+        assert sorted(ids) == sorted(expected)
+        assert np.allclose(scores, [expected[i] for i in ids], rtol=1e-5)
+        assert list(scores) == sorted(scores, reverse=True)
@@ -0,0 +1,53 @@
+import sys
+import os
+
+# Add backend to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tokenizers import Tokenizer, models, pre_tokenizers
+from transformers import PreTrainedTokenizerFast
+from src.modules.rag_system import TextChunker
+
+def word_tokenizer():
+    """Offline stand-in for the MiniLM tokenizer: one token per word or punctuation mark"""
+    tokenizer = Tokenizer(models.WordLevel({"[UNK]": 0}, unk_token="[UNK]"))
+    tokenizer.pre_tokenizer = pre_tokenizers.BertPreTokenizer()
+    return PreTrainedTokenizerFast(tokenizer_object=tokenizer, unk_token="[UNK]")
+
+TEXT = ("The Policy covers Water Damage. Claims must be filed within 30 days! "
+        "Late claims are reviewed case-by-case. Contact support@example.com for help.")
+
+def test_chunks_are_slices_of_the_original_text():
+    chunker = TextChunker(chunk_size=8, overlap=2, tokenizer=word_tokenizer())
+    chunks, metadatas = chunker.chunk(TEXT)
+    assert chunks[0] == "The Policy covers Water Damage. Claims must"
+    for chunk, meta in zip(chunks, metadatas):
+        assert chunk == TEXT[meta['char_start']:meta['char_end']]
+    # Consecutive windows overlap and the last one reaches the end
+    assert metadatas[1]['char_start'] < metadatas[0]['char_end']
+    assert metadatas[-1]['char_end'] == len(TEXT)
+
+def test_pages_keep_page_numbers_and_batching_matches_single_calls():
+    chunker = TextChunker(chunk_size=6, overlap=1, tokenizer=word_tokenizer())
+    pages = [{'text': "First page text here.", 'page': 3}, {'text': "Second   page\ntext.", 'page': 4}]
+    batched = chunker.chunk_batch([pages, TEXT])
+    assert batched == [chunker.chunk(pages), chunker.chunk(TEXT)]
+    chunks, metadatas = batched[0]
+    assert [m['page'] for m in metadatas] == [3, 4]
+    # Whitespace is normalised in the chunk text, the span still covers the source
+    assert chunks[1] == "Second page text."
+    assert metadatas[1]['char_end'] == len(pages[1]['text'])
+
+def test_sentence_snapping_moves_window_edges():
+    chunker = TextChunker(chunk_size=15, overlap=4, snap_to_sentences=True, tokenizer=word_tokenizer())
+    chunks, _ = chunker.chunk(TEXT)
+    # Without snapping the first window would end after "Late"
+    assert chunks[0] == "The Policy covers Water Damage. Claims must be filed within 30 days!"
+    assert TextChunker(chunk_size=15, overlap=4, tokenizer=word_tokenizer()).chunk(TEXT)[0][0].endswith("Late")
+
+def test_artifacts_are_blanked_without_shifting_offsets():
+    chunker = TextChunker(chunk_size=50, overlap=5, tokenizer=word_tokenizer())
+    text = "Revenue ##tal values, grew"
+    chunks, metadatas = chunker.chunk(text)
+    assert chunks == ["Revenue , grew"]
+    assert text[metadatas[0]['char_start']:metadatas[0]['char_end']].endswith("grew")
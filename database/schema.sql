@@ -6,6 +6,9 @@ CREATE TABLE documents (
     file_type VARCHAR(20) NOT NULL CHECK (file_type IN ('pdf', 'txt', 'docx')),
     file_size INTEGER,
     content TEXT,
+    content_hash VARCHAR(64),
+    status VARCHAR(20) DEFAULT 'ready',
+    error TEXT,
     processed BOOLEAN DEFAULT FALSE,
     indexed BOOLEAN DEFAULT FALSE,
     chunk_count INTEGER DEFAULT 0,
@@ -19,6 +22,17 @@ CREATE INDEX idx_documents_original_filename ON documents(original_filename);
 CREATE INDEX idx_documents_processed ON documents(processed);
 CREATE INDEX idx_documents_indexed ON documents(indexed);
 CREATE INDEX idx_documents_created_at ON documents(created_at);
+CREATE INDEX idx_documents_status ON documents(status);
+CREATE INDEX idx_documents_content_hash ON documents(content_hash);
+
+-- Extracted text, one zlib-compressed row per page (a single row for plain text)
+CREATE TABLE document_pages (
+    document_id UUID REFERENCES documents(id) ON DELETE CASCADE,
+    seq INTEGER NOT NULL,
+    page INTEGER,
+    data BYTEA NOT NULL,
+    PRIMARY KEY (document_id, seq)
+);
 
 -- Queries table
 CREATE TABLE queries (
@@ -51,6 +65,27 @@ CREATE TABLE index_metadata (
     last_indexed TIMESTAMP
 );
 
+-- Index build jobs (one running at a time; extra triggers coalesce into a queued job)
+CREATE TABLE index_build_jobs (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    status VARCHAR(20) NOT NULL DEFAULT 'queued',
+    incremental BOOLEAN DEFAULT TRUE,
+    triggers INTEGER DEFAULT 1,
+    cancel_requested BOOLEAN DEFAULT FALSE,
+    stage VARCHAR(20),
+    progress JSONB,
+    stats JSONB,
+    error TEXT,
+    worker_pid INTEGER,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    started_at TIMESTAMP,
+    finished_at TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX idx_index_build_jobs_status ON index_build_jobs(status);
+CREATE INDEX idx_index_build_jobs_created_at ON index_build_jobs(created_at);
+
 -- Create indexes for JSON queries
 CREATE INDEX idx_queries_citations ON queries USING gin (citations);
 CREATE INDEX idx_queries_support_details ON queries USING gin (support_details);
@@ -10,7 +10,7 @@ export const useQuery = () => {
         setLoading(true);
         setError(null);
         try {
-            const data = await api.answerQuery(question);
+            const data = await api.streamQuery(question, setResult);
             setResult(data);
             return data;
         } catch (err) {
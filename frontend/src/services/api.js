@@ -97,6 +97,37 @@ export const answerQuery = async (question) => {
     }
 };
 
+// Streams the answer over Server-Sent Events. `onUpdate` receives the partial
+// result as tokens and sentence checks arrive; resolves with the final result.
+export const streamQuery = (question, onUpdate) => new Promise((resolve, reject) => {
+    const url = `${API_BASE_URL}/api/query/stream?question=${encodeURIComponent(question)}`;
+    const source = new EventSource(url);
+    const partial = { question, answer: '', confidence: 0, citations: [], support_details: [] };
+
+    source.addEventListener('token', (event) => {
+        partial.answer += JSON.parse(event.data).text;
+        onUpdate({ ...partial });
+    });
+    source.addEventListener('sentence', (event) => {
+        const { citation, index, ...detail } = JSON.parse(event.data);
+        partial.support_details = [...partial.support_details, detail];
+        if (citation) {
+            partial.citations = [...partial.citations, citation];
+        }
+        onUpdate({ ...partial });
+    });
+    source.addEventListener('done', (event) => {
+        source.close();
+        resolve(JSON.parse(event.data));
+    });
+    source.addEventListener('error', (event) => {
+        source.close();
+        const detail = event.data ? JSON.parse(event.data).detail : 'Connection to the answer stream failed';
+        console.error('Stream query failed:', detail);
+        reject(new Error(detail));
+    });
+});
+
 export const getQueryHistory = async (limit = 50) => {
     try {
         const response = await api.get('/api/query/history', {